@@ -0,0 +1,34 @@
+"""Added chart connection_id
+
+Revision ID: 3b9f0c2d7e41
+Revises: e0a15e3dcacf
+Create Date: 2026-10-19 10:12:41.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f0c2d7e41'
+down_revision: Union[str, None] = 'e0a15e3dcacf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chart', sa.Column('connection_id', postgresql.UUID(), nullable=True))
+    op.create_foreign_key(
+        'chart_connection_id_fkey', 'chart', 'database_connection',
+        ['connection_id'], ['id'], ondelete='SET NULL'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('chart_connection_id_fkey', 'chart', type_='foreignkey')
+    op.drop_column('chart', 'connection_id')
@@ -0,0 +1,28 @@
+"""Added chart time_column
+
+Revision ID: 4f7b2d9e1c58
+Revises: 8d41c7a3b2e6
+Create Date: 2026-10-19 16:38:52.104927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f7b2d9e1c58'
+down_revision: Union[str, None] = '8d41c7a3b2e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chart', sa.Column('time_column', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chart', 'time_column')
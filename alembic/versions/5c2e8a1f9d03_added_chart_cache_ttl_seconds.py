@@ -0,0 +1,28 @@
+"""Added chart cache_ttl_seconds
+
+Revision ID: 5c2e8a1f9d03
+Revises: 3b9f0c2d7e41
+Create Date: 2026-10-19 11:04:27.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e8a1f9d03'
+down_revision: Union[str, None] = '3b9f0c2d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chart', sa.Column('cache_ttl_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chart', 'cache_ttl_seconds')
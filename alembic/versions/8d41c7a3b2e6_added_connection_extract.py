@@ -0,0 +1,35 @@
+"""Added connection extract settings
+
+Revision ID: 8d41c7a3b2e6
+Revises: 5c2e8a1f9d03
+Create Date: 2026-10-19 14:12:08.214417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c7a3b2e6'
+down_revision: Union[str, None] = '5c2e8a1f9d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('database_connection', sa.Column('extract_enabled', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('database_connection', sa.Column('extract_tables', sa.JSON(), nullable=True))
+    op.add_column('database_connection', sa.Column('extract_refresh_seconds', sa.Integer(), nullable=True))
+    op.add_column('database_connection', sa.Column('extract_refreshed_at', sa.DateTime(), nullable=True))
+    op.alter_column('database_connection', 'extract_enabled', server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('database_connection', 'extract_refreshed_at')
+    op.drop_column('database_connection', 'extract_refresh_seconds')
+    op.drop_column('database_connection', 'extract_tables')
+    op.drop_column('database_connection', 'extract_enabled')
@@ -0,0 +1,50 @@
+"""Added chart project_id and relevance index
+
+Revision ID: b63e0f4a7d21
+Revises: 4f7b2d9e1c58
+Create Date: 2026-10-19 18:02:41.558190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b63e0f4a7d21'
+down_revision: Union[str, None] = '4f7b2d9e1c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chart', sa.Column('project_id', postgresql.UUID(), nullable=True))
+    op.create_foreign_key('chart_project_id_fkey', 'chart', 'project', ['project_id'], ['id'], ondelete='SET NULL')
+    # Charts on a dashboard belong to the dashboard's project, the others to their connection's
+    op.execute(
+        "UPDATE chart SET project_id = ("
+        "SELECT dashboard.project_id FROM dashboard_chart "
+        "JOIN dashboard ON dashboard.id = dashboard_chart.dashboard_id "
+        "WHERE dashboard_chart.chart_id = chart.id LIMIT 1)"
+    )
+    op.execute(
+        "UPDATE chart SET project_id = ("
+        "SELECT database_connection.project_id FROM database_connection "
+        "WHERE database_connection.id = chart.connection_id) "
+        "WHERE project_id IS NULL"
+    )
+    op.create_index(
+        'ix_chart_project_relevance',
+        'chart',
+        ['project_id', sa.text('relevance DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chart_project_relevance', table_name='chart')
+    op.drop_constraint('chart_project_id_fkey', 'chart', type_='foreignkey')
+    op.drop_column('chart', 'project_id')
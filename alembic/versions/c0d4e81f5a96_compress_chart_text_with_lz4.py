@@ -0,0 +1,42 @@
+"""Compress chart query and report with lz4
+
+Revision ID: c0d4e81f5a96
+Revises: b63e0f4a7d21
+Create Date: 2026-10-19 18:47:13.092184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0d4e81f5a96'
+down_revision: Union[str, None] = 'b63e0f4a7d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _lz4_available() -> bool:
+    # Column compression methods arrived in Postgres 14; lz4 is listed only when the server was built with it
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or bind.dialect.server_version_info < (14,):
+        return False
+    return bool(bind.exec_driver_sql(
+        "SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'"
+    ).scalar())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only values written from now on are compressed with lz4; existing ones stay pglz until rewritten
+    if _lz4_available():
+        op.execute("ALTER TABLE chart ALTER COLUMN report SET COMPRESSION lz4")
+        op.execute("ALTER TABLE chart ALTER COLUMN query SET COMPRESSION lz4")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _lz4_available():
+        op.execute("ALTER TABLE chart ALTER COLUMN report SET COMPRESSION pglz")
+        op.execute("ALTER TABLE chart ALTER COLUMN query SET COMPRESSION pglz")
@@ -0,0 +1,53 @@
+"""Added indexes for access checks and listings
+
+Revision ID: d5a9c3e7f012
+Revises: c0d4e81f5a96
+Create Date: 2026-10-19 19:21:36.740215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9c3e7f012'
+down_revision: Union[str, None] = 'c0d4e81f5a96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# user_project_role(user_id), user_project_role(user_id, project_id) and
+# role_permission(role_id, permission_id) are prefixes of primary keys and need no index
+INDEXES = [
+    ('ix_user_project_role_project_id', 'user_project_role', ['project_id']),
+    ('ix_user_dashboard_dashboard_owner', 'user_dashboard', ['dashboard_id', 'is_owner']),
+    ('ix_dashboard_project_id', 'dashboard', ['project_id']),
+    ('ix_dashboard_title', 'dashboard', ['title']),
+    ('ix_project_name', 'project', ['name']),
+    ('ix_database_connection_project_id', 'database_connection', ['project_id']),
+]
+
+
+def _drop_if_invalid(name: str) -> None:
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind that IF NOT EXISTS would keep
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql' and bind.exec_driver_sql(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%(name)s)", {'name': name}
+    ).scalar():
+        op.drop_index(name, postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps the tables writable while the indexes build; it cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            _drop_if_invalid(name)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,102 @@
+"""Moved delete cascades into foreign keys
+
+Revision ID: e8b2f6a4c913
+Revises: d5a9c3e7f012
+Create Date: 2026-10-19 20:47:12.318904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2f6a4c913'
+down_revision: Union[str, None] = 'd5a9c3e7f012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table, ON DELETE before, ON DELETE after)
+FOREIGN_KEYS = [
+    ('role_permission', 'role_id', 'role', None, 'CASCADE'),
+    ('role_permission', 'permission_id', 'permission', None, 'CASCADE'),
+    ('project', 'super_user_id', 'user', None, 'SET NULL'),
+    ('role', 'project_id', 'project', None, 'CASCADE'),
+    ('user_project_role', 'user_id', 'user', None, 'CASCADE'),
+    ('user_project_role', 'project_id', 'project', None, 'CASCADE'),
+    ('user_project_role', 'role_id', 'role', None, 'CASCADE'),
+    ('dashboard', 'project_id', 'project', None, 'CASCADE'),
+    ('dashboard', 'created_by', 'user', None, 'CASCADE'),
+    ('chart', 'created_by', 'user', None, 'CASCADE'),
+    ('chart', 'project_id', 'project', 'SET NULL', 'CASCADE'),
+    ('dashboard_chart', 'dashboard_id', 'dashboard', None, 'CASCADE'),
+    ('dashboard_chart', 'chart_id', 'chart', None, 'CASCADE'),
+    ('database_connection', 'project_id', 'project', None, 'CASCADE'),
+]
+
+# Every cascade looks up the referencing rows; without an index each deleted parent
+# row scans the whole referencing table
+INDEXES = [
+    ('ix_project_super_user_id', 'project', ['super_user_id']),
+    ('ix_role_project_id', 'role', ['project_id']),
+    ('ix_user_project_role_role_id', 'user_project_role', ['role_id']),
+    ('ix_dashboard_created_by', 'dashboard', ['created_by']),
+    ('ix_chart_created_by', 'chart', ['created_by']),
+    ('ix_chart_connection_id', 'chart', ['connection_id']),
+    ('ix_dashboard_chart_chart_id', 'dashboard_chart', ['chart_id']),
+    ('ix_user_chart_chart_id', 'user_chart', ['chart_id']),
+]
+
+
+def _constraint_names() -> list:
+    inspector = sa.inspect(op.get_bind())
+    names = []
+    for table, column, _, _, _ in FOREIGN_KEYS:
+        # The initial migrations left most constraints to be named by the database
+        names.append(next(
+            (
+                existing['name'] for existing in inspector.get_foreign_keys(table)
+                if existing['constrained_columns'] == [column] and existing['name']
+            ),
+            f'{table}_{column}_fkey'
+        ))
+    return names
+
+
+def _replace_foreign_keys(ondelete_index: int) -> None:
+    # NOT VALID skips checking the existing rows, so the tables are locked only for
+    # the catalog change; the check runs in _validate_foreign_keys once that is committed
+    names = _constraint_names()
+    for fk, name in zip(FOREIGN_KEYS, names):
+        table, column, referred = fk[:3]
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(
+            name, table, referred, [column], ['id'], ondelete=fk[ondelete_index], postgresql_not_valid=True
+        )
+    with op.get_context().autocommit_block():
+        _validate_foreign_keys(names)
+
+
+def _validate_foreign_keys(names: list) -> None:
+    # VALIDATE CONSTRAINT scans the rows without blocking writes to either table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for fk, name in zip(FOREIGN_KEYS, names):
+        op.execute(f'ALTER TABLE "{fk[0]}" VALIDATE CONSTRAINT "{name}"')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_foreign_keys(4)
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    _replace_foreign_keys(3)
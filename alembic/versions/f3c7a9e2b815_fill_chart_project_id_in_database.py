@@ -0,0 +1,72 @@
+"""Fill chart project_id in the database
+
+Revision ID: f3c7a9e2b815
+Revises: e8b2f6a4c913
+Create Date: 2026-10-19 21:36:05.127448
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c7a9e2b815'
+down_revision: Union[str, None] = 'e8b2f6a4c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Charts are also written by the chart generating service, which does not run this
+# app's ORM hooks; the triggers give its rows the same project_id the hooks would
+TRIGGERS = [
+    (
+        'chart_project_from_connection',
+        'chart',
+        'BEFORE INSERT OR UPDATE OF connection_id',
+        """
+        IF NEW.project_id IS NULL AND NEW.connection_id IS NOT NULL THEN
+            SELECT project_id INTO NEW.project_id FROM database_connection WHERE id = NEW.connection_id;
+        END IF;
+        RETURN NEW;
+        """
+    ),
+    (
+        'chart_project_from_dashboard',
+        'dashboard_chart',
+        'AFTER INSERT',
+        """
+        UPDATE chart SET project_id = (SELECT project_id FROM dashboard WHERE id = NEW.dashboard_id)
+        WHERE id = NEW.chart_id AND project_id IS NULL;
+        RETURN NULL;
+        """
+    ),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, timing, body in TRIGGERS:
+        op.execute(f"CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$BEGIN{body}END$$")
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        op.execute(f"CREATE TRIGGER {name} {timing} ON {table} FOR EACH ROW EXECUTE FUNCTION {name}()")
+    # Rows written without the ORM hooks since chart.project_id was added
+    op.execute(
+        "UPDATE chart SET project_id = ("
+        "SELECT dashboard.project_id FROM dashboard_chart "
+        "JOIN dashboard ON dashboard.id = dashboard_chart.dashboard_id "
+        "WHERE dashboard_chart.chart_id = chart.id LIMIT 1) "
+        "WHERE project_id IS NULL"
+    )
+    op.execute(
+        "UPDATE chart SET project_id = ("
+        "SELECT database_connection.project_id FROM database_connection "
+        "WHERE database_connection.id = chart.connection_id) "
+        "WHERE project_id IS NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _, _ in reversed(TRIGGERS):
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {name}()")
@@ -0,0 +1,216 @@
+import asyncio
+import sys
+from uuid import UUID, uuid4
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.db import engine
+from app.models.permissions import Permissions as Permission
+from app.models.schema_models import (
+    ChartModel, DashboardChartsModel, DashboardModel, DatabaseConnectionModel, PermissionModel, ProjectModel,
+    RoleModel, RolePermissionModel, UserDashboardModel, UserModel, UserProjectRoleModel
+)
+from app.services.charts import get_chart, list_dashboard_charts, list_project_charts
+from app.services.db_connection import get_connections
+from app.schemas import CreateDashboardRequest, ProjectRequest
+from app.services.project import (
+    create_dashboard, create_project, get_dashboard_owner_service, get_project_owner_service, get_projects,
+    list_users_all_dashboard
+)
+from app.services.userService import list_all_users_project
+
+# Usage: python -m app.check_query_plans, or pytest tests/test_query_plans.py
+# Calls the services behind access checks, listings and the name checks of project
+# and dashboard creation on the configured Postgres database, on a few rows added
+# in a transaction that is rolled back, and explains every SELECT they issue with
+# sequential scans disabled. A check fails when one of those queries still reads a
+# table sequentially, so no index can serve it, or when an index the call is meant
+# to use is in none of the plans. A dropped or unusable index then shows up before
+# the tables grow.
+
+# (name, service call, indexes its queries must use)
+CHECKS = [
+    (
+        "access check and top charts of a project",
+        lambda db, rows, token: list_project_charts(rows["project_id"], 50, None, db, token),
+        ["user_pkey", "user_project_role_pkey", "role_permission_pkey", "ix_chart_project_relevance"]
+    ),
+    (
+        "charts of a dashboard",
+        lambda db, rows, token: list_dashboard_charts(rows["project_id"], rows["dashboard_id"], 50, None, db, token),
+        ["dashboard_pkey", "dashboard_chart_pkey"]
+    ),
+    (
+        "one chart",
+        lambda db, rows, token: get_chart(rows["project_id"], rows["chart_id"], db, token),
+        ["chart_pkey"]
+    ),
+    (
+        "connections of a project",
+        lambda db, rows, token: get_connections(
+            rows["project_id"], None, None, db, token, mode="summary", credentials="masked"
+        ),
+        ["ix_database_connection_project_id"]
+    ),
+    (
+        "members of a project",
+        lambda db, rows, token: list_all_users_project(rows["project_id"], db, token),
+        ["ix_user_project_role_project_id"]
+    ),
+    (
+        "owners of a project",
+        lambda db, rows, token: get_project_owner_service(rows["project_id"], db),
+        ["project_pkey", "ix_user_project_role_project_id"]
+    ),
+    (
+        "dashboards of a user in a project",
+        lambda db, rows, token: list_users_all_dashboard(rows["project_id"], db, token),
+        ["ix_dashboard_project_id", "user_dashboard_pkey"]
+    ),
+    (
+        "owners of a dashboard",
+        lambda db, rows, token: get_dashboard_owner_service(rows["dashboard_id"], db),
+        ["ix_user_dashboard_dashboard_owner"]
+    ),
+    (
+        "projects of a user",
+        lambda db, rows, token: get_projects(None, None, db, token),
+        ["user_project_role_pkey", "project_pkey"]
+    ),
+    (
+        "project name check on create",
+        lambda db, rows, token: create_project(ProjectRequest(name=f"{rows['name']}-created"), db, token),
+        ["ix_project_name", "user_project_role_pkey"]
+    ),
+    (
+        "dashboard title check on create",
+        lambda db, rows, token: create_dashboard(
+            CreateDashboardRequest(title=f"{rows['name']}-created"), db, token, rows["project_id"]
+        ),
+        ["ix_dashboard_title"]
+    ),
+]
+
+# Dashboards of the same user in another project, so the user's own dashboards are
+# the less selective way into "dashboards of a user in a project"
+OTHER_DASHBOARDS = 50
+
+
+def _add_rows(db: Session) -> dict:
+    """
+    A non-superuser who owns a project, a dashboard with a chart and a connection,
+    so the access checks and listings run all of their queries.
+    """
+    name = f"plan-check-{uuid4().hex}"
+    user = UserModel(username=name, password="-", email=f"{name}@example.com")
+    db.add(user)
+    db.flush()
+    project, other_project = ProjectModel(name=name), ProjectModel(name=f"{name}-other")
+    db.add_all([project, other_project])
+    db.flush()
+    role = RoleModel(name=name, project_id=project.id)
+    db.add(role)
+    # create_project gives the creator this role
+    if db.query(RoleModel).filter(RoleModel.name == "ALL role").first() is None:
+        db.add(RoleModel(name="ALL role", is_global=True))
+    # check_access asks for the datasource permission whatever the endpoint's permission is,
+    # and for the create project permission on create_project
+    for permission in (Permission.ADD_DATASOURCE, Permission.CREATE_PROJECT):
+        permission_id = UUID(permission.value)
+        if db.get(PermissionModel, permission_id) is None:
+            db.add(PermissionModel(id=permission_id, type=permission.name))
+        db.flush()
+        db.add(RolePermissionModel(role_id=role.id, permission_id=permission_id))
+    db.add(UserProjectRoleModel(user_id=user.id, project_id=project.id, role_id=role.id, is_owner=True))
+    connection = DatabaseConnectionModel(connection_name="plan-check", db_connection_string="-", project_id=project.id)
+    dashboard = DashboardModel(title=name, project_id=project.id, created_by=user.id)
+    others = [
+        DashboardModel(title=f"{name}-other-{n}", project_id=other_project.id, created_by=user.id)
+        for n in range(OTHER_DASHBOARDS)
+    ]
+    db.add_all([connection, dashboard, *others])
+    db.flush()
+    chart = ChartModel(
+        title="plan-check", query="SELECT 1", type="bar", relevance=1.0, is_time_based=False,
+        chart_type="bar", created_by=user.id, connection_id=connection.id
+    )
+    db.add(chart)
+    db.flush()
+    db.add_all([
+        UserDashboardModel(user_id=user.id, dashboard_id=board.id, is_owner=board is dashboard)
+        for board in (dashboard, *others)
+    ])
+    db.add(DashboardChartsModel(dashboard_id=dashboard.id, chart_id=chart.id))
+    db.flush()
+    return {
+        "name": name, "user_id": user.id, "project_id": project.id, "dashboard_id": dashboard.id, "chart_id": chart.id
+    }
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check(connection, db: Session, call, rows: dict, indexes: list) -> tuple:
+    """
+    Run a service call and explain the SELECTs it issued. Returns whether they all
+    avoid sequential scans and use ``indexes``, and the scans their plans use.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        asyncio.run(call(db, rows, {"sub": str(rows["user_id"])}))
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+    nodes = []
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()[0]["Plan"]
+        nodes.extend(node for node in _plan_nodes(plan) if "Scan" in node["Node Type"])
+    scans = [f"{node['Node Type']} on {node.get('Index Name') or node.get('Relation Name')}" for node in nodes]
+    used = {node.get("Index Name") for node in nodes}
+    ok = bool(statements) and all(node["Node Type"] != "Seq Scan" for node in nodes) and used.issuperset(indexes)
+    return ok, scans
+
+
+def run_checks() -> list:
+    """
+    (name, ok, expected indexes, scans) for every check; nothing they write is kept.
+    """
+    results = []
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            # Without this an empty or small table is read sequentially whatever indexes exist
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            db = Session(bind=connection, join_transaction_mode="create_savepoint")
+            rows = _add_rows(db)
+            # Statistics that count the rows above, which the transaction can see; rolled back with it
+            connection.exec_driver_sql("ANALYZE dashboard, user_dashboard")
+            for name, call, indexes in CHECKS:
+                ok, scans = check(connection, db, call, rows, indexes)
+                results.append((name, ok, indexes, scans))
+            db.close()
+        finally:
+            transaction.rollback()
+    return results
+
+
+if __name__ == "__main__":
+    if engine.dialect.name != "postgresql":
+        sys.exit("Query plans can only be checked on Postgres")
+    results = run_checks()
+    for name, ok, indexes, scans in results:
+        print(f"{'✅' if ok else '❌'} {name}: expected {', '.join(indexes) or 'no sequential scan'}, plans use {', '.join(scans) or 'no scan'}")
+    failed = sum(not ok for _, ok, _, _ in results)
+    if failed:
+        sys.exit(f"{failed} of {len(results)} service calls do not use their indexes")
+    print(f"✅ All {len(results)} service calls use their indexes")
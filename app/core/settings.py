@@ -11,7 +11,98 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int
     # LLM_URI: str
     ENCRYPTION_KEY: str
+    # Comma-separated keys that are still accepted for decryption during a key rotation
+    ENCRYPTION_KEYS_PREVIOUS: str = ""
+    CREDENTIAL_CACHE_TTL_SECONDS: int = 60
+    CREDENTIAL_CACHE_SIZE: int = 10000
 
+    # External (customer) database connections
+    EXTERNAL_POOL_SIZE: int = 5
+    EXTERNAL_MAX_OVERFLOW: int = 5
+    CONNECTION_STREAM_BATCH_SIZE: int = 20
+    EXTERNAL_CONNECT_TIMEOUT_SECONDS: int = 10
+    EXTERNAL_STATEMENT_TIMEOUT_SECONDS: float = 30
+    INTROSPECTION_DEADLINE_SECONDS: float = 120
+
+    # Date/timestamp column profiling
+    PROFILE_MAX_CONCURRENCY: int = 4
+    PROFILE_CACHE_TTL_SECONDS: int = 3600
+    PROFILE_SAMPLE_PERCENT: float = 1.0
+    PROFILE_SAMPLE_ROWS: int = 10000
+
+    # Schema reflection: comma-separated schema names, "*" for every non-system schema
+    SCHEMA_INCLUDE: str = ""
+    SCHEMA_EXCLUDE: str = ""
+    SCHEMA_REFLECTION_WORKERS: int = 4
+
+    # Chart query execution
+    CHART_ROW_LIMIT: int = 10000
+    CHART_MAX_ROW_LIMIT: int = 100000
+    CHART_QUERY_TIMEOUT_SECONDS: float = 30
+    CHART_MAX_CONCURRENCY_PER_CONNECTION: int = 4
+    CHART_QUEUE_TIMEOUT_SECONDS: float = 10
+    # Sampling mode: default fraction of rows read from a chart's first table, and the
+    # Postgres TABLESAMPLE method (SYSTEM samples pages, BERNOULLI samples rows)
+    CHART_SAMPLE_FRACTION: float = 0.01
+    CHART_SAMPLE_METHOD: str = "SYSTEM"
+    # Lift literals of chart queries into bind parameters so drivers can reuse prepared statements
+    CHART_PARAMETERIZE_QUERIES: bool = True
+    # Upper bound on source rows read for one downsampled series
+    DOWNSAMPLE_MAX_SOURCE_ROWS: int = 1000000
+    # Rows fetched at a time when a series is downsampled in the app while it streams in
+    CHART_FETCH_CHUNK_ROWS: int = 50000
+    # Incremental refresh of time-based charts
+    CHART_INCREMENTAL_OVERLAP_SECONDS: float = 300
+    CHART_INCREMENTAL_FULL_REFRESH_SECONDS: float = 3600
+    CHART_SERIES_CACHE_TTL_SECONDS: int = 86400
+
+    # Pre-execution cost guard based on the planner's EXPLAIN estimates (Postgres, MySQL)
+    QUERY_GUARD_ENABLED: bool = True
+    # Only guard charts with is_user_generated set
+    QUERY_GUARD_USER_GENERATED_ONLY: bool = False
+    QUERY_GUARD_MAX_ROWS: int = 50000000
+    # Plan costs are in the planner's own units: Postgres counts page fetches (seq_page_cost = 1),
+    # MySQL's query_cost about 0.1 per row read, so each dialect has its own limit
+    QUERY_GUARD_MAX_COST: float = 10000000
+    QUERY_GUARD_MAX_COST_MYSQL: float = 5000000
+    # "reject" refuses expensive queries, "limit" wraps them in a LIMIT of the row limit
+    QUERY_GUARD_ACTION: str = "reject"
+    QUERY_GUARD_PLAN_CACHE_TTL_SECONDS: int = 600
+
+    # Fair sharing of chart query execution slots between projects
+    FAIR_SCHEDULER_SLOTS: int = 24
+    FAIR_SCHEDULER_MAX_QUEUED_PER_PROJECT: int = 50
+    # Longest a query may wait for a slot before it is rejected
+    FAIR_SCHEDULER_WAIT_SLO_SECONDS: float = 10
+    # Comma-separated project_id=weight pairs; other projects weigh 1
+    FAIR_SCHEDULER_WEIGHTS: str = ""
+
+    # Chart result cache: "memory" (per process), "file" (shared on the host) or "none"
+    RESULT_CACHE_BACKEND: str = "memory"
+    RESULT_CACHE_DIR: str = "/tmp/vizai-result-cache"
+    RESULT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 300
+
+    # Background warming of each project's most viewed charts
+    CACHE_WARM_ENABLED: bool = True
+    CACHE_WARM_INTERVAL_SECONDS: float = 60
+    CACHE_WARM_TOP_CHARTS_PER_PROJECT: int = 10
+    # Views decay by half over this period; charts below CACHE_WARM_MIN_SCORE are not warmed
+    CACHE_WARM_HALF_LIFE_SECONDS: float = 3600
+    CACHE_WARM_MIN_SCORE: float = 2
+    # Warming queries running at once across all connections
+    CACHE_WARM_MAX_CONCURRENCY: int = 2
+
+    # Local Parquet extracts of selected source tables, queried with DuckDB
+    EXTRACT_DIR: str = "/tmp/vizai-extracts"
+    EXTRACT_BATCH_SIZE: int = 50000
+    # Default refresh period of a connection's extract
+    EXTRACT_REFRESH_SECONDS: int = 3600
+    EXTRACT_CHECK_INTERVAL_SECONDS: float = 60
+    EXTRACT_TIMEOUT_SECONDS: float = 3600
+    # Extract refreshes running at once in this process
+    EXTRACT_MAX_CONCURRENCY: int = 1
+    EXTRACT_QUERY_THREADS: int = 4
 
     class Config:
         env_file = ".env"
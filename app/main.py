@@ -1,3 +1,6 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -5,9 +8,23 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes.auth import auth_router
 from app.routes.backend import backend_router
+from app.core.settings import settings
+from app.services.chart_data import run_chart_warmer
+from app.services.extracts import run_extract_refresher
 # from database import engine, Base
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(run_extract_refresher())]
+    if settings.CACHE_WARM_ENABLED:
+        tasks.append(asyncio.create_task(run_chart_warmer()))
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,6 +1,6 @@
 from operator import is_
-from sqlalchemy import Column, String, ForeignKey, DateTime, func, Text, Boolean, Double, BigInteger
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, String, ForeignKey, DateTime, func, Text, Boolean, Double, BigInteger, Integer, JSON, Index, event, select, update
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import uuid4
 from app.core.base import Base
@@ -18,18 +18,18 @@ class UserModel(Base):
     updated_at = Column(DateTime, nullable=True, onupdate=func.now())
     is_super=Column(Boolean, nullable=True, default=False)
 
-    user_project_role = relationship("UserProjectRoleModel", back_populates="user", cascade="all, delete-orphan")
-    api_key = relationship("ApiKeyModel", back_populates="user", uselist=False, cascade="all, delete-orphan")
-    user_dashboard = relationship("UserDashboardModel", back_populates="user", cascade="all, delete-orphan")
-    user_chart = relationship("UserChartModel", back_populates="user", cascade="all, delete-orphan")
-    dashboards = relationship("DashboardModel", back_populates="user", cascade="all, delete-orphan")
-    charts = relationship("ChartModel", back_populates="user", cascade="all, delete-orphan")
-    projects = relationship("ProjectModel", back_populates="super_user", foreign_keys="ProjectModel.super_user_id")
+    user_project_role = relationship("UserProjectRoleModel", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    api_key = relationship("ApiKeyModel", back_populates="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    user_dashboard = relationship("UserDashboardModel", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    user_chart = relationship("UserChartModel", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    dashboards = relationship("DashboardModel", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    charts = relationship("ChartModel", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    projects = relationship("ProjectModel", back_populates="super_user", foreign_keys="ProjectModel.super_user_id", passive_deletes=True)
     
 class RolePermissionModel(Base):
     __tablename__ = 'role_permission'
-    role_id = Column(UUID, ForeignKey("role.id"), primary_key=True)
-    permission_id = Column(UUID, ForeignKey("permission.id"), primary_key=True)
+    role_id = Column(UUID, ForeignKey("role.id", ondelete="CASCADE"), primary_key=True)
+    permission_id = Column(UUID, ForeignKey("permission.id", ondelete="CASCADE"), primary_key=True)
     
 
     role = relationship("RoleModel", back_populates="role_permission")
@@ -48,10 +48,14 @@ class UserDashboardModel(Base):
     user = relationship("UserModel", back_populates="user_dashboard")
     dashboard = relationship("DashboardModel", back_populates="user_dashboard")
 
+
+# Dashboard owner lookups; the primary key leads with user_id
+Index("ix_user_dashboard_dashboard_owner", UserDashboardModel.dashboard_id, UserDashboardModel.is_owner)
+
 class UserChartModel(Base):
     __tablename__ = 'user_chart'
     user_id = Column(UUID, ForeignKey("user.id",ondelete="CASCADE"), primary_key=True)
-    chart_id = Column(UUID, ForeignKey("chart.id",ondelete="CASCADE"), primary_key=True)
+    chart_id = Column(UUID, ForeignKey("chart.id",ondelete="CASCADE"), primary_key=True, index=True)
     can_write = Column(Boolean, nullable=False, default=False)
     can_read = Column(Boolean, nullable=False, default=True)
     can_delete = Column(Boolean, nullable=False, default=False)
@@ -76,18 +80,18 @@ class ApiKeyModel(Base):
 class ProjectModel(Base):
     __tablename__ = 'project'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    name = Column(String, nullable=False)
-    super_user_id = Column(UUID, ForeignKey("user.id"))
+    name = Column(String, nullable=False, index=True)
+    super_user_id = Column(UUID, ForeignKey("user.id", ondelete="SET NULL"), index=True)
     description = Column(Text)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
-    user_project_role = relationship("UserProjectRoleModel", back_populates="project", cascade="all, delete-orphan")
-    api_key = relationship("ApiKeyModel", back_populates="project", cascade="all, delete-orphan")
-    roles = relationship("RoleModel", back_populates="project", cascade="all, delete-orphan")
+    user_project_role = relationship("UserProjectRoleModel", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    api_key = relationship("ApiKeyModel", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    roles = relationship("RoleModel", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
     super_user = relationship("UserModel", back_populates="projects", foreign_keys=[super_user_id])
     
-    dashboards = relationship("DashboardModel", back_populates="project", cascade="all, delete-orphan")
-    database_connections = relationship("DatabaseConnectionModel", back_populates="project", cascade="all, delete-orphan") 
+    dashboards = relationship("DashboardModel", back_populates="project", cascade="all, delete-orphan", passive_deletes=True)
+    database_connections = relationship("DatabaseConnectionModel", back_populates="project", cascade="all, delete-orphan", passive_deletes=True) 
 
 # Role Model    
 class RoleModel(Base):
@@ -95,20 +99,21 @@ class RoleModel(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, unique=True, nullable=False)
     description = Column(Text, nullable=True)
-    project_id = Column(UUID, ForeignKey("project.id"), nullable=True)
+    project_id = Column(UUID, ForeignKey("project.id", ondelete="CASCADE"), nullable=True, index=True)
     is_global = Column(Boolean, nullable=True, default=False)
 
 
-    user_project_role = relationship("UserProjectRoleModel", back_populates="role", cascade="all, delete-orphan")
-    role_permission = relationship("RolePermissionModel", back_populates="role", cascade="all, delete-orphan")
+    user_project_role = relationship("UserProjectRoleModel", back_populates="role", cascade="all, delete-orphan", passive_deletes=True)
+    role_permission = relationship("RolePermissionModel", back_populates="role", cascade="all, delete-orphan", passive_deletes=True)
     project = relationship("ProjectModel", back_populates="roles")
 
 # User-Project-Role Mapping (Many-to-Many)
 class UserProjectRoleModel(Base):
     __tablename__ = 'user_project_role'
-    user_id = Column(UUID, ForeignKey("user.id"), primary_key=True)
-    project_id = Column(UUID, ForeignKey("project.id"), primary_key=True)
-    role_id = Column(UUID, ForeignKey("role.id"), primary_key=True)
+    # The primary key serves lookups by user_id and by (user_id, project_id)
+    user_id = Column(UUID, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    project_id = Column(UUID, ForeignKey("project.id", ondelete="CASCADE"), primary_key=True, index=True)
+    role_id = Column(UUID, ForeignKey("role.id", ondelete="CASCADE"), primary_key=True, index=True)
     is_owner = Column(Boolean, nullable=True, default=False)
 
     user = relationship("UserModel", back_populates="user_project_role")
@@ -121,22 +126,22 @@ class PermissionModel(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     type = Column(String, nullable=False)
     role_permission = relationship("RolePermissionModel", back_populates="permission",
-                              cascade="all, delete-orphan")
+                              cascade="all, delete-orphan", passive_deletes=True)
 
 # Dashboard Model
 class DashboardModel(Base):
     __tablename__ = 'dashboard'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    title = Column(String, nullable=False)
-    project_id = Column(UUID, ForeignKey("project.id"), nullable=False)
+    title = Column(String, nullable=False, index=True)
+    project_id = Column(UUID, ForeignKey("project.id", ondelete="CASCADE"), nullable=False, index=True)
     description = Column(Text)
-    created_by = Column(UUID, ForeignKey("user.id"), nullable=False)
+    created_by = Column(UUID, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
 
     user = relationship("UserModel", back_populates="dashboards")
     project = relationship("ProjectModel", back_populates="dashboards")
     
-    user_dashboard = relationship("UserDashboardModel", back_populates="dashboard")
-    charts = relationship("DashboardChartsModel", back_populates="dashboard")
+    user_dashboard = relationship("UserDashboardModel", back_populates="dashboard", cascade="all, delete-orphan", passive_deletes=True)
+    charts = relationship("DashboardChartsModel", back_populates="dashboard", cascade="all, delete-orphan", passive_deletes=True)
 
 
 # Chart Model
@@ -144,30 +149,44 @@ class ChartModel(Base):
     __tablename__ = 'chart'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     title = Column(String, nullable=False)
-    query = Column(Text, nullable=False)
-    report = Column(Text, nullable=True)
+    # Unbounded text, loaded only when accessed or undeferred; listings never read it
+    query = deferred(Column(Text, nullable=False))
+    report = deferred(Column(Text, nullable=True))
     type = Column(String, nullable=False)
     relevance = Column(Double, nullable=False)
     is_time_based = Column(Boolean, nullable=False)
     chart_type = Column(String, nullable=False)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
     is_user_generated = Column(Boolean, nullable=False, default=False)
-    user_chart = relationship("UserChartModel", back_populates="chart")
-    created_by = Column(UUID, ForeignKey("user.id"), nullable=False)
+    user_chart = relationship("UserChartModel", back_populates="chart", cascade="all, delete-orphan", passive_deletes=True)
+    created_by = Column(UUID, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    connection_id = Column(UUID, ForeignKey("database_connection.id", ondelete="SET NULL"), nullable=True, index=True)
+    # Owning project, for ranked listings; filled from the connection or dashboard when not given,
+    # by the hooks below and, for writers outside this app, by database triggers
+    project_id = Column(UUID, ForeignKey("project.id", ondelete="CASCADE"), nullable=True)
+    # Seconds chart results stay cached; NULL uses RESULT_CACHE_TTL_SECONDS, 0 disables caching
+    cache_ttl_seconds = Column(Integer, nullable=True)
+    # Column the query's top-level FROM exposes for dashboard time filters; NULL filters the output's time column
+    time_column = Column(String, nullable=True)
 
     user = relationship("UserModel", back_populates="charts")
-    dashboard_charts = relationship("DashboardChartsModel", back_populates="chart")
+    dashboard_charts = relationship("DashboardChartsModel", back_populates="chart", cascade="all, delete-orphan", passive_deletes=True)
+    connection = relationship("DatabaseConnectionModel")
 
 # Dashboard-Chart Relationship (Many-to-Many)
 class DashboardChartsModel(Base):
     __tablename__ = 'dashboard_chart'
-    dashboard_id = Column(UUID, ForeignKey("dashboard.id"), primary_key=True)
-    chart_id = Column(UUID, ForeignKey("chart.id"), primary_key=True)
+    dashboard_id = Column(UUID, ForeignKey("dashboard.id", ondelete="CASCADE"), primary_key=True)
+    chart_id = Column(UUID, ForeignKey("chart.id", ondelete="CASCADE"), primary_key=True, index=True)
 
     dashboard = relationship("DashboardModel", back_populates="charts")
     chart = relationship("ChartModel", back_populates="dashboard_charts")
 
 
+# Serves the top charts of a project in relevance order
+Index("ix_chart_project_relevance", ChartModel.project_id, ChartModel.relevance.desc(), ChartModel.id.desc())
+
+
 # Database Connection Model (For External DBs)
 class DatabaseConnectionModel(Base):
     __tablename__ = 'database_connection'
@@ -179,7 +198,30 @@ class DatabaseConnectionModel(Base):
     db_password = Column(String, nullable=True)
     db_host_link = Column(String, nullable=True)
     db_name = Column(String, nullable=True)
-    project_id = Column(UUID, ForeignKey("project.id"), nullable=False)
+    project_id = Column(UUID, ForeignKey("project.id", ondelete="CASCADE"), nullable=False, index=True)
     db_type = Column(String, nullable=True)
-
-    project = relationship("ProjectModel", back_populates="database_connections")
\ No newline at end of file
+    # Extract mode: charts run on a local Parquet snapshot of these tables ("table" or "schema.table")
+    extract_enabled = Column(Boolean, nullable=False, default=False)
+    extract_tables = Column(JSON, nullable=True)
+    # Seconds between extract refreshes; NULL uses EXTRACT_REFRESH_SECONDS
+    extract_refresh_seconds = Column(Integer, nullable=True)
+    extract_refreshed_at = Column(DateTime, nullable=True)
+
+    project = relationship("ProjectModel", back_populates="database_connections")
+
+
+@event.listens_for(ChartModel, "before_insert")
+def _default_chart_project(mapper, connection, target):
+    if target.project_id is None and target.connection_id is not None:
+        target.project_id = connection.scalar(
+            select(DatabaseConnectionModel.project_id).where(DatabaseConnectionModel.id == target.connection_id)
+        )
+
+
+@event.listens_for(DashboardChartsModel, "after_insert")
+def _chart_project_from_dashboard(mapper, connection, target):
+    connection.execute(
+        update(ChartModel.__table__)
+        .where(ChartModel.id == target.chart_id, ChartModel.project_id.is_(None))
+        .values(project_id=select(DashboardModel.project_id).where(DashboardModel.id == target.dashboard_id).scalar_subquery())
+    )
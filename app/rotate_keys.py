@@ -0,0 +1,20 @@
+import argparse
+from uuid import UUID
+
+from app.utils.key_rotation import rotate_connection_credentials
+
+# Usage: set ENCRYPTION_KEY to the new key and ENCRYPTION_KEYS_PREVIOUS to the old one(s), then
+#   python -m app.rotate_keys --checkpoint rotation.json
+parser = argparse.ArgumentParser(description="Re-encrypt stored database credentials under the current ENCRYPTION_KEY")
+parser.add_argument("--batch-size", type=int, default=500)
+parser.add_argument("--resume-after", type=UUID, default=None, help="Continue after this connection id")
+parser.add_argument("--checkpoint", default=None, help="File recording the last processed id, for resuming")
+args = parser.parse_args()
+
+stats = rotate_connection_credentials(
+    batch_size=args.batch_size,
+    resume_after=args.resume_after,
+    checkpoint_path=args.checkpoint,
+    progress=lambda s: print(f"batch {s['batches']}: scanned {s['scanned']}, rotated {s['rotated']}, skipped {s['skipped']}, conflicts {s['conflicts']}, last id {s['last_id']}")
+)
+print(f"✅ Key rotation finished: {stats}")
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, status, Response, Depends, Request, Path
+from fastapi import APIRouter, status, Response, Depends, Request, Path, Query
 from sqlalchemy.orm import Session, backref
 from uuid import UUID
+from typing import Optional
+from datetime import datetime
 
 from app.core.db import get_db
-from app.schemas import ProjectRequest,DBConnectionResponse,DBConnectionRequest, UpdateDashboardRequest, UpdateRoleRequest, UpdateDBConnectionRequest
+from app.schemas import ProjectRequest,DBConnectionResponse,DBConnectionRequest, UpdateDashboardRequest, UpdateRoleRequest, UpdateDBConnectionRequest, ExtractRequest, UpdateChartRequest
 from app.services.project import create_project, get_projects, list_all_roles_project, create_dashboard, list_all_permissions, create_role,list_users_all_dashboard, delete_dashboard, update_project,delete_project,update_dashboard,update_role,delete_role,get_project_owner_service,get_dashboard_owner_service
 from app.utils.token_parser import get_current_user
 
-from app.services.db_connection import create_database_connection, get_connections, update_db_connection, delete_db_connection
+from app.services.db_connection import create_database_connection, get_connections, update_db_connection, delete_db_connection, search_connection_schema, cancel_introspection_job
+from app.services.chart_data import get_chart_data, invalidate_chart_cache, get_chart_cache_metrics, get_dashboard_data, get_query_queue_metrics, get_query_shape_stats
+from app.services.charts import list_project_charts, list_dashboard_charts, get_chart, update_chart
+from app.services.extracts import configure_extract, refresh_extract, get_extract, disable_extract
 
 from app.services.userService import create_user_project, list_all_users_project, add_user_to_dashboard, get_user_details, update_user, delete_user,create_super_user_service,get_super_user_service,get_users_dashboard_service
 from app.schemas import CreateUserProjectRequest, CreateUserProjectResponse, ListAllUsersProjectResponse, ListAllRolesProjectResponse, CreateDashboardRequest, CreateDashboardResponse, ListAllPermissionsResponse, CreateRoleRequest, CreateRoleResponse, AddUserDashboardRequest, AddUserDashboardResponse,UpdateProjectRequest, UpdateUserRequest,CreateSuperUserRequest
@@ -42,6 +47,8 @@ Returns:
 async def add_database_connection(
     project_id: UUID,
     data: DBConnectionRequest,
+    request: Request,
+    job_id: Optional[str] = Query(None, max_length=64, description="Client-chosen ID to cancel the schema introspection with"),
     db: Session = Depends(get_db),
     token_payload: dict = Depends(get_current_user)
 ):
@@ -50,17 +57,40 @@ async def add_database_connection(
     Args:
         project_id (UUID): The project ID.
         data (DBConnectionRequest): The database connection data.
+        request (Request): The request object.
+        job_id (str): Optional ID for cancelling the introspection.
         db (Session): The database session.
         token_payload (dict): The token payload.
     Returns:
         dict: The created database connection.
     """
-    return await create_database_connection(project_id, token_payload, data, db)
+    return await create_database_connection(project_id, token_payload, data, db, request, job_id)
+
+@backend_router.delete("/projects/{project_id}/introspection/{job_id}", status_code=status.HTTP_200_OK)
+async def cancel_introspection_route(
+    project_id: UUID = Path(..., description="Project ID the introspection runs for"),
+    job_id: str = Path(..., description="Job ID given when creating the connection"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Cancel a running schema introspection.
+    Args:
+        project_id (UUID): The project ID.
+        job_id (str): The introspection job ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: Confirmation message.
+    """
+    return await cancel_introspection_job(project_id, job_id, db, token_payload)
 
 
 @backend_router.get("/connections/{project_id}", status_code=status.HTTP_200_OK, response_model=dict)
 async def get_connections_route(
     project_id: UUID = Path(..., description="Project ID to get connections for"),
+    mode: str = Query("full", pattern="^(full|summary|stream)$", description="full, summary (no schema) or stream (NDJSON)"),
+    credentials: str = Query("decrypted", pattern="^(decrypted|masked)$", description="decrypted or masked credentials"),
     request: Request = None,
     response: Response = None,
     db: Session = Depends(get_db),
@@ -70,14 +100,345 @@ async def get_connections_route(
     Get all connections for a project.
     Args:
         project_id (UUID): The project ID.
+        mode (str): full, summary or stream.
+        credentials (str): decrypted or masked.
         request (Request): The request object.
         response (Response): The response object.
         db (Session): The database session.
         token_payload (dict): The token payload.
     Returns:
-        dict: The connections for the project.
+        dict: The connections for the project, or an NDJSON stream in stream mode.
+    """
+    return await get_connections(project_id, request, response, db, token_payload, mode, credentials)
+
+@backend_router.get("/projects/{project_id}/connections/{connection_id}/schema/search", status_code=status.HTTP_200_OK, response_model=dict)
+async def search_connection_schema_route(
+    project_id: UUID = Path(..., description="Project ID the connection belongs to"),
+    connection_id: UUID = Path(..., description="Connection ID to search the schema of"),
+    q: str = Query(..., min_length=1, description="Table, column or type to search for"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of matches"),
+    fuzzy: bool = Query(True, description="Include fuzzy matches when prefix matches are scarce"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Search the tables and columns of a connection's schema.
+    Args:
+        project_id (UUID): The project ID.
+        connection_id (UUID): The connection ID.
+        q (str): The search text.
+        limit (int): The maximum number of matches.
+        fuzzy (bool): Whether to include fuzzy matches.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The matching tables and columns.
+    """
+    return await search_connection_schema(project_id, connection_id, q, limit, fuzzy, db, token_payload)
+
+@backend_router.put("/projects/{project_id}/connections/{connection_id}/extract", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def configure_extract_route(
+    data: ExtractRequest,
+    project_id: UUID = Path(..., description="Project ID the connection belongs to"),
+    connection_id: UUID = Path(..., description="Connection ID to extract tables from"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Enable extract mode for a connection: its charts run on a local Parquet
+    snapshot of the given tables, refreshed on a schedule.
+    Args:
+        data (ExtractRequest): The tables ("table" or "schema.table") and refresh period in seconds.
+        project_id (UUID): The project ID.
+        connection_id (UUID): The connection ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The extract settings and the state of the refresh that was started.
+    """
+    return await configure_extract(project_id, connection_id, data, db, token_payload)
+
+@backend_router.post("/projects/{project_id}/connections/{connection_id}/extract/refresh", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def refresh_extract_route(
+    project_id: UUID = Path(..., description="Project ID the connection belongs to"),
+    connection_id: UUID = Path(..., description="Connection ID to refresh the extract of"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Refresh a connection's extract now.
+    Args:
+        project_id (UUID): The project ID.
+        connection_id (UUID): The connection ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The extract settings and the state of the refresh that was started.
+    """
+    return await refresh_extract(project_id, connection_id, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/connections/{connection_id}/extract", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_extract_route(
+    project_id: UUID = Path(..., description="Project ID the connection belongs to"),
+    connection_id: UUID = Path(..., description="Connection ID to get the extract of"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Get a connection's extract settings, current extract and refresh state.
+    Args:
+        project_id (UUID): The project ID.
+        connection_id (UUID): The connection ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The extract.
+    """
+    return await get_extract(project_id, connection_id, db, token_payload)
+
+@backend_router.delete("/projects/{project_id}/connections/{connection_id}/extract", status_code=status.HTTP_200_OK, response_model=dict)
+async def disable_extract_route(
+    project_id: UUID = Path(..., description="Project ID the connection belongs to"),
+    connection_id: UUID = Path(..., description="Connection ID to disable extract mode for"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Disable extract mode for a connection and delete its extract.
+    Args:
+        project_id (UUID): The project ID.
+        connection_id (UUID): The connection ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: Confirmation message.
+    """
+    return await disable_extract(project_id, connection_id, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/charts", status_code=status.HTTP_200_OK, response_model=dict)
+async def list_project_charts_route(
+    project_id: UUID = Path(..., description="Project ID to list charts for"),
+    limit: int = Query(50, ge=1, le=500, description="Number of charts per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    List a project's charts, most relevant first.
+    Args:
+        project_id (UUID): The project ID.
+        limit (int): The number of charts per page.
+        cursor (str): The cursor of the page to fetch.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: A page of charts and the cursor of the next page.
+    """
+    return await list_project_charts(project_id, limit, cursor, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/charts/{chart_id}", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_chart_route(
+    project_id: UUID = Path(..., description="Project ID the chart belongs to"),
+    chart_id: UUID = Path(..., description="Chart ID to fetch"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Get a chart with its query and report.
+    Args:
+        project_id (UUID): The project ID.
+        chart_id (UUID): The chart ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The chart.
+    """
+    return await get_chart(project_id, chart_id, db, token_payload)
+
+@backend_router.patch("/projects/{project_id}/charts/{chart_id}", status_code=status.HTTP_200_OK, response_model=dict)
+async def update_chart_route(
+    data: UpdateChartRequest,
+    project_id: UUID = Path(..., description="Project ID the chart belongs to"),
+    chart_id: UUID = Path(..., description="Chart ID to update"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Update a chart's time column.
+    Args:
+        data (UpdateChartRequest): The fields to update.
+        project_id (UUID): The project ID.
+        chart_id (UUID): The chart ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The updated chart.
+    """
+    return await update_chart(project_id, chart_id, data, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/dashboards/{dashboard_id}/charts", status_code=status.HTTP_200_OK, response_model=dict)
+async def list_dashboard_charts_route(
+    project_id: UUID = Path(..., description="Project ID the dashboard belongs to"),
+    dashboard_id: UUID = Path(..., description="Dashboard ID to list charts for"),
+    limit: int = Query(50, ge=1, le=500, description="Number of charts per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    List a dashboard's charts, most relevant first.
+    Args:
+        project_id (UUID): The project ID.
+        dashboard_id (UUID): The dashboard ID.
+        limit (int): The number of charts per page.
+        cursor (str): The cursor of the page to fetch.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: A page of charts and the cursor of the next page.
+    """
+    return await list_dashboard_charts(project_id, dashboard_id, limit, cursor, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/charts/{chart_id}/data", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_chart_data_route(
+    request: Request,
+    project_id: UUID = Path(..., description="Project ID the chart belongs to"),
+    chart_id: UUID = Path(..., description="Chart ID to fetch data for"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows, capped at CHART_MAX_ROW_LIMIT"),
+    refresh: bool = Query(False, description="Bypass the result cache and re-run the query"),
+    width: Optional[int] = Query(None, ge=10, le=10000, description="Pixel width to downsample time-based charts to"),
+    downsample: str = Query("lttb", pattern="^(lttb|minmax)$", description="Downsampling method for time-based charts"),
+    incremental: bool = Query(False, description="Extend the cached series of time-based charts with new rows only"),
+    sample: bool = Query(False, description="Run on a random sample of the query's first table (Postgres only); results are approximate"),
+    sample_fraction: Optional[float] = Query(None, gt=0, lt=1, description="Fraction of rows to sample, defaults to CHART_SAMPLE_FRACTION"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Run a chart's query against its database connection.
+    Send Accept: application/vnd.vizai.columns+json for column-oriented JSON or
+    Accept: application/vnd.apache.arrow.stream for an Arrow IPC stream.
+    Args:
+        request (Request): The request object.
+        project_id (UUID): The project ID.
+        chart_id (UUID): The chart ID.
+        limit (int): The maximum number of rows.
+        refresh (bool): Whether to bypass the result cache.
+        width (int): The pixel width to downsample time-based charts to.
+        downsample (str): The downsampling method, "lttb" or "minmax".
+        incremental (bool): Whether to extend cached time series with new rows only.
+        sample (bool): Whether to run the query on a random sample.
+        sample_fraction (float): The fraction of rows to sample.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The chart, its typed columns and rows.
+    """
+    return await get_chart_data(
+        project_id, chart_id, limit, refresh, width, downsample, incremental, sample, sample_fraction, request, db, token_payload
+    )
+
+@backend_router.get("/projects/{project_id}/dashboards/{dashboard_id}/data", status_code=status.HTTP_200_OK)
+async def get_dashboard_data_route(
+    project_id: UUID = Path(..., description="Project ID the dashboard belongs to"),
+    dashboard_id: UUID = Path(..., description="Dashboard ID to fetch chart data for"),
+    width: Optional[int] = Query(None, ge=10, le=10000, description="Pixel width to downsample time-based charts to"),
+    downsample: str = Query("lttb", pattern="^(lttb|minmax)$", description="Downsampling method for time-based charts"),
+    incremental: bool = Query(False, description="Extend the cached series of time-based charts with new rows only"),
+    time_from: Optional[datetime] = Query(None, description="Start of the dashboard time range (inclusive) for time-based charts"),
+    time_to: Optional[datetime] = Query(None, description="End of the dashboard time range (exclusive) for time-based charts"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Stream the data of every chart on a dashboard as NDJSON, one line per chart
+    in the order the charts finish.
+    Args:
+        project_id (UUID): The project ID.
+        dashboard_id (UUID): The dashboard ID.
+        width (int): The pixel width to downsample time-based charts to.
+        downsample (str): The downsampling method, "lttb" or "minmax".
+        incremental (bool): Whether to extend cached time series with new rows only.
+        time_from (datetime): The start of the time range.
+        time_to (datetime): The end of the time range.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        StreamingResponse: A dashboard line, one line per chart and an end line.
+    """
+    return await get_dashboard_data(project_id, dashboard_id, width, downsample, incremental, time_from, time_to, db, token_payload)
+
+@backend_router.delete("/projects/{project_id}/charts/{chart_id}/cache", status_code=status.HTTP_200_OK, response_model=dict)
+async def invalidate_chart_cache_route(
+    project_id: UUID = Path(..., description="Project ID the chart belongs to"),
+    chart_id: UUID = Path(..., description="Chart ID to drop cached results for"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Drop the cached results of a chart.
+    Args:
+        project_id (UUID): The project ID.
+        chart_id (UUID): The chart ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The number of removed cache entries.
+    """
+    return await invalidate_chart_cache(project_id, chart_id, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/charts-cache/metrics", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_chart_cache_metrics_route(
+    project_id: UUID = Path(..., description="Project ID used for the access check"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Get result cache counters and hit ratio.
+    Args:
+        project_id (UUID): The project ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The cache metrics.
+    """
+    return await get_chart_cache_metrics(project_id, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/query-queue/metrics", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_query_queue_metrics_route(
+    project_id: UUID = Path(..., description="Project ID to get queue metrics for"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Get the project's chart query queue depth, rejections and wait times.
+    Args:
+        project_id (UUID): The project ID.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: The queue metrics.
+    """
+    return await get_query_queue_metrics(project_id, db, token_payload)
+
+@backend_router.get("/projects/{project_id}/query-shapes/stats", status_code=status.HTTP_200_OK, response_model=dict)
+async def get_query_shape_stats_route(
+    project_id: UUID = Path(..., description="Project ID to get query shape stats for"),
+    limit: int = Query(20, ge=1, le=100, description="Number of query shapes to return"),
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Get the project's chart query shapes with the most total execution time.
+    Args:
+        project_id (UUID): The project ID.
+        limit (int): Number of query shapes to return.
+        db (Session): The database session.
+        token_payload (dict): The token payload.
+    Returns:
+        dict: Latency statistics per query shape.
     """
-    return await get_connections(project_id, request, response, db, token_payload)
+    return await get_query_shape_stats(project_id, limit, db, token_payload)
 
 @backend_router.get("/projects", status_code=status.HTTP_200_OK)
 async def get_projects_route(
@@ -15,10 +15,13 @@ class DBConnectionRequest(BaseModel):
     host: Optional[str] = None
     db_name: Optional[str] = None 
     name: Optional[str] = None         # 👈 Needed
+    include_schemas: Optional[List[str]] = None
+    exclude_schemas: Optional[List[str]] = None
 
 
 class DBConnectionResponse(BaseModel):
     db_entry_id: UUID
+    schema_complete: bool = True
 
 
 class DBConnectionListResponse(BaseModel):
@@ -241,6 +244,9 @@ class UpdateDashboardRequest(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
 
+class UpdateChartRequest(BaseModel):
+    time_column: Optional[str] = None
+
 class UpdateRoleRequest(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -265,6 +271,10 @@ class UpdateDBConnectionRequest(BaseModel):
     db_name: Optional[str] = None
     db_type: Optional[str] = None
 
+class ExtractRequest(BaseModel):
+    tables: List[str]
+    refresh_seconds: Optional[int] = None
+
 class CreateSuperUserRequest(BaseModel):
     username: str
     email: str
@@ -0,0 +1,963 @@
+import asyncio
+import json
+import logging
+import time
+
+from sqlalchemy.orm import Session, undefer
+from fastapi import HTTPException, status, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from uuid import UUID
+from typing import Optional
+from dataclasses import replace
+from datetime import datetime, timezone
+
+from app.core.db import get_db, SessionLocal
+from app.core.settings import settings
+from app.models.schema_models import ChartModel, DashboardChartsModel, DashboardModel, DatabaseConnectionModel
+from app.services.charts import in_project
+from app.utils.chart_popularity import ChartPopularity
+from app.utils.cancellation import CancellationToken, OperationCancelled, run_cancellable
+from app.utils.crypt import decrypt_string_cached
+from app.utils.downsample import PUSHDOWN_DIALECTS, series_columns, bucket_query, chunk_reducer, downsample_result
+from app.utils.external_db import connection_key, get_external_engine
+from app.utils.extracts import execute_extract_query, load_manifest
+from app.utils.incremental import SeriesState, new_series_state, incremental_query
+from app.utils.query_guard import guard_query, QueryTooExpensive
+from app.utils.query_stats import QueryShapeStats
+from app.utils.query_engine import ChartResult, execute_query, execution_slot, project_queue_stats, execution_saturated, slot_available, QueryBusyError
+from app.utils.result_format import JSON_RECORDS, negotiate_format, render_chart_result
+from app.utils.result_cache import result_cache_key, cache_get, cache_peek, cache_set, cache_metrics, invalidate, chart_tag, connection_tag
+from app.utils.sampling import sample_error, sample_query
+from app.utils.single_flight import SingleFlight
+from app.utils.time_filter import infer_time_column, inject_time_filter, time_params, valid_column, wrap_time_filter
+from app.utils.sql_normalizer import normalize_sql, query_fingerprint
+from app.utils.ttl_cache import TTLCache
+from app.utils.token_parser import get_current_user
+from app.models.permissions import Permissions as Permission
+from app.utils.access import require_permission
+
+logger = logging.getLogger(__name__)
+
+# Shape of each chart query's output (time, value and key columns), found by a one-row probe
+_series_shapes = TTLCache(ttl=3600, maxsize=10000)
+
+# In-flight chart executions keyed by result cache key
+_chart_flights = SingleFlight()
+
+# Decayed view counts that decide which charts the warmer keeps cached
+_shape_stats = QueryShapeStats()
+_chart_popularity = ChartPopularity(settings.CACHE_WARM_HALF_LIFE_SECONDS)
+_warm_budget = asyncio.Semaphore(settings.CACHE_WARM_MAX_CONCURRENCY)
+_warm_stats = {"runs": 0, "warmed": 0, "skipped_fresh": 0, "skipped_busy": 0, "failed": 0, "last_run_at": None}
+
+
+def _load_chart(db: Session, project_id: UUID, chart_id: UUID) -> ChartModel:
+    """
+    Load a chart that belongs to the project, directly, through one of its
+    dashboards or through the connection it runs on.
+    """
+    chart = db.query(ChartModel).options(undefer(ChartModel.query)).filter(
+        ChartModel.id == chart_id,
+        in_project(db, project_id)
+    ).first()
+    if not chart:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+    return chart
+
+
+def _pick_connection(chart: ChartModel, connections: dict):
+    """
+    Pick a chart's connection id from the project's connections (keyed by str(id)).
+    Charts without a connection run on the project's connection when it has exactly one.
+    """
+    if chart.connection_id:
+        if str(chart.connection_id) not in connections:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database connection not found")
+        return str(chart.connection_id)
+    if len(connections) != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chart has no database connection and the project does not have exactly one"
+        )
+    return next(iter(connections))
+
+
+def _project_connections(db: Session, project_id: UUID, connection_id=None) -> dict:
+    """
+    Map str(connection id) to the encrypted connection string for a project's
+    connections, or only for ``connection_id`` when given.
+    """
+    query = db.query(
+        DatabaseConnectionModel.id,
+        DatabaseConnectionModel.db_connection_string
+    ).filter(DatabaseConnectionModel.project_id == project_id)
+    if connection_id:
+        query = query.filter(DatabaseConnectionModel.id == connection_id)
+    return {str(row.id): row.db_connection_string for row in query}
+
+
+def _resolve_connection(db: Session, project_id: UUID, chart: ChartModel):
+    """
+    Return (connection id, decrypted connection string) for a chart.
+    """
+    connections = _project_connections(db, project_id, chart.connection_id)
+    connection_id = _pick_connection(chart, connections)
+    return connection_id, decrypt_string_cached(connections[connection_id])
+
+
+def _serialize_chart(chart: ChartModel) -> dict:
+    return {
+        "id": str(chart.id),
+        "title": chart.title,
+        "type": chart.type,
+        "chart_type": chart.chart_type,
+        "is_time_based": chart.is_time_based,
+        "connection_id": str(chart.connection_id) if chart.connection_id else None
+    }
+
+
+async def _run_chart(
+    project_id,
+    connection_string: str,
+    sql: str,
+    row_limit: int,
+    request: Optional[Request] = None,
+    params: Optional[dict] = None,
+    guard: bool = False,
+    reducer=None
+):
+    """
+    Execute a chart query on the external database, waiting for a free slot of the
+    connection and then for the project's fair share of execution slots. Raises
+    HTTPException 429 when no slot frees up in time or the project's queue is full,
+    and 504 when the query runs past CHART_QUERY_TIMEOUT_SECONDS. With ``guard`` the plan
+    estimate is checked first and expensive queries are rejected with 400 or limited.
+    Execution time is recorded per query shape.
+    """
+    key = connection_key(connection_string)
+    normalized = normalize_sql(sql)
+    try:
+        async with execution_slot(key, project_id):
+            token = CancellationToken(settings.CHART_QUERY_TIMEOUT_SECONDS)
+            started = time.perf_counter()
+            try:
+                guard_info = None
+                if guard:
+                    sql, guard_info = await run_cancellable(
+                        guard_query, key, connection_string, sql, row_limit, params, token=token, request=request
+                    )
+                result = await run_cancellable(
+                    execute_query,
+                    connection_string,
+                    sql,
+                    params,
+                    row_limit,
+                    token=token,
+                    request=request,
+                    reducer=reducer
+                )
+                if guard_info is not None:
+                    result.meta["guard"] = guard_info
+                _shape_stats.record(project_id, normalized.fingerprint, normalized.shape, (time.perf_counter() - started) * 1000)
+                return result
+            except QueryTooExpensive as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            except Exception as e:
+                _shape_stats.record(
+                    project_id, normalized.fingerprint, normalized.shape, (time.perf_counter() - started) * 1000, failed=True
+                )
+                if token.cancelled:
+                    raise HTTPException(
+                        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                        detail=f"Chart query cancelled: {token.reason}"
+                    )
+                raise e
+    except QueryBusyError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+
+async def _run_extract(project_id, connection_id, manifest: dict, sql: str, row_limit: int, params: Optional[dict] = None):
+    """
+    Execute a chart query on a connection's local extract. Extract queries have
+    per-connection slots of their own, as they put no load on the source.
+    """
+    try:
+        async with execution_slot(f"extract:{connection_id}", project_id):
+            token = CancellationToken(settings.CHART_QUERY_TIMEOUT_SECONDS)
+            try:
+                return await run_cancellable(execute_extract_query, connection_id, manifest, sql, row_limit, params, token=token)
+            except Exception as e:
+                if token.cancelled:
+                    raise HTTPException(
+                        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                        detail=f"Chart query cancelled: {token.reason}"
+                    )
+                raise e
+    except QueryBusyError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+
+async def _run_sampled(
+    project_id,
+    connection_id,
+    connection_string: str,
+    sql: str,
+    fraction: float,
+    row_limit: int,
+    width: Optional[int] = None,
+    method: str = "lttb",
+    guard: bool = False,
+    params: Optional[dict] = None
+):
+    """
+    Run a chart query on a random sample of its first table and mark the result as
+    approximate, with the number of sampled rows behind it, the factor that scales
+    counts and sums to the full table and the estimated relative error of such
+    totals, taken from the result's smallest group.
+    """
+    sampled = sample_query(get_external_engine(connection_string).dialect, sql, fraction, settings.CHART_SAMPLE_METHOD)
+    if sampled is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sampling needs a Postgres connection and a query that reads from a table"
+        )
+    if width:
+        result = await _run_downsampled(project_id, connection_id, connection_string, sampled.sql, width, method, guard, params)
+    else:
+        result = await _run_chart(project_id, connection_string, sampled.sql, row_limit, params=params, guard=guard)
+    sampled_rows, smallest_group = None, None
+    if sampled.count_sql is not None:
+        try:
+            counted = await _run_chart(project_id, connection_string, sampled.count_sql, 1, params=params)
+            sampled_rows, smallest_group = (int(value or 0) for value in (counted.values[0][0], counted.values[1][0]))
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            # e.g. a GROUP BY on select list positions or aliases, which the count query drops
+            logger.warning("Could not count the sampled rows, reporting no error estimate: %s", e)
+    result.meta["sample"] = {
+        "approximate": True,
+        "fraction": fraction,
+        "method": sampled.method,
+        "table": sampled.table,
+        "sampled_rows": sampled_rows,
+        "smallest_group_rows": smallest_group,
+        "scale": round(1 / fraction, 6),
+        "relative_error": sample_error(smallest_group, fraction) if smallest_group is not None else None
+    }
+    return result
+
+
+def _guarded(chart: ChartModel) -> bool:
+    return settings.QUERY_GUARD_ENABLED and (chart.is_user_generated or not settings.QUERY_GUARD_USER_GENERATED_ONLY)
+
+
+async def _series_shape(project_id, connection_id, connection_string: str, sql: str, params: Optional[dict] = None):
+    key = (connection_id, query_fingerprint(sql))
+    shape = _series_shapes.get(key)
+    if shape is None:
+        probe = await _run_chart(
+            project_id, connection_string, f"SELECT * FROM ({sql.strip().rstrip(';')}) AS src LIMIT 1", 1, params=params
+        )
+        columns = series_columns(probe)
+        shape = (columns, [col["name"] for col in probe.columns]) if columns else (None, None)
+        _series_shapes.set(key, shape)
+    return shape
+
+
+async def _run_downsampled(
+    project_id,
+    connection_id,
+    connection_string: str,
+    sql: str,
+    width: int,
+    method: str,
+    guard: bool = False,
+    params: Optional[dict] = None
+):
+    """
+    Run a time series query reduced to about ``width`` points per series. On
+    Postgres and MySQL the database first buckets the series into ``width``
+    min/max pairs, then LTTB or min/max picks the final points in NumPy.
+    Elsewhere the rows are thinned out chunk by chunk as they stream in.
+    """
+    dialect = get_external_engine(connection_string).dialect
+    pushed_sql = None
+    columns, names = None, None
+    if dialect.name in PUSHDOWN_DIALECTS:
+        columns, names = await _series_shape(project_id, connection_id, connection_string, sql, params)
+        if columns is not None:
+            pushed_sql = bucket_query(dialect, sql, columns, names, width)
+
+    if pushed_sql is not None:
+        try:
+            result = await _run_chart(
+                project_id, connection_string, pushed_sql, settings.DOWNSAMPLE_MAX_SOURCE_ROWS, params=params, guard=guard
+            )
+            return downsample_result(result, width, method, columns, pushdown=True)
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            # e.g. a query whose output the wrapper cannot group; downsample the raw rows instead
+            logger.warning("Time bucketing pushdown failed, downsampling in the app: %s", e)
+
+    result = await _run_chart(
+        project_id,
+        connection_string,
+        sql,
+        settings.DOWNSAMPLE_MAX_SOURCE_ROWS,
+        params=params,
+        guard=guard,
+        reducer=chunk_reducer(width, columns)
+    )
+    return downsample_result(result, width, method, columns)
+
+
+def _chart_cache_key(
+    chart: ChartModel,
+    connection_id,
+    row_limit: int,
+    width: Optional[int],
+    method: str,
+    manifest: Optional[dict] = None,
+    sample: Optional[float] = None,
+    time_range: Optional[dict] = None
+) -> str:
+    # Results computed from an extract are keyed by its version, so a refreshed
+    # extract is picked up even by processes that missed the invalidation
+    extra = {"extract": manifest["version"]} if manifest else {}
+    if sample:
+        extra["sample"] = sample
+    if time_range:
+        # Charts with the same query may filter different columns; without a
+        # time_column the column follows from the query, which the key holds
+        extra.update(time_range, time_column=chart.time_column)
+    if width and chart.is_time_based:
+        return result_cache_key(connection_id, chart.query, {"width": width, "method": method, **extra})
+    return result_cache_key(connection_id, chart.query, extra or None, row_limit)
+
+
+async def _time_filtered(project_id, chart: ChartModel, connection_id, connection_string: str, time_range: dict):
+    """
+    Restrict a time-based chart's query to a dashboard time range. The predicate goes
+    into the query's top-level WHERE on the chart's time_column, or on the column its
+    output time column is selected from, where the database can prune partitions and
+    use indexes; otherwise the query is wrapped and filtered on its output's time
+    column. Returns (sql, filter info), or the query unchanged
+    and None when it has no time column to filter on.
+    """
+    dialect = get_external_engine(connection_string).dialect
+    if chart.time_column and valid_column(chart.time_column):
+        sql = inject_time_filter(chart.query, chart.time_column, time_range, dialect.name)
+        if sql is not None:
+            return sql, {"column": chart.time_column, "pushdown": "where"}
+    columns, _ = await _series_shape(project_id, connection_id, connection_string, chart.query)
+    if columns is None:
+        return chart.query, None
+    column = infer_time_column(chart.query, columns.time, dialect.name)
+    if column is not None:
+        sql = inject_time_filter(chart.query, column, time_range, dialect.name)
+        if sql is not None:
+            return sql, {"column": column, "pushdown": "where", "inferred": True}
+    sql = wrap_time_filter(chart.query, columns.time, time_range, dialect.identifier_preparer.quote)
+    return sql, {"column": columns.time, "pushdown": "wrapped"}
+
+
+def _series_cache_key(chart: ChartModel, connection_id) -> str:
+    return "series:" + result_cache_key(connection_id, chart.query)
+
+
+def _chart_ttl(chart: ChartModel) -> int:
+    return settings.RESULT_CACHE_TTL_SECONDS if chart.cache_ttl_seconds is None else chart.cache_ttl_seconds
+
+
+async def _cached_chart_result(
+    project_id,
+    chart: ChartModel,
+    connection_id,
+    connection_string: str,
+    row_limit: int,
+    request: Optional[Request] = None,
+    refresh: bool = False,
+    width: Optional[int] = None,
+    method: str = "lttb",
+    incremental: bool = False,
+    sample: Optional[float] = None,
+    time_range: Optional[dict] = None
+):
+    """
+    Return (result, cached) for a chart, serving from the result cache unless
+    ``refresh`` is set. Fresh results are stored for the chart's cache_ttl_seconds.
+    Time-based charts are downsampled when a pixel ``width`` is given and limited
+    to a ``time_range`` (time_from/time_to bind parameters) when one is given. With
+    a ``sample`` fraction the query reads a random sample of its first table.
+
+    Connections in extract mode run the query on their local extract; incremental
+    refresh and sampling are then not needed, and queries the extract cannot answer
+    fall back to the source. Concurrent misses for the same cache key share a single
+    execution.
+    """
+    manifest = load_manifest(connection_id)
+    if manifest is not None:
+        sample = None
+    time_range = time_range if chart.is_time_based else None
+    if incremental and chart.is_time_based and manifest is None and not sample and not time_range:
+        return await _incremental_chart_result(
+            project_id, chart, connection_id, connection_string, row_limit, request, width, method, refresh
+        )
+
+    downsample = bool(width and chart.is_time_based)
+    key = _chart_cache_key(chart, connection_id, row_limit, width, method, manifest, sample, time_range)
+    if not refresh:
+        result = cache_get(key)
+        if result is not None:
+            return result, True
+
+    sql = chart.query
+    guard = _guarded(chart)
+    ttl = _chart_ttl(chart)
+    tags = (chart_tag(chart.id), connection_tag(connection_id))
+
+    async def execute():
+        # Shared by every waiter, so it is not tied to any one request; the
+        # single-flight call cancels it once all waiters have gone
+        result, extract_error = None, None
+        query, time_filter = sql, None
+        if time_range:
+            query, time_filter = await _time_filtered(project_id, chart, connection_id, connection_string, time_range)
+        params = time_range if time_filter is not None else None
+        if manifest is not None:
+            try:
+                result = await _run_extract(
+                    project_id, connection_id, manifest, query, settings.DOWNSAMPLE_MAX_SOURCE_ROWS if downsample else row_limit, params
+                )
+                if downsample:
+                    result = downsample_result(result, width, method)
+            except HTTPException as e:
+                raise e
+            except Exception as e:
+                # e.g. a table that is not extracted or SQL the embedded engine does not accept
+                logger.warning("Chart query failed on the extract, running it on the source: %s", e)
+                extract_error = str(e)
+        if result is None:
+            if sample:
+                result = await _run_sampled(
+                    project_id, connection_id, connection_string, query, sample, row_limit, width if downsample else None, method, guard, params
+                )
+            elif downsample:
+                result = await _run_downsampled(project_id, connection_id, connection_string, query, width, method, guard, params)
+            else:
+                result = await _run_chart(project_id, connection_string, query, row_limit, params=params, guard=guard)
+            if extract_error is not None:
+                result.meta["extract"] = {"error": extract_error}
+        if time_range:
+            result.meta["time_filter"] = {
+                "from": time_range.get("time_from"),
+                "to": time_range.get("time_to"),
+                "applied": time_filter is not None,
+                **(time_filter or {})
+            }
+        result.meta["cached_at"] = datetime.now(timezone.utc).isoformat()
+        cache_set(key, result, ttl, tags=tags)
+        return result
+
+    try:
+        result, _ = await _chart_flights.do(key, execute, request)
+    except OperationCancelled as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Chart query cancelled: {e}")
+    return result, False
+
+
+async def _incremental_chart_result(
+    project_id,
+    chart: ChartModel,
+    connection_id,
+    connection_string: str,
+    row_limit: int,
+    request: Optional[Request] = None,
+    width: Optional[int] = None,
+    method: str = "lttb",
+    refresh: bool = False
+):
+    """
+    Return (result, False) for a time-based chart by extending its cached series.
+
+    Only rows at or after the last cached time minus CHART_INCREMENTAL_OVERLAP_SECONDS
+    are queried; they replace the cached rows of that window, so late-arriving data
+    is picked up. The series is rebuilt from scratch every
+    CHART_INCREMENTAL_FULL_REFRESH_SECONDS, which also drops rows that fell out of a
+    relative time range, and on ``refresh``. Queries whose output has no time
+    column run normally.
+    """
+    key = _series_cache_key(chart, connection_id)
+    sql = chart.query
+    guard = _guarded(chart)
+    tags = (chart_tag(chart.id), connection_tag(connection_id))
+    max_rows = settings.DOWNSAMPLE_MAX_SOURCE_ROWS
+
+    async def extend():
+        state = None if refresh else cache_get(key)
+        since = None
+        if state is not None and time.time() - state.built_at < settings.CHART_INCREMENTAL_FULL_REFRESH_SECONDS:
+            since = state.window_start(settings.CHART_INCREMENTAL_OVERLAP_SECONDS)
+
+        merged = None
+        if since is not None:
+            dialect = get_external_engine(connection_string).dialect
+            fresh = await _run_chart(
+                project_id,
+                connection_string,
+                incremental_query(dialect, sql, state.time_column),
+                max_rows,
+                params={"since": since},
+                guard=guard
+            )
+            merged = state.merge(fresh, since, max_rows)
+
+        if merged is None:
+            result = await _run_chart(project_id, connection_string, sql, max_rows, guard=guard)
+            merged = new_series_state(result)
+            if merged is None:
+                return result, None
+            since = None
+
+        cache_set(key, merged, settings.CHART_SERIES_CACHE_TTL_SECONDS, tags=tags)
+        return merged.result, since
+
+    try:
+        (series, since), _ = await _chart_flights.do(key, extend, request)
+    except OperationCancelled as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Chart query cancelled: {e}")
+
+    result = series
+    if width:
+        result = downsample_result(series, width, method)
+    elif series.row_count > row_limit:
+        # Keep the newest points; the row limit applies to what is returned, not to the series
+        result = ChartResult(
+            columns=series.columns,
+            values=[values[-row_limit:] for values in series.values],
+            row_count=row_limit,
+            truncated=True,
+            elapsed_ms=series.elapsed_ms,
+            meta=series.meta
+        )
+    # The series object is shared through the cache, so never modify it in place
+    result = replace(result, meta={
+        **result.meta,
+        "cached_at": datetime.now(timezone.utc).isoformat(),
+        "incremental": {
+            "since": since.isoformat() if since is not None else None,
+            "new_rows": series.meta.get("new_rows", series.row_count) if since is not None else series.row_count,
+            "series_rows": series.row_count,
+            "full_refresh": since is None
+        }
+    })
+    return result, False
+
+
+@require_permission(Permission.VIEW_CHART)
+async def get_chart_data(
+    project_id: UUID,
+    chart_id: UUID,
+    row_limit: Optional[int] = None,
+    refresh: bool = False,
+    width: Optional[int] = None,
+    downsample: str = "lttb",
+    incremental: bool = False,
+    sample: bool = False,
+    sample_fraction: Optional[float] = None,
+    request: Request = None,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Runs a chart's query against its database connection and returns typed rows.
+    Results are served from the result cache unless ``refresh`` is set. The Accept
+    header selects JSON records (default), column-oriented JSON or an Arrow IPC stream.
+    For time-based charts ``width`` (in pixels) downsamples each series to about that
+    many points with ``downsample`` ("lttb" or "minmax"); the row limit then does not apply.
+    With ``incremental`` a time-based chart's cached series is extended with new rows
+    instead of re-running the whole query. With ``sample`` the query reads a random
+    ``sample_fraction`` (default CHART_SAMPLE_FRACTION) of its first table's rows and
+    the result is marked approximate; sampled views do not count towards cache warming.
+    """
+    try:
+        fmt = negotiate_format(request.headers.get("accept") if request is not None else None)
+        fraction = None
+        if sample:
+            fraction = sample_fraction or settings.CHART_SAMPLE_FRACTION
+            if not 0 < fraction < 1:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sample_fraction must be between 0 and 1")
+        chart = _load_chart(db, project_id, chart_id)
+        connection_id, connection_string = _resolve_connection(db, project_id, chart)
+        row_limit = min(row_limit or settings.CHART_ROW_LIMIT, settings.CHART_MAX_ROW_LIMIT)
+        if fraction is None:
+            _chart_popularity.record(project_id, chart_id, {
+                "row_limit": row_limit, "width": width, "method": downsample, "incremental": incremental
+            })
+        # Give the app database connection back to the pool while the external query runs
+        db.close()
+
+        result, cached = await _cached_chart_result(
+            project_id, chart, connection_id, connection_string, row_limit, request, refresh, width, downsample, incremental, fraction
+        )
+
+        return render_chart_result(result, fmt, {
+            "message": "Chart data fetched successfully",
+            "chart": _serialize_chart(chart),
+            "cached": cached,
+            "cached_at": result.meta.get("cached_at"),
+            "downsampled": result.meta.get("downsampled"),
+            "incremental": result.meta.get("incremental"),
+            "guard": result.meta.get("guard"),
+            "extract": result.meta.get("extract"),
+            "sample": result.meta.get("sample")
+        })
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.VIEW_CHART)
+async def invalidate_chart_cache(
+    project_id: UUID,
+    chart_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Drops every cached result of a chart.
+    """
+    try:
+        _load_chart(db, project_id, chart_id)
+        removed = invalidate(chart_tag(chart_id))
+        return {"message": "Chart cache invalidated successfully", "removed": removed}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.VIEW_CHART)
+async def get_chart_cache_metrics(
+    project_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Returns hit/miss counters and the hit ratio of this process's result cache, how
+    many chart executions were saved by coalescing identical concurrent queries and
+    what the background warmer did.
+    """
+    return {
+        "message": "Chart cache metrics fetched successfully",
+        "metrics": cache_metrics(),
+        "single_flight": _chart_flights.stats(),
+        "warming": _warm_stats
+    }
+
+
+@require_permission(Permission.VIEW_CHART)
+async def get_query_queue_metrics(
+    project_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Returns the project's chart query queue in this process: queued and running
+    queries, rejections and recent queue wait percentiles against the wait SLO.
+    """
+    return {
+        "message": "Query queue metrics fetched successfully",
+        "metrics": project_queue_stats(project_id)
+    }
+
+
+@require_permission(Permission.VIEW_CHART)
+async def get_query_shape_stats(
+    project_id: UUID,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Returns the project's chart query shapes in this process with the most total
+    execution time: call and error counts and average, p50 and p95 latency. Queries
+    differing only in literal values, whitespace or comments share a shape.
+    """
+    return {
+        "message": "Query shape stats fetched successfully",
+        "shapes": _shape_stats.top(project_id, max(1, min(limit, 100)))
+    }
+
+
+async def _dashboard_chart(
+    project_id,
+    chart: ChartModel,
+    connections: dict,
+    row_limit: int,
+    width: Optional[int],
+    method: str,
+    incremental: bool = False,
+    time_range: Optional[dict] = None
+) -> dict:
+    """
+    Run one chart of a dashboard; failures are reported in the chart's line
+    instead of failing the whole dashboard.
+    """
+    line = {"type": "chart", "chart": _serialize_chart(chart)}
+    try:
+        connection_id = _pick_connection(chart, connections)
+        result, cached = await _cached_chart_result(
+            project_id,
+            chart,
+            connection_id,
+            decrypt_string_cached(connections[connection_id]),
+            row_limit,
+            width=width,
+            method=method,
+            incremental=incremental,
+            time_range=time_range
+        )
+    except HTTPException as e:
+        return {**line, "status": "error", "status_code": e.status_code, "detail": e.detail}
+    except Exception as e:
+        return {**line, "status": "error", "status_code": status.HTTP_400_BAD_REQUEST, "detail": str(e)}
+
+    return {**line, "status": "ok", **render_chart_result(result, JSON_RECORDS, {
+        "cached": cached,
+        "cached_at": result.meta.get("cached_at"),
+        "downsampled": result.meta.get("downsampled"),
+        "incremental": result.meta.get("incremental"),
+        "guard": result.meta.get("guard"),
+        "extract": result.meta.get("extract"),
+        "time_filter": result.meta.get("time_filter")
+    })}
+
+
+async def _stream_dashboard(
+    project_id,
+    dashboard,
+    charts: list,
+    connections: dict,
+    row_limit: int,
+    width: Optional[int],
+    method: str,
+    incremental: bool = False,
+    time_range: Optional[dict] = None
+):
+    """
+    Yields a header line, then one NDJSON line per chart in the order the charts
+    finish, then an end line. Everything it needs is loaded up front, so it does
+    not use the request's database session. When the client goes away the
+    pending chart queries are cancelled.
+
+    Charts on the same connection queue in the stream, at most
+    CHART_MAX_CONCURRENCY_PER_CONNECTION at a time. Without that queue, a
+    dashboard with more slow charts than the connection has slots would hit the
+    slot wait timeout with its own charts and report them as 429.
+    """
+    started = time.perf_counter()
+    yield json.dumps({
+        "type": "dashboard",
+        "id": str(dashboard.id),
+        "title": dashboard.title,
+        "charts": [str(chart.id) for chart in charts],
+        "time_range": time_range or None
+    }, default=str) + "\n"
+
+    lanes = {}
+
+    async def queued(chart: ChartModel) -> dict:
+        try:
+            connection_id = _pick_connection(chart, connections)
+        except HTTPException:
+            # Reported by the chart's own line without running anything
+            connection_id = None
+        lane = lanes.setdefault(connection_id, asyncio.Semaphore(settings.CHART_MAX_CONCURRENCY_PER_CONNECTION))
+        async with lane:
+            return await _dashboard_chart(project_id, chart, connections, row_limit, width, method, incremental, time_range)
+
+    tasks = [asyncio.ensure_future(queued(chart)) for chart in charts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done, default=str) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield json.dumps({
+        "type": "end",
+        "charts": len(charts),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }) + "\n"
+
+
+@require_permission(Permission.VIEW_DASHBOARD)
+async def get_dashboard_data(
+    project_id: UUID,
+    dashboard_id: UUID,
+    width: Optional[int] = None,
+    downsample: str = "lttb",
+    incremental: bool = False,
+    time_from: Optional[datetime] = None,
+    time_to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Runs the queries of every chart on a dashboard concurrently and streams each
+    chart's data as NDJSON as soon as it is ready. Per-connection concurrency
+    limits still apply, so charts on a busy connection queue for a slot.
+    ``time_from`` (inclusive) and ``time_to`` (exclusive) limit every time-based
+    chart to that range inside its query.
+    """
+    try:
+        if time_from is not None and time_to is not None and time_from >= time_to:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="time_from must be before time_to")
+        time_range = time_params(time_from, time_to)
+        dashboard = db.query(DashboardModel.id, DashboardModel.title).filter(
+            DashboardModel.id == dashboard_id,
+            DashboardModel.project_id == project_id
+        ).first()
+        if not dashboard:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dashboard not found")
+
+        charts = db.query(ChartModel).options(undefer(ChartModel.query)).join(
+            DashboardChartsModel, DashboardChartsModel.chart_id == ChartModel.id
+        ).filter(
+            DashboardChartsModel.dashboard_id == dashboard_id
+        ).order_by(ChartModel.relevance.desc()).all()
+        connections = _project_connections(db, project_id)
+        db.close()
+        for chart in charts:
+            if not (time_range and chart.is_time_based):
+                _chart_popularity.record(project_id, chart.id, {
+                    "row_limit": settings.CHART_ROW_LIMIT, "width": width, "method": downsample, "incremental": incremental
+                })
+
+        return StreamingResponse(
+            _stream_dashboard(
+                project_id, dashboard, charts, connections, settings.CHART_ROW_LIMIT, width, downsample, incremental, time_range
+            ),
+            media_type="application/x-ndjson"
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _load_hot_charts(hot: dict) -> list:
+    """
+    Load the charts picked for warming with their connection, in a session of
+    its own. Returns (score, project id, chart, connection id, connection string, params)
+    tuples, hottest first.
+    """
+    db = SessionLocal()
+    try:
+        jobs = []
+        for project_id, entries in hot.items():
+            charts = {
+                str(chart.id): chart
+                for chart in db.query(ChartModel).options(undefer(ChartModel.query)).filter(
+                    ChartModel.id.in_([UUID(chart_id) for chart_id, _, _ in entries])
+                )
+            }
+            connections = _project_connections(db, UUID(project_id))
+            for chart_id, params, score in entries:
+                chart = charts.get(chart_id)
+                if chart is None:
+                    continue
+                try:
+                    connection_id = _pick_connection(chart, connections)
+                except HTTPException:
+                    continue
+                jobs.append((score, project_id, chart, connection_id, decrypt_string_cached(connections[connection_id]), params))
+        return sorted(jobs, key=lambda job: job[0], reverse=True)
+    finally:
+        db.close()
+
+
+def _entry_age(entry) -> Optional[float]:
+    if entry is None:
+        return None
+    if isinstance(entry, SeriesState):
+        return time.time() - entry.refreshed_at
+    cached_at = entry.meta.get("cached_at")
+    return time.time() - datetime.fromisoformat(cached_at).timestamp() if cached_at else None
+
+
+async def _warm_chart(project_id, chart: ChartModel, connection_id, connection_string: str, params: dict) -> Optional[str]:
+    """
+    Refresh one chart's cache entry, for the parameters it was last viewed with,
+    when it is missing or would expire before the next warming run. Returns the
+    outcome counted in the warming stats.
+    """
+    ttl = _chart_ttl(chart)
+    if ttl <= 0:
+        return None
+    manifest = load_manifest(connection_id)
+    incremental = bool(params["incremental"] and chart.is_time_based and manifest is None)
+    if incremental:
+        key = _series_cache_key(chart, connection_id)
+    else:
+        key = _chart_cache_key(chart, connection_id, params["row_limit"], params["width"], params["method"], manifest)
+    age = _entry_age(cache_peek(key))
+    if age is not None and age + settings.CACHE_WARM_INTERVAL_SECONDS < ttl:
+        return "skipped_fresh"
+
+    async with _warm_budget:
+        # Never queue behind live traffic; the chart is retried on the next run
+        if execution_saturated() or not slot_available(f"extract:{connection_id}" if manifest else connection_key(connection_string)):
+            return "skipped_busy"
+        await _cached_chart_result(
+            project_id,
+            chart,
+            connection_id,
+            connection_string,
+            params["row_limit"],
+            refresh=True,
+            width=params["width"],
+            method=params["method"],
+            incremental=incremental
+        )
+    return "warmed"
+
+
+async def warm_popular_charts():
+    """
+    Precompute the results of each project's CACHE_WARM_TOP_CHARTS_PER_PROJECT most
+    viewed charts into the result cache. At most CACHE_WARM_MAX_CONCURRENCY warming
+    queries run at once, and connections with no free query slot are skipped.
+    """
+    hot = _chart_popularity.top(settings.CACHE_WARM_TOP_CHARTS_PER_PROJECT, settings.CACHE_WARM_MIN_SCORE)
+    jobs = await run_in_threadpool(_load_hot_charts, hot) if hot else []
+    outcomes = await asyncio.gather(
+        *[_warm_chart(*job[1:]) for job in jobs],
+        return_exceptions=True
+    )
+    for (_, _, chart, _, _, _), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, BaseException):
+            detail = outcome.detail if isinstance(outcome, HTTPException) else outcome
+            logger.warning("Warming chart %s failed: %s", chart.id, detail)
+            _warm_stats["failed"] += 1
+        elif outcome is not None:
+            _warm_stats[outcome] += 1
+    _warm_stats["runs"] += 1
+    _warm_stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+
+
+async def run_chart_warmer():
+    """
+    Warm popular charts every CACHE_WARM_INTERVAL_SECONDS until cancelled.
+    """
+    while True:
+        await asyncio.sleep(settings.CACHE_WARM_INTERVAL_SECONDS)
+        try:
+            await warm_popular_charts()
+        except Exception:
+            logger.exception("Chart cache warming failed")
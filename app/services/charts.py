@@ -0,0 +1,222 @@
+import base64
+import json
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import Session, load_only, undefer
+from fastapi import HTTPException, status, Depends
+
+from app.core.db import get_db
+from app.models.schema_models import ChartModel, DashboardChartsModel, DashboardModel, DatabaseConnectionModel
+from app.schemas import UpdateChartRequest
+from app.utils.token_parser import get_current_user
+from app.models.permissions import Permissions as Permission
+from app.utils.access import require_permission
+from app.utils.time_filter import valid_column
+
+# Columns a chart listing returns; the query and report are only loaded for one chart
+_LISTED_COLUMNS = (
+    ChartModel.id,
+    ChartModel.title,
+    ChartModel.type,
+    ChartModel.chart_type,
+    ChartModel.relevance,
+    ChartModel.is_time_based,
+    ChartModel.is_user_generated,
+    ChartModel.connection_id,
+    ChartModel.created_at
+)
+
+
+def in_project(db: Session, project_id: UUID):
+    """
+    Filter for charts that belong to the project directly, through one of its
+    dashboards or through the connection they run on. Charts written without this
+    app's hooks can lack a project_id on databases without its triggers.
+    """
+    on_project_dashboard = db.query(DashboardChartsModel.chart_id).join(
+        DashboardModel, DashboardModel.id == DashboardChartsModel.dashboard_id
+    ).filter(
+        DashboardChartsModel.chart_id == ChartModel.id,
+        DashboardModel.project_id == project_id
+    ).exists()
+    on_project_connection = db.query(DatabaseConnectionModel.id).filter(
+        DatabaseConnectionModel.id == ChartModel.connection_id,
+        DatabaseConnectionModel.project_id == project_id
+    ).exists()
+    return or_(ChartModel.project_id == project_id, on_project_dashboard, on_project_connection)
+
+
+def _encode_cursor(chart: ChartModel) -> str:
+    return base64.urlsafe_b64encode(json.dumps([chart.relevance, str(chart.id)]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        relevance, chart_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(relevance), UUID(chart_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _serialize_listed_chart(chart: ChartModel) -> dict:
+    return {
+        "id": str(chart.id),
+        "title": chart.title,
+        "type": chart.type,
+        "chart_type": chart.chart_type,
+        "relevance": chart.relevance,
+        "is_time_based": chart.is_time_based,
+        "is_user_generated": chart.is_user_generated,
+        "connection_id": str(chart.connection_id) if chart.connection_id else None,
+        "created_at": chart.created_at.isoformat() if chart.created_at else None
+    }
+
+
+def _ranked_page(query, limit: int, cursor: Optional[str]) -> dict:
+    """
+    One page of charts in descending relevance, ties broken by descending id. The
+    cursor holds the (relevance, id) of the last chart served, so the next page
+    continues the index scan from there instead of skipping rows with OFFSET.
+    """
+    if cursor:
+        relevance, chart_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(ChartModel.relevance, ChartModel.id) < tuple_(relevance, chart_id))
+    charts = query.options(load_only(*_LISTED_COLUMNS)).order_by(
+        ChartModel.relevance.desc(), ChartModel.id.desc()
+    ).limit(limit + 1).all()
+    return {
+        "charts": [_serialize_listed_chart(chart) for chart in charts[:limit]],
+        "next_cursor": _encode_cursor(charts[limit - 1]) if len(charts) > limit else None
+    }
+
+
+@require_permission(Permission.VIEW_CHART)
+async def list_project_charts(
+    project_id: UUID,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Lists a project's charts, most relevant first, one keyset page at a time.
+    """
+    try:
+        page = _ranked_page(db.query(ChartModel).filter(ChartModel.project_id == project_id), limit, cursor)
+        return {"message": "Charts fetched successfully", **page}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.VIEW_DASHBOARD)
+async def list_dashboard_charts(
+    project_id: UUID,
+    dashboard_id: UUID,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Lists a dashboard's charts, most relevant first, one keyset page at a time.
+    The charts are found through the dashboard_chart primary key and only they are
+    sorted. dashboard_chart has no (dashboard_id, relevance) index: relevance lives
+    on the chart, and a copy would have to follow every relevance update, while a
+    dashboard holds few enough charts that sorting them costs less than walking the
+    project's relevance index past the charts of its other dashboards.
+    """
+    try:
+        dashboard = db.query(DashboardModel.id).filter(
+            DashboardModel.id == dashboard_id,
+            DashboardModel.project_id == project_id
+        ).first()
+        if not dashboard:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dashboard not found")
+
+        page = _ranked_page(
+            db.query(ChartModel).join(DashboardChartsModel, DashboardChartsModel.chart_id == ChartModel.id).filter(
+                DashboardChartsModel.dashboard_id == dashboard_id
+            ),
+            limit,
+            cursor
+        )
+        return {"message": "Dashboard charts fetched successfully", **page}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.VIEW_CHART)
+async def get_chart(
+    project_id: UUID,
+    chart_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Returns one chart with its query and report, which listings leave out.
+    """
+    try:
+        chart = db.query(ChartModel).options(undefer(ChartModel.query), undefer(ChartModel.report)).filter(
+            ChartModel.id == chart_id,
+            in_project(db, project_id)
+        ).first()
+        if not chart:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+        return {
+            "message": "Chart fetched successfully",
+            "chart": {
+                **_serialize_listed_chart(chart),
+                "query": chart.query,
+                "report": chart.report,
+                "time_column": chart.time_column,
+                "cache_ttl_seconds": chart.cache_ttl_seconds
+            }
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.CREATE_CHART)
+async def update_chart(
+    project_id: UUID,
+    chart_id: UUID,
+    data: UpdateChartRequest,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Updates how a chart's query is run. ``time_column`` names the column dashboard
+    time ranges filter on in the query's WHERE; an empty string clears it.
+    """
+    try:
+        chart = db.query(ChartModel).filter(
+            ChartModel.id == chart_id,
+            in_project(db, project_id)
+        ).first()
+        if not chart:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+
+        if data.time_column is not None:
+            time_column = data.time_column.strip()
+            if time_column and not valid_column(time_column):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="time_column must be a column name")
+            chart.time_column = time_column or None
+
+        db.commit()
+        db.refresh(chart)
+        return {
+            "message": "Chart updated successfully",
+            "chart": {**_serialize_listed_chart(chart), "time_column": chart.time_column}
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -1,23 +1,46 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, defer
 from fastapi import HTTPException, status, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from uuid import uuid4, UUID
+from typing import Optional
 
 import json
+import hashlib
 from urllib.parse import urlparse, quote_plus
 
-from app.core.db import get_db
+from app.core.db import get_db, SessionLocal
+from app.core.settings import settings
 from app.models.schema_models import DatabaseConnectionModel
 from app.schemas import DBConnectionRequest, DBConnectionResponse, UpdateDBConnectionRequest
-from app.utils.crypt import encrypt_string, decrypt_string
+from app.utils.crypt import encrypt_string, decrypt_many
 from app.utils.schema_structure import get_schema_structure
+from app.utils.cancellation import CancellationToken, run_cancellable, register_job, unregister_job, cancel_job
+from app.utils.extracts import remove_extract
+from app.utils.connection_serializer import serialize_connection
+from app.utils.schema_search import update_schema_index, get_schema_index, drop_schema_index
 from app.utils.token_parser import parse_token, get_current_user
 from app.models.permissions import Permissions as Permission
 from app.utils.access import require_permission
+
+def _schema_digest(db_schema: str) -> str:
+    # Matches Postgres md5(text) so the digest can be compared without loading the schema
+    return hashlib.md5(db_schema.encode()).hexdigest()
+
 @require_permission(Permission.ADD_DATASOURCE)
-async def create_database_connection(project_id: UUID, token_payload: dict, data: DBConnectionRequest, db: Session):
+async def create_database_connection(
+    project_id: UUID,
+    token_payload: dict,
+    data: DBConnectionRequest,
+    db: Session,
+    request: Request = None,
+    job_id: Optional[str] = None
+):
     """
     Creates a new database connection.
-  
+
+    Introspection is bounded by INTROSPECTION_DEADLINE_SECONDS and stops early when the
+    client disconnects or the job is cancelled; the schema is then stored as incomplete.
     """
     
 
@@ -30,7 +53,6 @@ async def create_database_connection(project_id: UUID, token_payload: dict, data
             f"{parsed_url.path}?{parsed_url.query}"
         )
         db_type = data.db_type
-        schema_structure = get_schema_structure(connection_string, db_type)
         username = parsed_url.username
         password = parsed_url.password
         host = parsed_url.hostname
@@ -49,13 +71,29 @@ async def create_database_connection(project_id: UUID, token_payload: dict, data
         else:
             raise HTTPException(status_code=400, detail="Unsupported database type.")
 
-        schema_structure = get_schema_structure(connection_string, db_type)
+    token = CancellationToken(settings.INTROSPECTION_DEADLINE_SECONDS)
+    if job_id:
+        register_job(job_id, token, owner=project_id)
+    try:
+        schema_structure = await run_cancellable(
+            get_schema_structure,
+            connection_string,
+            db_type,
+            data.include_schemas,
+            data.exclude_schemas,
+            token=token,
+            request=request
+        )
+    finally:
+        if job_id:
+            unregister_job(job_id)
 
+    db_schema = json.dumps(schema_structure)
     db_entry = DatabaseConnectionModel(
         id=uuid4(),
         connection_name=data.connection_name,
         db_connection_string=encrypt_string(connection_string),
-        db_schema=json.dumps(schema_structure),
+        db_schema=db_schema,
         db_username=username,
         db_password=encrypt_string(password),
         db_host_link=host,
@@ -66,8 +104,23 @@ async def create_database_connection(project_id: UUID, token_payload: dict, data
     db.add(db_entry)
     db.commit()
     db.refresh(db_entry)
+    update_schema_index(db_entry.id, schema_structure, _schema_digest(db_schema))
+
+    return DBConnectionResponse(db_entry_id=db_entry.id, schema_complete=schema_structure["complete"])
 
-    return DBConnectionResponse(db_entry_id=db_entry.id)
+@require_permission(Permission.ADD_DATASOURCE)
+async def cancel_introspection_job(
+    project_id: UUID,
+    job_id: str,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Cancels a running schema introspection started with the given job id.
+    """
+    if not cancel_job(job_id, owner=project_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Introspection job not found")
+    return {"message": "Introspection job cancelled"}
 
 @require_permission(Permission.VIEW_DATASOURCE)
 async def get_connections(
@@ -75,10 +128,16 @@ async def get_connections(
     request: Request, 
     response: Response, 
     db: Session = Depends(get_db),
-    token_payload: dict = Depends(get_current_user)
+    token_payload: dict = Depends(get_current_user),
+    mode: str = "full",
+    credentials: str = "decrypted"
 ):
     """
     Retrieves all database connections for a given project.
+
+    mode="full" returns every connection with its schema, mode="summary" leaves the
+    schema out and mode="stream" emits one connection per NDJSON line.
+    credentials="masked" returns masked credentials and decrypts nothing.
     """ 
     try:
         user_id_str = token_payload.get("sub")
@@ -90,42 +149,56 @@ async def get_connections(
             user_id = UUID(user_id_str)
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid UUID format in token")
+
+        if mode == "stream":
+            return StreamingResponse(_stream_connections(project_id, credentials), media_type="application/x-ndjson")
         
         # Query all connections for the project
-        connections = db.query(DatabaseConnectionModel).filter(
+        query = db.query(DatabaseConnectionModel).filter(
             DatabaseConnectionModel.project_id == project_id
-        ).all()
+        )
+        if mode == "summary":
+            query = query.options(defer(DatabaseConnectionModel.db_schema))
         
+        connections = query.all()
+
+        plaintexts = None
+        if credentials != "masked":
+            plaintexts = decrypt_many(
+                value for conn in connections for value in (conn.db_connection_string, conn.db_password)
+            )
+
         # Convert SQLAlchemy models to dictionaries
-        connections_list = []
-        for conn in connections:
-
-            # Decrypt the password
-            decrypted_password = decrypt_string(conn.db_password)
-            # Decrypt the connection string
-            decrypted_connection_string = decrypt_string(conn.db_connection_string)
-            # Create a new dictionary with the decrypted password and connection string 
-            conn_dict = {
-                "id": str(conn.id),
-                "project_id": str(conn.project_id),
-                "db_connection_string": decrypted_connection_string,
-                "db_schema": conn.db_schema,
-                "db_username": conn.db_username,
-                "db_password": decrypted_password,
-                "db_host_link": conn.db_host_link,
-                "db_name": conn.db_name,
-                "db_type":conn.db_type,
-                "name":conn.connection_name
-            }
-            connections_list.append(conn_dict)
+        connections_list = [
+            serialize_connection(conn, include_schema=mode != "summary", credentials=credentials, plaintexts=plaintexts)
+            for conn in connections
+        ]
 
 
         return {
             "message": "Connections retrieved successfully",
             "connections": connections_list
         }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _stream_connections(project_id: UUID, credentials: str = "decrypted"):
+    """
+    Yields one NDJSON line per connection so only one schema is held in memory at a time.
+    Runs after the request dependencies have closed, so it uses its own session.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(DatabaseConnectionModel).filter(
+            DatabaseConnectionModel.project_id == project_id
+        ).yield_per(settings.CONNECTION_STREAM_BATCH_SIZE)
+        for conn in query:
+            yield json.dumps(serialize_connection(conn, credentials=credentials)) + "\n"
+            db.expunge(conn)
+    finally:
+        db.close()
     
 async def update_db_connection(connection_id: UUID, data: UpdateDBConnectionRequest, db: Session):
     """
@@ -141,6 +214,7 @@ async def update_db_connection(connection_id: UUID, data: UpdateDBConnectionRequ
         db_connection.db_connection_string = data.db_connection_string
     if data.db_schema:
         db_connection.db_schema = data.db_schema
+        update_schema_index(connection_id, json.loads(data.db_schema), _schema_digest(data.db_schema))
     if data.db_username:
         db_connection.db_username = data.db_username
     if data.db_password:
@@ -165,4 +239,51 @@ async def delete_db_connection(connection_id: UUID, db: Session):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database connection not found")
     db.delete(db_connection)
     db.commit()
-    return {"message": "Database connection deleted successfully"}
\ No newline at end of file
+    drop_schema_index(connection_id)
+    # The extract holds a copy of the source's data
+    remove_extract(connection_id)
+    return {"message": "Database connection deleted successfully"}
+
+@require_permission(Permission.VIEW_DATASOURCE)
+async def search_connection_schema(
+    project_id: UUID,
+    connection_id: UUID,
+    query: str,
+    limit: int,
+    fuzzy: bool,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Searches the tables and columns of a connection's schema by name or type.
+    """
+    try:
+        connection = db.query(
+            DatabaseConnectionModel.id,
+            func.md5(DatabaseConnectionModel.db_schema).label("digest")
+        ).filter(
+            DatabaseConnectionModel.id == connection_id,
+            DatabaseConnectionModel.project_id == project_id
+        ).first()
+        if not connection:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database connection not found")
+
+        results = []
+        if connection.digest:
+            index = get_schema_index(connection_id, connection.digest)
+            if index is None:
+                # Built lazily after a restart or when another worker re-introspected the schema
+                db_schema = db.query(DatabaseConnectionModel.db_schema).filter(
+                    DatabaseConnectionModel.id == connection_id
+                ).scalar()
+                index = update_schema_index(connection_id, json.loads(db_schema), connection.digest)
+            results = index.search(query, limit=limit, fuzzy=fuzzy)
+
+        return {
+            "message": "Schema search completed successfully",
+            "results": results
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
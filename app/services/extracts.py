@@ -0,0 +1,294 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy.orm import Session, defer
+from fastapi import HTTPException, status, Depends
+from starlette.concurrency import run_in_threadpool
+
+from app.core.db import get_db, SessionLocal
+from app.core.settings import settings
+from app.models.schema_models import DatabaseConnectionModel
+from app.schemas import ExtractRequest
+from app.utils.cancellation import CancellationToken, run_cancellable
+from app.utils.crypt import decrypt_string_cached
+from app.utils.extracts import ExtractBusy, build_extract, extracts_available, load_manifest, remove_extract
+from app.utils.result_cache import invalidate, connection_tag
+from app.utils.token_parser import get_current_user
+from app.models.permissions import Permissions as Permission
+from app.utils.access import require_permission
+
+logger = logging.getLogger(__name__)
+
+# State of the latest refresh per connection id in this process
+_refreshes = {}
+_refresh_budget = asyncio.Semaphore(settings.EXTRACT_MAX_CONCURRENCY)
+# Keeps refreshes started by a request referenced until they finish
+_background = set()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _mark_refreshed(connection_id: str) -> bool:
+    """
+    Record the refresh time; returns False when extract mode was turned off meanwhile.
+    """
+    db = SessionLocal()
+    try:
+        updated = db.query(DatabaseConnectionModel).filter(
+            DatabaseConnectionModel.id == UUID(connection_id),
+            DatabaseConnectionModel.extract_enabled.is_(True)
+        ).update({DatabaseConnectionModel.extract_refreshed_at: _utcnow()}, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    finally:
+        db.close()
+
+
+def _queue_refresh(connection_id: str) -> dict:
+    state = {"state": "queued", "started_at": None, "finished_at": None, "error": None, "retry_at": None}
+    _refreshes[connection_id] = state
+    return state
+
+
+async def _refresh_extract(connection_id: str, connection_string: str, tables: list, retry_seconds: float = None):
+    """
+    Rebuild a connection's extract and drop the chart results computed from the old one.
+    A failed scheduled refresh is retried after ``retry_seconds``.
+    """
+    state = _refreshes[connection_id] if _refreshing(connection_id) else _queue_refresh(connection_id)
+    async with _refresh_budget:
+        state.update(state="building", started_at=datetime.now(timezone.utc).isoformat())
+        token = CancellationToken(settings.EXTRACT_TIMEOUT_SECONDS)
+        try:
+            await run_cancellable(build_extract, connection_id, connection_string, tables, token=token)
+            if not await run_in_threadpool(_mark_refreshed, connection_id):
+                await run_in_threadpool(remove_extract, connection_id)
+                _refreshes.pop(connection_id, None)
+                return
+        except ExtractBusy:
+            # Another process on this host is building it
+            state.update(state="skipped", finished_at=datetime.now(timezone.utc).isoformat())
+            return
+        except Exception as e:
+            logger.warning("Refreshing the extract of connection %s failed: %s", connection_id, e)
+            failed_at = datetime.now(timezone.utc)
+            state.update(
+                state="failed",
+                finished_at=failed_at.isoformat(),
+                error=token.reason if token.cancelled else str(e),
+                retry_at=(failed_at + timedelta(seconds=retry_seconds)).isoformat() if retry_seconds else None
+            )
+            return
+    invalidate(connection_tag(connection_id))
+    state.update(state="ready", finished_at=datetime.now(timezone.utc).isoformat())
+
+
+def _refreshing(connection_id: str) -> bool:
+    state = _refreshes.get(connection_id)
+    return state is not None and state["state"] in ("queued", "building")
+
+
+def _backing_off(connection_id: str) -> bool:
+    state = _refreshes.get(connection_id)
+    return state is not None and state["retry_at"] is not None \
+        and datetime.fromisoformat(state["retry_at"]) > datetime.now(timezone.utc)
+
+
+def _start_refresh(connection_id: str, connection_string: str, tables: list):
+    _queue_refresh(connection_id)
+    task = asyncio.ensure_future(_refresh_extract(connection_id, connection_string, tables))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _get_connection(db: Session, project_id: UUID, connection_id: UUID) -> DatabaseConnectionModel:
+    connection = db.query(DatabaseConnectionModel).options(defer(DatabaseConnectionModel.db_schema)).filter(
+        DatabaseConnectionModel.id == connection_id,
+        DatabaseConnectionModel.project_id == project_id
+    ).first()
+    if not connection:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database connection not found")
+    return connection
+
+
+def _serialize_extract(connection: DatabaseConnectionModel) -> dict:
+    manifest = load_manifest(connection.id)
+    return {
+        "enabled": connection.extract_enabled,
+        "tables": connection.extract_tables or [],
+        "refresh_seconds": connection.extract_refresh_seconds or settings.EXTRACT_REFRESH_SECONDS,
+        "refreshed_at": connection.extract_refreshed_at.isoformat() if connection.extract_refreshed_at else None,
+        "refresh": _refreshes.get(str(connection.id)),
+        "current": {
+            "version": manifest["version"],
+            "built_at": manifest["built_at"],
+            "elapsed_ms": manifest["elapsed_ms"],
+            "tables": [
+                {key: entry[key] for key in ("schema", "table", "rows", "bytes", "columns")}
+                for entry in manifest["tables"]
+            ]
+        } if manifest else None
+    }
+
+
+@require_permission(Permission.EDIT_DATASOURCE)
+async def configure_extract(
+    project_id: UUID,
+    connection_id: UUID,
+    data: ExtractRequest,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Enables extract mode for a connection, or changes its tables or refresh period,
+    and starts building the extract in the background. Chart queries keep running
+    on the source until the first extract is ready.
+    """
+    try:
+        if not extracts_available():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Extracts require the duckdb and pyarrow packages")
+        tables = list(dict.fromkeys(table.strip() for table in data.tables if table.strip()))
+        if not tables:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one table is required")
+        if data.refresh_seconds is not None and data.refresh_seconds < 60:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="refresh_seconds must be at least 60")
+
+        connection = _get_connection(db, project_id, connection_id)
+        connection.extract_enabled = True
+        connection.extract_tables = tables
+        connection.extract_refresh_seconds = data.refresh_seconds
+        db.commit()
+        db.refresh(connection)
+
+        if not _refreshing(str(connection_id)):
+            _start_refresh(str(connection_id), decrypt_string_cached(connection.db_connection_string), tables)
+        return {"message": "Extract refresh started", "extract": _serialize_extract(connection)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.EDIT_DATASOURCE)
+async def refresh_extract(
+    project_id: UUID,
+    connection_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Starts refreshing a connection's extract now instead of waiting for its schedule.
+    """
+    try:
+        connection = _get_connection(db, project_id, connection_id)
+        if not connection.extract_enabled:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Extract mode is not enabled for this connection")
+        if _refreshing(str(connection_id)):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The extract is already being refreshed")
+
+        _start_refresh(str(connection_id), decrypt_string_cached(connection.db_connection_string), connection.extract_tables)
+        return {"message": "Extract refresh started", "extract": _serialize_extract(connection)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.VIEW_DATASOURCE)
+async def get_extract(
+    project_id: UUID,
+    connection_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Returns a connection's extract settings, the current extract and the state of
+    the latest refresh in this process.
+    """
+    try:
+        connection = _get_connection(db, project_id, connection_id)
+        return {"message": "Extract fetched successfully", "extract": _serialize_extract(connection)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@require_permission(Permission.EDIT_DATASOURCE)
+async def disable_extract(
+    project_id: UUID,
+    connection_id: UUID,
+    db: Session = Depends(get_db),
+    token_payload: dict = Depends(get_current_user)
+):
+    """
+    Turns extract mode off and deletes the extract; charts query the source again.
+    """
+    try:
+        connection = _get_connection(db, project_id, connection_id)
+        connection.extract_enabled = False
+        connection.extract_tables = None
+        connection.extract_refresh_seconds = None
+        connection.extract_refreshed_at = None
+        db.commit()
+
+        await run_in_threadpool(remove_extract, connection_id)
+        invalidate(connection_tag(connection_id))
+        _refreshes.pop(str(connection_id), None)
+        return {"message": "Extract disabled successfully"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _due_extracts() -> list:
+    """
+    (connection id, connection string, tables, refresh seconds) of every extract
+    whose refresh period has passed.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            DatabaseConnectionModel.id,
+            DatabaseConnectionModel.db_connection_string,
+            DatabaseConnectionModel.extract_tables,
+            DatabaseConnectionModel.extract_refresh_seconds,
+            DatabaseConnectionModel.extract_refreshed_at
+        ).filter(DatabaseConnectionModel.extract_enabled.is_(True)).all()
+    finally:
+        db.close()
+
+    now = _utcnow()
+    due = []
+    for row in rows:
+        period = row.extract_refresh_seconds or settings.EXTRACT_REFRESH_SECONDS
+        if row.extract_tables and (row.extract_refreshed_at is None or row.extract_refreshed_at + timedelta(seconds=period) <= now):
+            due.append((str(row.id), decrypt_string_cached(row.db_connection_string), row.extract_tables, period))
+    return due
+
+
+async def refresh_due_extracts():
+    due = await run_in_threadpool(_due_extracts)
+    await asyncio.gather(*[
+        _refresh_extract(connection_id, connection_string, tables, period)
+        for connection_id, connection_string, tables, period in due
+        if not _refreshing(connection_id) and not _backing_off(connection_id)
+    ])
+
+
+async def run_extract_refresher():
+    """
+    Refresh extracts on their schedule, checking every EXTRACT_CHECK_INTERVAL_SECONDS, until cancelled.
+    """
+    while True:
+        try:
+            if extracts_available():
+                await refresh_due_extracts()
+        except Exception:
+            logger.exception("Scheduled extract refresh failed")
+        await asyncio.sleep(settings.EXTRACT_CHECK_INTERVAL_SECONDS)
@@ -9,8 +9,11 @@ from app.schemas import ProjectRequest, CreateDashboardRequest, CreateRoleReques
 from app.core.db import get_db
 from app.utils.token_parser import get_current_user
 from app.utils.access import require_permission
-from app.models.schema_models import ProjectModel, UserProjectRoleModel, RoleModel, DashboardModel, PermissionModel, RolePermissionModel, UserDashboardModel,UserModel
+from app.models.schema_models import ProjectModel, UserProjectRoleModel, RoleModel, DashboardModel, PermissionModel, RolePermissionModel, UserDashboardModel,UserModel, DatabaseConnectionModel
 from app.models.permissions import Permissions as Permission
+from app.utils.extracts import remove_extract
+from app.utils.result_cache import connection_tag, invalidate
+from app.utils.schema_search import drop_schema_index
 
 @require_permission(Permission.CREATE_PROJECT)
 async def create_project(
@@ -342,7 +345,8 @@ async def delete_dashboard(
     token_payload: dict = Depends(get_current_user)
 ):
     """
-    Delete a dashboard. 
+    Delete a dashboard. Its user and chart associations are removed by the
+    foreign keys' ON DELETE CASCADE.
     """
     try:
         user_id = UUID(token_payload.get("sub"))
@@ -350,15 +354,12 @@ async def delete_dashboard(
         if not user_id:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
         
-        dashboard = db.query(DashboardModel).filter(DashboardModel.id == dashboard_id).first()
-        if not dashboard:
+        deleted = db.query(DashboardModel).filter(
+            DashboardModel.id == dashboard_id,
+            DashboardModel.project_id == project_id
+        ).delete(synchronize_session=False)
+        if not deleted:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dashboard not found")
-        
-        # First delete all user_dashboard associations
-        db.query(UserDashboardModel).filter(UserDashboardModel.dashboard_id == dashboard_id).delete()
-        
-        # Then delete the dashboard
-        db.delete(dashboard)
         db.commit()
 
         return {
@@ -409,7 +410,9 @@ async def delete_project(
     token_payload: dict = Depends(get_current_user)
 ):
     """
-    Delete a project.
+    Delete a project. Its roles, memberships, dashboards, connections and charts
+    are removed by the foreign keys' ON DELETE CASCADE instead of being loaded
+    and deleted one by one.
     """
     try:
         user_id = UUID(token_payload.get("sub"))
@@ -417,12 +420,21 @@ async def delete_project(
         if not user_id:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
         
-        project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-        if not project:
+        connection_ids = [
+            connection_id for connection_id, in db.query(DatabaseConnectionModel.id).filter(
+                DatabaseConnectionModel.project_id == project_id
+            )
+        ]
+        deleted = db.query(ProjectModel).filter(ProjectModel.id == project_id).delete(synchronize_session=False)
+        if not deleted:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-        
-        db.delete(project)
         db.commit()
+        # Rows deleted by the database never reach the ORM listeners that drop cached results,
+        # and the connections' schema indexes and extracts live outside the database
+        invalidate(*(connection_tag(connection_id) for connection_id in connection_ids))
+        for connection_id in connection_ids:
+            drop_schema_index(connection_id)
+            remove_extract(connection_id)
 
         return {
             "message": "Project deleted successfully"
@@ -327,18 +327,13 @@ async def delete_user(
    
 ):
     """
-    Deletes a user.
+    Deletes a user. Their memberships, API key, dashboards and charts are removed
+    by the foreign keys' ON DELETE CASCADE.
     """
     try:
-        # Check if user exists
-        user = db.query(UserModel).filter(UserModel.id == user_id).first()
-        if not user:
+        deleted = db.query(UserModel).filter(UserModel.id == user_id).delete(synchronize_session=False)
+        if not deleted:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-            
-       
-        
-        
-        db.delete(user)
         db.commit()
         
         return {
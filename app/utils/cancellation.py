@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for work running on worker threads.
+
+    Long-running loops call ``raise_if_cancelled()`` between units of work, and
+    connections registered with ``track()`` have their in-flight statement
+    cancelled on the server as soon as ``cancel()`` is called.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._cancellers = set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            registrations = list(self._cancellers)
+        for registration in registrations:
+            canceller, guard = registration
+            # The guard keeps the block from ending while its canceller runs; a block that
+            # ended first has returned its connection, which may now run someone else's query
+            with guard:
+                with self._lock:
+                    if registration not in self._cancellers:
+                        continue
+                try:
+                    canceller()
+                except Exception as e:
+                    logger.warning("Could not cancel running statement: %s", e)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    @contextmanager
+    def track(self, connection):
+        """
+        Register a SQLAlchemy connection so cancel() interrupts its running statement.
+        """
+        with self.watch(_dbapi_canceller(connection)):
+            yield connection
+
+    @contextmanager
+    def watch(self, canceller: Optional[Callable[[], None]]):
+        """
+        Call ``canceller`` on cancel() while the block runs, e.g. an embedded engine's interrupt.
+        """
+        registration = (canceller, threading.Lock()) if canceller is not None else None
+        if registration is not None:
+            with self._lock:
+                self._cancellers.add(registration)
+        try:
+            self.raise_if_cancelled()
+            yield
+        finally:
+            if registration is not None:
+                # Waits for a canceller that is running right now
+                with registration[1]:
+                    with self._lock:
+                        self._cancellers.discard(registration)
+
+
+def _dbapi_canceller(connection) -> Optional[Callable[[], None]]:
+    dbapi_connection = connection.connection.dbapi_connection
+    backend = connection.dialect.name
+
+    if backend == "postgresql" and hasattr(dbapi_connection, "cancel"):
+        return dbapi_connection.cancel
+
+    if backend in ("mysql", "mariadb") and hasattr(dbapi_connection, "thread_id"):
+        thread_id = dbapi_connection.thread_id()
+        engine = connection.engine
+
+        def kill_query():
+            with engine.connect() as killer:
+                killer.exec_driver_sql(f"KILL QUERY {int(thread_id)}")
+
+        return kill_query
+
+    return None
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def register_job(job_id: str, token: CancellationToken, owner=None):
+    with _jobs_lock:
+        _jobs[job_id] = (token, owner)
+
+
+def unregister_job(job_id: str):
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+
+
+def cancel_job(job_id: str, owner=None) -> bool:
+    """
+    Cancel a running job. Returns False when no such job is running for this owner.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or (owner is not None and job[1] != owner):
+        return False
+    job[0].cancel("cancelled by user")
+    return True
+
+
+async def run_cancellable(
+    func: Callable,
+    *args,
+    token: CancellationToken,
+    request: Optional[Request] = None,
+    poll_interval: float = 0.5,
+    **kwargs
+):
+    """
+    Run a blocking function on the threadpool and cancel its token when the client
+    disconnects, the deadline passes or the awaiting coroutine is cancelled.
+    The function receives the token and is expected to return promptly once it fires.
+    """
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, token=token, **kwargs))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if token.cancelled:
+                continue
+            if request is not None and await request.is_disconnected():
+                token.cancel("client disconnected")
+    except asyncio.CancelledError:
+        token.cancel("request cancelled")
+        raise
@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class ChartPopularity:
+    """
+    Exponentially decayed access counts per chart. A view adds 1 to the chart's
+    score and scores halve every ``half_life`` seconds, so recent demand dominates.
+    The parameters of the latest view are kept so warming fills the same cache entry.
+    """
+
+    def __init__(self, half_life: float, max_entries: int = 100_000):
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, since: float, now: float) -> float:
+        return score * 0.5 ** ((now - since) / self.half_life)
+
+    def record(self, project_id, chart_id, params: dict = None):
+        now = time.time()
+        key = (str(project_id), str(chart_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            score = 1.0 if entry is None else self._decayed(entry[0], entry[1], now) + 1.0
+            self._entries[key] = (score, now, params or {})
+            if len(self._entries) > self.max_entries:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        ranked = sorted(self._entries.items(), key=lambda item: self._decayed(item[1][0], item[1][1], now))
+        for key, _ in ranked[:len(ranked) - self.max_entries // 2]:
+            del self._entries[key]
+
+    def top(self, per_project: int, min_score: float = 0.0) -> dict:
+        """
+        Map each project id to its hottest charts as (chart_id, params, score), hottest first.
+        """
+        now = time.time()
+        by_project = defaultdict(list)
+        with self._lock:
+            for (project_id, chart_id), (score, since, params) in self._entries.items():
+                score = self._decayed(score, since, now)
+                if score >= min_score:
+                    by_project[project_id].append((chart_id, params, score))
+        return {
+            project_id: sorted(charts, key=lambda chart: chart[2], reverse=True)[:per_project]
+            for project_id, charts in by_project.items()
+        }
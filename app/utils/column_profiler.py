@@ -0,0 +1,146 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import column, func, select, table, tablesample, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import Date, DateTime
+
+from app.core.settings import settings
+from app.utils.cancellation import CancellationToken, OperationCancelled
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_profile_cache = TTLCache(ttl=settings.PROFILE_CACHE_TTL_SECONDS, maxsize=100_000)
+
+_PG_STATS_BOUNDS = text("""
+    SELECT b[1] AS min_value, b[array_length(b, 1)] AS max_value
+    FROM (
+        SELECT histogram_bounds::text::timestamp[] AS b
+        FROM pg_stats
+        WHERE schemaname = :schema AND tablename = :table AND attname = :column
+    ) AS stats
+""")
+
+
+@dataclass
+class DateColumn:
+    table: str
+    column: str
+    schema: Optional[str] = None
+    indexed: bool = False
+    primary_keys: list = field(default_factory=list)
+
+
+def is_date_type(column_type) -> bool:
+    return isinstance(column_type, (Date, DateTime))
+
+
+def _isoformat(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _profile_column(engine: Engine, col: DateColumn, token: CancellationToken) -> dict:
+    target = table(col.table, column(col.column), *[column(pk) for pk in col.primary_keys], schema=col.schema)
+    value = target.c[col.column]
+    bounds = select(func.min(value), func.max(value))
+    is_postgres = engine.dialect.name == "postgresql"
+
+    with engine.connect() as connection, token.track(connection):
+        # Leading index column: MIN/MAX is answered from the index without a scan
+        if col.indexed:
+            row = connection.execute(bounds.select_from(target)).first()
+            return {"min_date": row[0], "max_date": row[1], "profile_method": "index"}
+
+        if is_postgres:
+            token.raise_if_cancelled()
+            row = connection.execute(_PG_STATS_BOUNDS, {
+                "schema": col.schema or "public",
+                "table": col.table,
+                "column": col.column,
+            }).first()
+            if row and row.min_value is not None:
+                return {"min_date": row.min_value, "max_date": row.max_value, "profile_method": "catalog_statistics"}
+
+            token.raise_if_cancelled()
+            sampled = tablesample(target, func.system(settings.PROFILE_SAMPLE_PERCENT))
+            row = connection.execute(
+                select(func.min(sampled.c[col.column]), func.max(sampled.c[col.column]))
+            ).first()
+            if row[0] is not None:
+                return {"min_date": row[0], "max_date": row[1], "profile_method": "tablesample"}
+
+        if col.primary_keys:
+            # Head and tail of the primary key order; on append-mostly tables these
+            # hold the oldest and newest rows
+            pk = target.c[col.primary_keys[0]]
+            head = select(value).select_from(target).order_by(pk.asc()).limit(settings.PROFILE_SAMPLE_ROWS).subquery()
+            tail = select(value).select_from(target).order_by(pk.desc()).limit(settings.PROFILE_SAMPLE_ROWS).subquery()
+        else:
+            head = tail = select(value).select_from(target).limit(settings.PROFILE_SAMPLE_ROWS).subquery()
+
+        token.raise_if_cancelled()
+        row = connection.execute(select(
+            select(func.min(head.c[col.column])).scalar_subquery(),
+            select(func.max(tail.c[col.column])).scalar_subquery()
+        )).first()
+        return {"min_date": row[0], "max_date": row[1], "profile_method": "sampled"}
+
+
+def profile_date_columns(
+    engine: Engine,
+    cache_key: str,
+    columns: list,
+    token: Optional[CancellationToken] = None
+) -> tuple:
+    """
+    Compute min/max values for date and timestamp columns.
+
+    Uses index lookups, catalog statistics or sampled aggregates instead of full
+    table scans. Up to PROFILE_MAX_CONCURRENCY columns of one connection are
+    profiled at a time and results are cached for PROFILE_CACHE_TTL_SECONDS.
+    Returns a mapping of (schema, table, column) to the profile, plus a list of
+    the columns that could not be profiled (failed, timed out or cancelled).
+    """
+    token = token or CancellationToken()
+    results = {}
+    errors = []
+    pending = []
+    for col in columns:
+        key = (cache_key, col.schema, col.table, col.column)
+        cached = _profile_cache.get(key)
+        if cached is not None:
+            results[key[1:]] = cached
+        else:
+            pending.append(col)
+
+    def run(col: DateColumn):
+        try:
+            token.raise_if_cancelled()
+            profile = _profile_column(engine, col, token)
+        except OperationCancelled as e:
+            return col, None, f"cancelled: {e}"
+        except Exception as e:
+            if token.cancelled:
+                return col, None, f"cancelled: {token.reason}"
+            logger.warning("Could not profile %s.%s: %s", col.table, col.column, e)
+            return col, None, str(e)
+        profile["min_date"] = _isoformat(profile["min_date"])
+        profile["max_date"] = _isoformat(profile["max_date"])
+        return col, profile, None
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=settings.PROFILE_MAX_CONCURRENCY) as pool:
+            for col, profile, error in pool.map(run, pending):
+                if profile is None:
+                    errors.append({"schema": col.schema, "table": col.table, "column": col.column, "error": error})
+                    continue
+                _profile_cache.set((cache_key, col.schema, col.table, col.column), profile)
+                results[(col.schema, col.table, col.column)] = profile
+
+    return results, errors
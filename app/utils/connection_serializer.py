@@ -0,0 +1,48 @@
+from typing import Optional
+
+from app.models.schema_models import DatabaseConnectionModel
+from app.utils.crypt import decrypt_string_cached, MASK
+
+
+def mask_connection_string(conn: DatabaseConnectionModel) -> str:
+    """
+    Rebuild a displayable connection string from the plaintext columns, without decrypting.
+    """
+    return f"{conn.db_type or 'database'}://{conn.db_username or ''}:{MASK}@{conn.db_host_link or ''}/{conn.db_name or ''}"
+
+
+def serialize_connection(
+    conn: DatabaseConnectionModel,
+    include_schema: bool = True,
+    credentials: str = "decrypted",
+    plaintexts: Optional[dict] = None
+) -> dict:
+    """
+    Convert a database connection row into the dictionary returned by the API.
+
+    The (potentially multi-megabyte) db_schema is left out when include_schema is False.
+    With credentials="masked" nothing is decrypted. Otherwise values are looked up in
+    ``plaintexts`` (from a bulk decrypt) before falling back to the decryption cache.
+    """
+    if credentials == "masked":
+        connection_string = mask_connection_string(conn)
+        password = MASK if conn.db_password else None
+    else:
+        plaintexts = plaintexts or {}
+        connection_string = plaintexts.get(conn.db_connection_string) or decrypt_string_cached(conn.db_connection_string)
+        password = plaintexts.get(conn.db_password) or (decrypt_string_cached(conn.db_password) if conn.db_password else None)
+
+    conn_dict = {
+        "id": str(conn.id),
+        "project_id": str(conn.project_id),
+        "db_connection_string": connection_string,
+        "db_username": conn.db_username,
+        "db_password": password,
+        "db_host_link": conn.db_host_link,
+        "db_name": conn.db_name,
+        "db_type": conn.db_type,
+        "name": conn.connection_name
+    }
+    if include_schema:
+        conn_dict["db_schema"] = conn.db_schema
+    return conn_dict
@@ -1,13 +1,26 @@
+import hashlib
 import bcrypt
-from cryptography.fernet import Fernet
+from typing import Iterable
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from app.core.settings import settings
+from app.utils.ttl_cache import TTLCache
 
 ENCRYPTION_KEY = settings.ENCRYPTION_KEY
 
 if not ENCRYPTION_KEY:
     raise ValueError("ENCRYPTION_KEY is missing in environment variables!")
 
-cipher = Fernet(ENCRYPTION_KEY)
+primary_cipher = Fernet(ENCRYPTION_KEY)
+
+# Encrypts with ENCRYPTION_KEY and still decrypts values written under any previous key
+cipher = MultiFernet([primary_cipher] + [
+    Fernet(key.strip()) for key in settings.ENCRYPTION_KEYS_PREVIOUS.split(",") if key.strip()
+])
+
+# Decrypted values keyed by a digest of their ciphertext, so plaintext never acts as a key
+_decrypted_cache = TTLCache(ttl=settings.CREDENTIAL_CACHE_TTL_SECONDS, maxsize=settings.CREDENTIAL_CACHE_SIZE)
+
+MASK = "********"
 
 def encrypt_string(string_value: str) -> str:
     return cipher.encrypt(string_value.encode()).decode()
@@ -15,6 +28,34 @@ def encrypt_string(string_value: str) -> str:
 def decrypt_string(encrypted_string_value: str) -> str:
     return cipher.decrypt(encrypted_string_value.encode()).decode()
 
+def is_current_key(encrypted_string_value: str) -> bool:
+    try:
+        primary_cipher.decrypt(encrypted_string_value.encode())
+        return True
+    except InvalidToken:
+        return False
+
+def rotate_string(encrypted_string_value: str) -> str:
+    """
+    Re-encrypt a value under ENCRYPTION_KEY, keeping its original timestamp.
+    """
+    return cipher.rotate(encrypted_string_value.encode()).decode()
+
+def decrypt_string_cached(encrypted_string_value: str) -> str:
+    key = hashlib.sha256(encrypted_string_value.encode()).digest()
+    value = _decrypted_cache.get(key)
+    if value is None:
+        value = decrypt_string(encrypted_string_value)
+        _decrypted_cache.set(key, value)
+    return value
+
+def decrypt_many(encrypted_values: Iterable[str]) -> dict:
+    """
+    Decrypt a batch of values, decrypting each distinct ciphertext at most once.
+    Returns a mapping of ciphertext to plaintext.
+    """
+    return {value: decrypt_string_cached(value) for value in set(encrypted_values) if value}
+
 def get_password_hash(password: str) -> str:
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
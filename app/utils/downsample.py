@@ -0,0 +1,250 @@
+import time
+import warnings
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.utils.query_engine import ChartResult, build_result
+
+METHODS = ("lttb", "minmax")
+PUSHDOWN_DIALECTS = ("postgresql", "mysql", "mariadb")
+
+
+@dataclass
+class SeriesColumns:
+    time: str
+    values: List[str]
+    keys: List[str]
+
+
+def as_datetime64(values: list) -> Optional[np.ndarray]:
+    try:
+        with warnings.catch_warnings():
+            # Offsets in ISO strings are accepted but deprecated by NumPy
+            warnings.simplefilter("ignore")
+            return np.array(values, dtype="datetime64[us]")
+    except (ValueError, TypeError):
+        return None
+
+
+def series_columns(result: ChartResult) -> Optional[SeriesColumns]:
+    """
+    Identify the time axis, numeric value columns and series key columns of a result.
+    Drivers that return timestamps as text (SQLite) are recognised by parsing the values.
+    """
+    time_column = None
+    values, keys = [], []
+    for col, column_values in zip(result.columns, result.values):
+        if time_column is None and col["type"] in ("datetime", "date"):
+            time_column = col["name"]
+        elif col["type"] in ("integer", "number"):
+            values.append(col["name"])
+        elif time_column is None and col["type"] == "string" and column_values \
+                and as_datetime64(column_values[:10]) is not None:
+            time_column = col["name"]
+        else:
+            keys.append(col["name"])
+    if time_column is None or not values:
+        return None
+    return SeriesColumns(time=time_column, values=values, keys=keys)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets. Each bucket is evaluated with vectorized
+    triangle areas; only the walk across buckets is sequential.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Mean of every bucket, used as the third triangle vertex for the bucket before it
+    counts = np.diff(edges)
+    x_sums = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) if n > 2 else np.array([])
+    y_sums = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) if n > 2 else np.array([])
+    x_means = np.append(x_sums / np.maximum(counts, 1), x[-1])
+    y_means = np.append(y_sums / np.maximum(counts, 1), y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if start >= end:
+            selected[i + 1] = previous
+            continue
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs(
+            (x[previous] - x_means[i + 1]) * (by - y[previous])
+            - (x[previous] - bx) * (y_means[i + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return np.unique(selected)
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum value in each of ``buckets`` equal-width
+    time buckets, plus the first and last point. ``x`` must be sorted.
+    """
+    n = len(x)
+    if n <= buckets * 2:
+        return np.arange(n)
+    span = x[-1] - x[0]
+    bucket = np.zeros(n, dtype=np.int64) if span <= 0 else \
+        np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+
+    # x is sorted, so every bucket is a contiguous run of rows
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    counts = np.diff(np.append(starts, n))
+    picked = [[0, n - 1]]
+    for reduce in (np.minimum, np.maximum):
+        extremes = np.repeat(reduce.reduceat(y, starts), counts)
+        hits = np.flatnonzero(y == extremes)
+        picked.append(hits[np.searchsorted(hits, starts)])
+    return np.unique(np.concatenate(picked))
+
+
+def _numeric(values: list) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _series_indices(x: np.ndarray, ys: list, rows: np.ndarray, width: int, method: str) -> np.ndarray:
+    rows = rows[np.argsort(x[rows], kind="stable")]
+    sx = x[rows]
+    if method == "lttb":
+        y = np.nan_to_num(ys[0][rows])
+        return rows[lttb_indices(sx, y, width)]
+    picked = [minmax_indices(sx, np.nan_to_num(y[rows]), max(1, width // 2)) for y in ys]
+    return rows[np.unique(np.concatenate(picked))]
+
+
+def _kept_rows(result: ChartResult, width: int, method: str, columns: Optional[SeriesColumns]) -> Optional[np.ndarray]:
+    """
+    Sorted indices of the rows that represent each series of ``result`` in about
+    ``width`` points, or None when it is not a time series.
+    """
+    names = [col["name"] for col in result.columns]
+    if columns is None or result.row_count == 0:
+        return None
+
+    times = as_datetime64(result.values[names.index(columns.time)])
+    if times is None:
+        return None
+    x = times.astype(np.int64).astype(np.float64)
+    valid = ~np.isnat(times)
+    ys = [_numeric(result.values[names.index(name)]) for name in columns.values]
+
+    if columns.keys:
+        key_values = [result.values[names.index(name)] for name in columns.keys]
+        series = {}
+        for row, key in enumerate(zip(*key_values)):
+            if valid[row]:
+                series.setdefault(key, []).append(row)
+        groups = [np.array(rows, dtype=np.int64) for rows in series.values()]
+    else:
+        groups = [np.flatnonzero(valid)]
+
+    return np.sort(np.concatenate([_series_indices(x, ys, rows, width, method) for rows in groups if len(rows)]))
+
+
+def downsample_result(
+    result: ChartResult,
+    width: int,
+    method: str = "lttb",
+    columns: Optional[SeriesColumns] = None,
+    pushdown: bool = False
+) -> ChartResult:
+    """
+    Reduce a time series result to about ``width`` points per series. Rows with
+    different values in the key columns form separate series. Results that are
+    not time series are returned unchanged.
+    """
+    keep = _kept_rows(result, width, method, columns or series_columns(result))
+    if keep is None:
+        return result
+    return ChartResult(
+        columns=result.columns,
+        values=[[values[i] for i in keep] for values in result.values],
+        row_count=len(keep),
+        truncated=result.truncated,
+        elapsed_ms=result.elapsed_ms,
+        meta={
+            **result.meta,
+            "downsampled": {
+                "method": method,
+                "width": width,
+                "source_rows": result.meta.get("source_rows", result.row_count),
+                "pushdown": pushdown
+            }
+        }
+    )
+
+
+def chunk_reducer(width: int, columns: Optional[SeriesColumns] = None) -> Callable[[list, list], list]:
+    """
+    Reducer for streamed source rows: keeps the minimum and maximum rows of
+    ``width`` * 2 time buckets per series and value column, so a series read in
+    chunks holds a few thousand real rows in memory instead of every source row.
+    The final points are picked from what is left.
+    """
+    def reduce(names: list, rows: list) -> list:
+        chunk = build_result(names, rows, len(rows), time.perf_counter())
+        keep = _kept_rows(chunk, width * 4, "minmax", columns or series_columns(chunk))
+        return rows if keep is None else [rows[i] for i in keep]
+    return reduce
+
+
+def bucket_query(dialect, sql: str, columns: SeriesColumns, names: List[str], buckets: int) -> Optional[str]:
+    """
+    Wrap a chart query so the database groups it into ``buckets`` equal-width
+    time buckets and returns a min row and a max row per bucket and series, in
+    the original column order. Returns None for dialects without support.
+
+    The min and max rows are whole source rows, picked with ROW_NUMBER() per
+    value column, so every point returned existed in the series; taking MIN and
+    MAX of each column separately would pair times and values of different rows.
+    Needs window functions: Postgres, MySQL 8 or MariaDB 10.2.
+    """
+    if dialect.name not in PUSHDOWN_DIALECTS:
+        return None
+    quote = dialect.identifier_preparer.quote
+    t = quote(columns.time)
+    if dialect.name == "postgresql":
+        epoch = "EXTRACT(EPOCH FROM {})"
+        bucket = (
+            f"width_bucket({epoch.format('src.' + t)}, {epoch.format('bounds.lo')}, "
+            f"{epoch.format('bounds.hi')} + 1, {int(buckets)})"
+        )
+    else:
+        epoch = "UNIX_TIMESTAMP({})"
+        bucket = (
+            f"FLOOR(({epoch.format('src.' + t)} - {epoch.format('bounds.lo')}) * {int(buckets)} / "
+            f"({epoch.format('bounds.hi')} - {epoch.format('bounds.lo')} + 1))"
+        )
+
+    partition = ", ".join(["bucket__"] + [quote(name) for name in columns.keys])
+    ranks, picked = [], []
+    for i, name in enumerate(columns.values):
+        v = quote(name)
+        # NULLs sort first on MySQL and last on Postgres; rank them after every value on both
+        for direction, alias in (("ASC", f"lo_{i}__"), ("DESC", f"hi_{i}__")):
+            ranks.append(
+                f"ROW_NUMBER() OVER (PARTITION BY {partition} "
+                f"ORDER BY CASE WHEN {v} IS NULL THEN 1 ELSE 0 END, {v} {direction}, {t}) AS {alias}"
+            )
+            picked.append(f"{alias} = 1")
+
+    source = sql.strip().rstrip(";")
+    return (
+        f"WITH src AS ({source}), "
+        f"bounds AS (SELECT MIN({t}) AS lo, MAX({t}) AS hi FROM src), "
+        f"bucketed AS (SELECT src.*, {bucket} AS bucket__ FROM src CROSS JOIN bounds), "
+        f"ranked AS (SELECT bucketed.*, {', '.join(ranks)} FROM bucketed) "
+        f"SELECT {', '.join(quote(name) for name in names)} FROM ranked WHERE {' OR '.join(picked)} "
+        f"ORDER BY {names.index(columns.time) + 1}"
+    )
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+from app.core.settings import settings
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def connection_key(connection_string: str) -> str:
+    """
+    Stable key for an external connection that does not expose its credentials.
+    """
+    return hashlib.sha256(connection_string.encode()).hexdigest()
+
+
+def _timeout_connect_args(backend: str) -> dict:
+    """
+    Driver arguments that bound how long connecting and running one statement may take.
+    """
+    connect_timeout = settings.EXTERNAL_CONNECT_TIMEOUT_SECONDS
+    statement_timeout_ms = int(settings.EXTERNAL_STATEMENT_TIMEOUT_SECONDS * 1000)
+    if backend == "postgresql":
+        return {"connect_timeout": connect_timeout, "options": f"-c statement_timeout={statement_timeout_ms}"}
+    if backend in ("mysql", "mariadb"):
+        # read_timeout is a client-side backstop for statements the server does not interrupt
+        return {"connect_timeout": connect_timeout, "read_timeout": settings.EXTERNAL_STATEMENT_TIMEOUT_SECONDS * 2}
+    if backend == "sqlite":
+        return {"timeout": connect_timeout}
+    return {}
+
+
+def get_external_engine(connection_string: str) -> Engine:
+    """
+    Return the pooled engine for an external database, creating it on first use.
+    Engines are shared by every request that talks to the same connection string.
+    """
+    key = connection_key(connection_string)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            backend = make_url(connection_string).get_backend_name()
+            engine = create_engine(
+                connection_string,
+                pool_pre_ping=True,
+                pool_recycle=300,
+                pool_size=settings.EXTERNAL_POOL_SIZE,
+                max_overflow=settings.EXTERNAL_MAX_OVERFLOW,
+                pool_timeout=settings.EXTERNAL_CONNECT_TIMEOUT_SECONDS,
+                connect_args=_timeout_connect_args(backend)
+            )
+            if backend in ("mysql", "mariadb"):
+                event.listen(engine, "connect", _set_mysql_statement_timeout)
+            _engines[key] = engine
+        return engine
+
+
+def _set_mysql_statement_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SET SESSION max_execution_time = {int(settings.EXTERNAL_STATEMENT_TIMEOUT_SECONDS * 1000)}")
+    finally:
+        cursor.close()
+
+
+def dispose_external_engine(connection_string: str):
+    with _engines_lock:
+        engine = _engines.pop(connection_key(connection_string), None)
+    if engine is not None:
+        engine.dispose()
@@ -0,0 +1,276 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import MetaData, Table, select, types as sqltypes
+
+from app.core.settings import settings
+from app.utils.cancellation import CancellationToken
+from app.utils.external_db import get_external_engine
+from app.utils.query_engine import ChartResult, bounded_transaction, build_result
+from app.utils.sql_normalizer import is_single_statement, tokenize
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - extracts need duckdb and pyarrow
+    duckdb = None
+    pa = None
+
+MANIFEST = "manifest.json"
+
+
+class ExtractBusy(Exception):
+    pass
+
+
+def extracts_available() -> bool:
+    return duckdb is not None and pa is not None
+
+
+def _extract_dir(connection_id) -> str:
+    return os.path.join(settings.EXTRACT_DIR, str(connection_id))
+
+
+def _arrow_type(column_type):
+    if isinstance(column_type, sqltypes.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, sqltypes.Integer):
+        return pa.int64()
+    if isinstance(column_type, sqltypes.Numeric):
+        return pa.float64()
+    if isinstance(column_type, sqltypes.DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    if isinstance(column_type, sqltypes.Date):
+        return pa.date32()
+    if isinstance(column_type, sqltypes.Time):
+        return pa.time64("us")
+    if isinstance(column_type, sqltypes.LargeBinary):
+        return pa.binary()
+    return pa.string()
+
+
+def _converter(arrow_type):
+    if arrow_type == pa.float64():
+        return lambda value: float(value) if isinstance(value, Decimal) else value
+    if arrow_type == pa.string():
+        def to_text(value):
+            if value is None or isinstance(value, str):
+                return value
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, default=str)
+            return str(value)
+        return to_text
+    return None
+
+
+def _extract_table(connection, spec: str, path: str, token: CancellationToken) -> dict:
+    """
+    Stream one source table into a Parquet file, EXTRACT_BATCH_SIZE rows at a time.
+    Column types come from the reflected table, so every batch shares one schema.
+    """
+    schema, _, name = spec.rpartition(".")
+    table = Table(name, MetaData(), schema=schema or None, autoload_with=connection)
+    arrow_schema = pa.schema([pa.field(column.name, _arrow_type(column.type)) for column in table.columns])
+    converters = [_converter(field.type) for field in arrow_schema]
+
+    rows = 0
+    result = connection.execution_options(stream_results=True).execute(select(table))
+    try:
+        with pq.ParquetWriter(path, arrow_schema, compression="zstd") as writer:
+            while True:
+                token.raise_if_cancelled()
+                batch = result.fetchmany(settings.EXTRACT_BATCH_SIZE)
+                if not batch:
+                    break
+                arrays = [
+                    pa.array(values if convert is None else [convert(value) for value in values], type=field.type)
+                    for field, convert, values in zip(arrow_schema, converters, zip(*batch))
+                ]
+                writer.write_batch(pa.record_batch(arrays, schema=arrow_schema))
+                rows += len(batch)
+    finally:
+        result.close()
+
+    return {
+        "schema": schema or None,
+        "table": name,
+        "file": os.path.basename(path),
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "columns": [{"name": field.name, "type": str(field.type)} for field in arrow_schema]
+    }
+
+
+@contextmanager
+def _build_lock(root: str):
+    # Processes on the same host share the extract directory; only one builds it at a time
+    with open(os.path.join(root, ".lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ExtractBusy("The extract is already being refreshed")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_manifest(root: str, manifest: dict):
+    path = os.path.join(root, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def build_extract(connection_id, connection_string: str, tables: list, token: CancellationToken) -> dict:
+    """
+    Snapshot ``tables`` ("table" or "schema.table") of a connection into a new
+    version directory of Parquet files and switch the manifest to it.
+
+    Every table is read in one read-only transaction. The previous version is kept
+    for queries that are still reading it; older versions are removed.
+    """
+    if not extracts_available():
+        raise RuntimeError("Extracts require the duckdb and pyarrow packages")
+    root = _extract_dir(connection_id)
+    os.makedirs(root, exist_ok=True)
+
+    with _build_lock(root):
+        previous = load_manifest(connection_id)
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        target = os.path.join(root, version)
+        os.makedirs(target)
+        started = time.perf_counter()
+        try:
+            engine = get_external_engine(connection_string)
+            with engine.connect() as connection, token.track(connection), \
+                    bounded_transaction(connection, token.remaining() or settings.EXTRACT_TIMEOUT_SECONDS):
+                entries = [
+                    _extract_table(connection, spec, os.path.join(target, f"{i}.parquet"), token)
+                    for i, spec in enumerate(tables)
+                ]
+            manifest = {
+                "connection_id": str(connection_id),
+                "version": version,
+                "built_at": datetime.now(timezone.utc).isoformat(),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "tables": entries
+            }
+            _write_manifest(root, manifest)
+        except BaseException:
+            shutil.rmtree(target, ignore_errors=True)
+            raise
+
+        keep = {version, previous["version"] if previous else None}
+        for entry in os.listdir(root):
+            path = os.path.join(root, entry)
+            if os.path.isdir(path) and entry not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+def load_manifest(connection_id) -> Optional[dict]:
+    """
+    The manifest of a connection's current extract, or None when it has none.
+    """
+    try:
+        with open(os.path.join(_extract_dir(connection_id), MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def remove_extract(connection_id):
+    shutil.rmtree(_extract_dir(connection_id), ignore_errors=True)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _lock_down(connection, directory: str):
+    """
+    Limit file access of a DuckDB connection to the extract version it reads, so
+    chart SQL can neither read nor write other files of the server, and keep the
+    query from changing that. The order matters: allowed_directories cannot be set
+    once external access is off, and nothing can be set once the configuration
+    is locked.
+    """
+    connection.execute(f"SET allowed_directories = [{_literal(directory)}]")
+    connection.execute("SET enable_external_access = false")
+    connection.execute("SET lock_configuration = true")
+
+
+def _create_views(connection, directory: str, manifest: dict):
+    """
+    Expose each extracted table under its source name, schema-qualified and, when
+    the name is unique, unqualified as well, so chart queries run unchanged.
+    """
+    names = [entry["table"] for entry in manifest["tables"]]
+    for entry in manifest["tables"]:
+        source = f"read_parquet({_literal(os.path.join(directory, entry['file']))})"
+        if entry["schema"]:
+            connection.execute(f"CREATE SCHEMA IF NOT EXISTS {_quote(entry['schema'])}")
+            connection.execute(
+                f"CREATE VIEW {_quote(entry['schema'])}.{_quote(entry['table'])} AS SELECT * FROM {source}"
+            )
+        if not entry["schema"] or names.count(entry["table"]) == 1:
+            connection.execute(f"CREATE VIEW IF NOT EXISTS {_quote(entry['table'])} AS SELECT * FROM {source}")
+
+
+def _duckdb_binds(sql: str) -> str:
+    # DuckDB names parameters $name where SQLAlchemy text() uses :name
+    return "".join(
+        "$" + text[1:] if kind == "bind" and text.startswith(":") else text
+        for kind, text in tokenize(sql)
+    )
+
+
+def execute_extract_query(
+    connection_id,
+    manifest: dict,
+    sql: str,
+    row_limit: int = None,
+    params: Optional[dict] = None,
+    token: Optional[CancellationToken] = None
+) -> ChartResult:
+    """
+    Run a chart query against a connection's extract in an in-memory DuckDB
+    database whose views read the extract's Parquet files. ``params`` bind the
+    query's :name parameters. The connection can only read the extract's files
+    and the query must be a single statement.
+    """
+    if not is_single_statement(sql):
+        raise ValueError("Chart queries must be a single SQL statement")
+    row_limit = row_limit or settings.CHART_ROW_LIMIT
+    token = token or CancellationToken(settings.CHART_QUERY_TIMEOUT_SECONDS)
+    started = time.perf_counter()
+
+    directory = os.path.join(_extract_dir(connection_id), manifest["version"])
+    connection = duckdb.connect(config={"threads": settings.EXTRACT_QUERY_THREADS})
+    try:
+        with token.watch(connection.interrupt):
+            _lock_down(connection, directory)
+            _create_views(connection, directory, manifest)
+            sql = sql.strip().rstrip(";")
+            cursor = connection.execute(_duckdb_binds(sql), params) if params else connection.execute(sql)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchmany(row_limit + 1)
+    finally:
+        connection.close()
+
+    result = build_result(names, rows, row_limit, started)
+    result.meta["extract"] = {"version": manifest["version"], "built_at": manifest["built_at"]}
+    return result
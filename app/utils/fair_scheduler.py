@@ -0,0 +1,146 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Hashable, Optional
+
+import numpy as np
+
+
+class SchedulerRejected(Exception):
+    pass
+
+
+class _ProjectQueue:
+    __slots__ = ("weight", "waiters", "running", "admitted", "rejected", "timed_out", "waits")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.waiters = deque()
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Recent queue waits in seconds, for the wait percentiles
+        self.waits = deque(maxlen=1000)
+
+
+class FairScheduler:
+    """
+    Weighted fair sharing of ``slots`` execution slots between projects.
+
+    A project may use every free slot while nobody else waits. Once slots are
+    contended, each freed slot goes to the waiting project with the fewest
+    running queries per unit of weight, first come first served within a
+    project, so a busy project cannot starve the others. A project's queue is
+    bounded by ``max_queued`` and nobody waits longer than ``wait_slo`` seconds;
+    both are reported as SchedulerRejected. Weights must be positive and finite.
+    """
+
+    def __init__(self, slots: int, max_queued: int, wait_slo: float, weights: Optional[dict] = None):
+        for project_id, weight in (weights or {}).items():
+            if not (isinstance(weight, (int, float)) and math.isfinite(weight) and weight > 0):
+                raise ValueError(f"Scheduler weight of {project_id} must be a positive number, not {weight!r}")
+        self.slots = slots
+        self.max_queued = max_queued
+        self.wait_slo = wait_slo
+        self.weights = weights or {}
+        self.in_use = 0
+        self._projects = {}
+
+    def _queue(self, project_id: Hashable) -> _ProjectQueue:
+        queue = self._projects.get(project_id)
+        if queue is None:
+            queue = self._projects[project_id] = _ProjectQueue(self.weights.get(project_id, 1.0))
+        return queue
+
+    def _grant(self, queue: _ProjectQueue):
+        self.in_use += 1
+        queue.running += 1
+        queue.admitted += 1
+
+    def _dispatch(self):
+        while self.in_use < self.slots:
+            waiting = [queue for queue in self._projects.values() if queue.waiters]
+            if not waiting:
+                return
+            queue = min(waiting, key=lambda q: (q.running / q.weight, q.waiters[0][0]))
+            _, future = queue.waiters.popleft()
+            if future.done():
+                # Its waiter timed out or was cancelled and is about to leave
+                continue
+            self._grant(queue)
+            future.set_result(None)
+
+    def _release(self, queue: _ProjectQueue):
+        self.in_use -= 1
+        queue.running -= 1
+        self._dispatch()
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_use >= self.slots
+
+    @asynccontextmanager
+    async def slot(self, project_id: Hashable, timeout: Optional[float] = None):
+        """
+        Hold one slot for the block. ``timeout`` shortens the wait below ``wait_slo``.
+        """
+        wait = self.wait_slo if timeout is None else min(timeout, self.wait_slo)
+        queue = self._queue(project_id)
+        arrived = time.monotonic()
+        if self.in_use < self.slots and not any(q.waiters for q in self._projects.values()):
+            self._grant(queue)
+        else:
+            if len(queue.waiters) >= self.max_queued:
+                queue.rejected += 1
+                raise SchedulerRejected(
+                    f"This project already has {len(queue.waiters)} chart queries waiting; try again shortly"
+                )
+            future = asyncio.get_running_loop().create_future()
+            entry = (arrived, future)
+            queue.waiters.append(entry)
+            try:
+                await asyncio.wait_for(future, timeout=wait)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # The slot was granted just as the wait ended
+                    self._release(queue)
+                elif entry in queue.waiters:
+                    queue.waiters.remove(entry)
+                if isinstance(e, asyncio.TimeoutError):
+                    queue.timed_out += 1
+                    raise SchedulerRejected(
+                        f"Chart query waited more than {wait:g}s for an execution slot; try again shortly"
+                    )
+                raise e
+        queue.waits.append(time.monotonic() - arrived)
+        try:
+            yield
+        finally:
+            self._release(queue)
+
+    def stats(self, project_id: Hashable) -> dict:
+        queue = self._queue(project_id)
+        waits = np.array(queue.waits) * 1000 if queue.waits else None
+        decided = queue.admitted + queue.timed_out + queue.rejected
+        return {
+            "slots": self.slots,
+            "slots_in_use": self.in_use,
+            "wait_slo_seconds": self.wait_slo,
+            "weight": queue.weight,
+            "queued": len(queue.waiters),
+            "running": queue.running,
+            "admitted": queue.admitted,
+            "rejected_queue_full": queue.rejected,
+            "rejected_wait_slo": queue.timed_out,
+            "wait_ms": {
+                "avg": round(float(waits.mean()), 2),
+                "p50": round(float(np.percentile(waits, 50)), 2),
+                "p95": round(float(np.percentile(waits, 95)), 2),
+                "max": round(float(waits.max()), 2)
+            } if waits is not None else None,
+            # Share of queries that got a slot within the wait SLO, out of all that asked for one
+            "slo_attainment": round(queue.admitted / decided, 4) if decided else None
+        }
@@ -0,0 +1,94 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from app.utils.downsample import as_datetime64, series_columns
+from app.utils.query_engine import ChartResult
+
+
+@dataclass
+class SeriesState:
+    """
+    The full cached series of a time-based chart, extended in place of re-running
+    the whole query.
+    """
+    result: ChartResult
+    time_column: str
+    built_at: float = field(default_factory=time.time)
+    refreshed_at: float = field(default_factory=time.time)
+
+    def approx_bytes(self) -> int:
+        return self.result.approx_bytes()
+
+    def _times(self) -> np.ndarray:
+        names = [col["name"] for col in self.result.columns]
+        return as_datetime64(self.result.values[names.index(self.time_column)])
+
+    def window_start(self, overlap_seconds: float) -> Optional[datetime]:
+        """
+        Start of the window to re-query: the last cached time minus the late-data overlap.
+        """
+        if self.result.row_count == 0:
+            return None
+        times = self._times()
+        if times is None or np.isnat(times).all():
+            return None
+        names = [col["name"] for col in self.result.columns]
+        # NaT is the smallest int64, so missing times never win. The original value
+        # is parsed so a UTC offset, when present, is kept.
+        last = self.result.values[names.index(self.time_column)][int(np.argmax(times.astype(np.int64)))]
+        if isinstance(last, str):
+            last = datetime.fromisoformat(last)
+        return last - timedelta(seconds=overlap_seconds)
+
+    def merge(self, fresh: ChartResult, since: datetime, max_rows: int) -> Optional["SeriesState"]:
+        """
+        Replace the cached rows at or after ``since`` with ``fresh`` and keep at most
+        ``max_rows`` of the newest rows. Returns None when the query's columns changed.
+        """
+        if [col["name"] for col in fresh.columns] != [col["name"] for col in self.result.columns]:
+            return None
+
+        times = self._times()
+        cutoff = np.datetime64(since.replace(tzinfo=None) - (since.utcoffset() or timedelta()), "us")
+        keep = np.flatnonzero(np.isnat(times) | (times < cutoff))
+
+        values = [
+            [old[i] for i in keep] + new
+            for old, new in zip(self.result.values, fresh.values)
+        ]
+        names = [col["name"] for col in self.result.columns]
+        merged_times = as_datetime64(values[names.index(self.time_column)])
+        order = np.argsort(merged_times, kind="stable")[-max_rows:]
+        values = [[column[i] for i in order] for column in values]
+
+        return SeriesState(
+            result=ChartResult(
+                columns=self.result.columns,
+                values=values,
+                row_count=len(order),
+                truncated=self.result.truncated or fresh.truncated or len(merged_times) > max_rows,
+                elapsed_ms=fresh.elapsed_ms,
+                meta={**self.result.meta, "new_rows": fresh.row_count}
+            ),
+            time_column=self.time_column,
+            built_at=self.built_at
+        )
+
+
+def new_series_state(result: ChartResult) -> Optional[SeriesState]:
+    columns = series_columns(result)
+    if columns is None:
+        return None
+    return SeriesState(result=result, time_column=columns.time)
+
+
+def incremental_query(dialect, sql: str, time_column: str) -> str:
+    """
+    Restrict a chart query to rows at or after the ``:since`` bind parameter.
+    """
+    quoted = dialect.identifier_preparer.quote(time_column)
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS src WHERE src.{quoted} >= :since"
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+from typing import Callable, Optional
+from uuid import UUID
+
+from sqlalchemy import bindparam, select, update
+
+from app.core.db import SessionLocal
+from app.models.schema_models import DatabaseConnectionModel
+from app.utils.crypt import is_current_key, rotate_string
+
+logger = logging.getLogger(__name__)
+
+_connections = DatabaseConnectionModel.__table__
+
+# Only overwrite a row if its ciphertexts are still the ones that were read, so
+# credentials changed through the API while the job runs are never clobbered
+_rotate_row = update(_connections).where(
+    _connections.c.id == bindparam("b_id"),
+    _connections.c.db_connection_string == bindparam("b_old_connection_string"),
+    _connections.c.db_password.is_not_distinct_from(bindparam("b_old_password"))
+).values(
+    db_connection_string=bindparam("b_connection_string"),
+    db_password=bindparam("b_password")
+)
+
+
+def _read_checkpoint(path: Optional[str]) -> Optional[UUID]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return UUID(json.load(f)["last_id"])
+
+
+def _write_checkpoint(path: Optional[str], last_id: UUID):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": str(last_id)}, f)
+    os.replace(tmp_path, path)
+
+
+def rotate_connection_credentials(
+    batch_size: int = 500,
+    resume_after: Optional[UUID] = None,
+    checkpoint_path: Optional[str] = None,
+    progress: Callable[[dict], None] = None
+) -> dict:
+    """
+    Re-encrypt every DatabaseConnectionModel credential under the current ENCRYPTION_KEY.
+
+    Rows are read in id order through a server-side cursor on one session and
+    rewritten in batches of ``batch_size`` on another, committing after every
+    batch. Memory stays bounded by the batch size and no long write transaction
+    holds row locks. Values already under the current key are skipped, so the
+    job is idempotent; the last processed id is written to ``checkpoint_path``
+    and a rerun continues after it.
+    """
+    progress = progress or (lambda stats: logger.info("Key rotation progress: %s", stats))
+    resume_after = resume_after or _read_checkpoint(checkpoint_path)
+    stats = {"batches": 0, "scanned": 0, "rotated": 0, "skipped": 0, "conflicts": 0, "last_id": None}
+
+    read_db = SessionLocal()
+    write_db = SessionLocal()
+    try:
+        query = select(
+            _connections.c.id,
+            _connections.c.db_connection_string,
+            _connections.c.db_password
+        ).order_by(_connections.c.id)
+        if resume_after is not None:
+            query = query.where(_connections.c.id > resume_after)
+
+        rows = read_db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+        for batch in rows.partitions(batch_size):
+            params = []
+            for row in batch:
+                if is_current_key(row.db_connection_string) and (row.db_password is None or is_current_key(row.db_password)):
+                    stats["skipped"] += 1
+                    continue
+                params.append({
+                    "b_id": row.id,
+                    "b_old_connection_string": row.db_connection_string,
+                    "b_old_password": row.db_password,
+                    "b_connection_string": rotate_string(row.db_connection_string),
+                    "b_password": rotate_string(row.db_password) if row.db_password else None,
+                })
+
+            if params:
+                result = write_db.execute(_rotate_row, params)
+                write_db.commit()
+                stats["rotated"] += result.rowcount
+                stats["conflicts"] += len(params) - result.rowcount
+
+            stats["batches"] += 1
+            stats["scanned"] += len(batch)
+            stats["last_id"] = str(batch[-1].id)
+            _write_checkpoint(checkpoint_path, batch[-1].id)
+            progress(dict(stats))
+    except Exception:
+        write_db.rollback()
+        raise
+    finally:
+        read_db.close()
+        write_db.close()
+
+    return stats
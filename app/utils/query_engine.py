@@ -0,0 +1,349 @@
+import asyncio
+import base64
+import logging
+import math
+import pickle
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+from typing import Callable, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, NotSupportedError, ProgrammingError
+
+from app.core.settings import settings
+from app.utils.cancellation import CancellationToken
+from app.utils.external_db import get_external_engine
+from app.utils.fair_scheduler import FairScheduler, SchedulerRejected
+from app.utils.sql_normalizer import is_single_statement, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBusyError(Exception):
+    pass
+
+
+@dataclass
+class ChartResult:
+    """
+    Typed, column-oriented query result: ``values[i]`` holds every value of ``columns[i]``.
+    """
+    columns: list
+    values: list
+    row_count: int
+    truncated: bool = False
+    elapsed_ms: float = 0.0
+    meta: dict = field(default_factory=dict)
+
+    def to_records(self) -> list:
+        names = [col["name"] for col in self.columns]
+        return [dict(zip(names, row)) for row in zip(*self.values)] if self.values else []
+
+    def approx_bytes(self, sample_rows: int = 64) -> int:
+        """
+        Pickled size of the result, extrapolated from its first ``sample_rows``
+        rows so measuring a large result does not serialize all of it.
+        """
+        rows = len(self.values[0]) if self.values else 0
+        head = len(pickle.dumps(replace(self, values=[values[:sample_rows] for values in self.values]), pickle.HIGHEST_PROTOCOL))
+        if rows <= sample_rows:
+            return head
+        empty = len(pickle.dumps(replace(self, values=[[] for _ in self.values]), pickle.HIGHEST_PROTOCOL))
+        return empty + (head - empty) * rows // sample_rows
+
+
+def _column_type(values: list) -> str:
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return "boolean"
+        if isinstance(value, int):
+            return "integer"
+        if isinstance(value, (float, Decimal)):
+            return "number"
+        if isinstance(value, datetime):
+            return "datetime"
+        if isinstance(value, date):
+            return "date"
+        if isinstance(value, time_of_day):
+            return "time"
+        return "string"
+    return "null"
+
+
+def _to_json_value(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    # JSON has no NaN or Infinity; responses with them fail or do not parse
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return None
+        value = float(value)
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode()
+    return str(value)
+
+
+@contextmanager
+def bounded_transaction(connection, timeout_seconds: float):
+    """
+    Run the block in a read-only transaction with its own statement timeout.
+    The caller makes sure the SQL run in it is a single statement, which cannot
+    end the transaction and continue outside of it.
+    """
+    timeout_ms = int(timeout_seconds * 1000)
+    backend = connection.dialect.name
+    if backend == "postgresql":
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+    elif backend in ("mysql", "mariadb"):
+        connection.exec_driver_sql(f"SET SESSION max_execution_time = {timeout_ms}")
+        # Unlike on Postgres, transaction characteristics cannot change once the driver's transaction has begun
+        connection.exec_driver_sql("START TRANSACTION READ ONLY")
+    try:
+        yield connection
+    finally:
+        if backend in ("mysql", "mariadb"):
+            # The session setting outlives this checkout; restore the engine default
+            connection.exec_driver_sql(
+                f"SET SESSION max_execution_time = {int(settings.EXTERNAL_STATEMENT_TIMEOUT_SECONDS * 1000)}"
+            )
+
+
+def build_result(names: list, rows: list, row_limit: int, started: float) -> ChartResult:
+    """
+    Turn up to ``row_limit + 1`` fetched rows into a typed ChartResult; the extra
+    row only tells whether the result was truncated.
+    """
+    truncated = len(rows) > row_limit
+    rows = rows[:row_limit]
+    raw_columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in names]
+
+    return ChartResult(
+        columns=[
+            {"name": name, "type": _column_type(values)}
+            for name, values in zip(names, raw_columns)
+        ],
+        values=[[_to_json_value(value) for value in values] for values in raw_columns],
+        row_count=len(rows),
+        truncated=truncated,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
+
+# Query shapes whose parameterized form the database rejected; they run as written
+_literal_only = set()
+
+# Postgres errors a bind parameter can cause where the literal it replaced would not:
+# an untyped parameter, no operator or function for its type, or a value the column
+# type does not accept as a parameter
+_BIND_SQLSTATES = {"42P18", "42P08", "42883", "42725", "42804", "22P02", "22007", "22008", "22003"}
+# Drivers without SQLSTATEs, such as sqlite3 rejecting a Decimal
+_BIND_MESSAGE = re.compile(r"bind|parameter|placeholder|is not supported|arguments converted", re.IGNORECASE)
+
+
+def _bind_error(error: Exception) -> bool:
+    """
+    Whether a database error may come from binding a lifted literal, as opposed
+    to one the query raises as written, such as a syntax error or a missing table.
+    """
+    original = getattr(error, "orig", error)
+    code = getattr(original, "pgcode", None) or getattr(original, "sqlstate", None)
+    if code:
+        return code in _BIND_SQLSTATES
+    return bool(_BIND_MESSAGE.search(str(original)))
+
+
+def execute_query(
+    connection_string: str,
+    sql: str,
+    params: Optional[dict] = None,
+    row_limit: int = None,
+    token: Optional[CancellationToken] = None,
+    reducer: Optional[Callable[[list, list], list]] = None
+) -> ChartResult:
+    """
+    Run a chart query on the pooled engine of an external connection.
+
+    At most ``row_limit`` rows are fetched from a streaming cursor, so the source
+    stops producing rows once the limit is reached; ``truncated`` tells whether
+    more were available. With CHART_PARAMETERIZE_QUERIES the query's literals are
+    sent as bind parameters. When the database rejects the parameterized form with
+    an error binds can cause, the query is retried with its literals inline, and
+    if that works the shape runs that way from then on. Raises ValueError for text
+    holding more than one statement.
+
+    With a ``reducer`` the rows are read in chunks of CHART_FETCH_CHUNK_ROWS and
+    the reducer, given the column names and the rows held so far, thins them out
+    whenever a chunk arrives, so up to ``row_limit`` rows can be read without
+    holding them all; ``meta["source_rows"]`` counts the rows read.
+    """
+    dialect = get_external_engine(connection_string).dialect.name
+    if not is_single_statement(sql, dialect):
+        raise ValueError("Chart queries must be a single SQL statement")
+    row_limit = row_limit or settings.CHART_ROW_LIMIT
+    token = token or CancellationToken(settings.CHART_QUERY_TIMEOUT_SECONDS)
+    if settings.CHART_PARAMETERIZE_QUERIES:
+        normalized = normalize_sql(sql, dialect)
+        if normalized.params and normalized.fingerprint not in _literal_only:
+            try:
+                return _execute(
+                    connection_string, normalized.sql, {**normalized.params, **(params or {})}, row_limit, token, reducer
+                )
+            except (ProgrammingError, DataError, NotSupportedError) as e:
+                if token.cancelled or not _bind_error(e):
+                    raise e
+                logger.info("Query shape %s rejected bind parameters, retrying it as written: %s", normalized.fingerprint, e)
+                result = _execute(connection_string, sql, params, row_limit, token, reducer)
+                _literal_only.add(normalized.fingerprint)
+                return result
+    return _execute(connection_string, sql, params, row_limit, token, reducer)
+
+
+def _fetch_reduced(result, names: list, row_limit: int, reducer: Callable[[list, list], list]) -> tuple:
+    rows, fetched = [], 0
+    while fetched < row_limit:
+        chunk = result.fetchmany(min(settings.CHART_FETCH_CHUNK_ROWS, row_limit - fetched))
+        if not chunk:
+            break
+        fetched += len(chunk)
+        rows = reducer(names, rows + chunk)
+    return rows, fetched, fetched == row_limit and result.fetchone() is not None
+
+
+def _execute(
+    connection_string: str,
+    sql: str,
+    params: Optional[dict],
+    row_limit: int,
+    token: CancellationToken,
+    reducer: Optional[Callable[[list, list], list]] = None
+) -> ChartResult:
+    engine = get_external_engine(connection_string)
+    started = time.perf_counter()
+
+    with engine.connect() as connection, token.track(connection), \
+            bounded_transaction(connection, token.remaining() or settings.CHART_QUERY_TIMEOUT_SECONDS):
+        result = connection.execution_options(stream_results=True).execute(text(sql), params or {})
+        try:
+            names = list(result.keys())
+            if reducer is None:
+                rows = result.fetchmany(row_limit + 1)
+            else:
+                rows, fetched, truncated = _fetch_reduced(result, names, row_limit, reducer)
+        finally:
+            result.close()
+
+    if reducer is None:
+        return build_result(names, rows, row_limit, started)
+    chart_result = build_result(names, rows, len(rows), started)
+    chart_result.truncated = truncated
+    chart_result.meta["source_rows"] = fetched
+    return chart_result
+
+
+_connection_slots = {}
+
+
+def slot_available(key: str) -> bool:
+    """
+    Whether a chart query on the connection would start without queueing.
+    """
+    semaphore = _connection_slots.get(key)
+    return semaphore is None or not semaphore.locked()
+
+
+@asynccontextmanager
+async def connection_slot(key: str):
+    """
+    Limit concurrent chart queries per external connection to
+    CHART_MAX_CONCURRENCY_PER_CONNECTION. Waiting happens on the event loop, so
+    queued queries do not hold worker threads or pooled connections.
+    """
+    semaphore = _connection_slots.get(key)
+    if semaphore is None:
+        semaphore = _connection_slots.setdefault(key, asyncio.Semaphore(settings.CHART_MAX_CONCURRENCY_PER_CONNECTION))
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.CHART_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise QueryBusyError("Too many chart queries are running against this connection")
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def _scheduler_weights(spec: str) -> dict:
+    """
+    Parse FAIR_SCHEDULER_WEIGHTS ("<project id>=<weight>,..."). Entries that are
+    malformed or not a positive weight are logged and skipped, so the project
+    keeps the default weight instead of the app failing to start.
+    """
+    weights = {}
+    for pair in filter(None, (item.strip() for item in spec.split(","))):
+        project_id, _, weight = pair.partition("=")
+        try:
+            value = float(weight)
+        except ValueError:
+            value = None
+        if not project_id.strip() or value is None or not math.isfinite(value) or value <= 0:
+            logger.warning("Ignoring invalid FAIR_SCHEDULER_WEIGHTS entry %r", pair)
+            continue
+        weights[project_id.strip()] = value
+    return weights
+
+
+_scheduler = FairScheduler(
+    settings.FAIR_SCHEDULER_SLOTS,
+    settings.FAIR_SCHEDULER_MAX_QUEUED_PER_PROJECT,
+    settings.FAIR_SCHEDULER_WAIT_SLO_SECONDS,
+    _scheduler_weights(settings.FAIR_SCHEDULER_WEIGHTS)
+)
+
+
+@asynccontextmanager
+async def project_slot(project_id, timeout: Optional[float] = None):
+    """
+    Take one of the FAIR_SCHEDULER_SLOTS execution slots shared fairly between
+    projects. Raises QueryBusyError when the project's queue is full or the wait
+    exceeds FAIR_SCHEDULER_WAIT_SLO_SECONDS, or ``timeout`` when that is shorter.
+    """
+    try:
+        async with _scheduler.slot(str(project_id), timeout):
+            yield
+    except SchedulerRejected as e:
+        raise QueryBusyError(str(e))
+
+
+@asynccontextmanager
+async def execution_slot(key: str, project_id):
+    """
+    Take a slot of the connection, then the project's fair share of execution
+    slots. Both waits come out of one CHART_QUEUE_TIMEOUT_SECONDS budget, so a
+    query holding its connection slot does not wait for a second full timeout.
+    """
+    deadline = time.monotonic() + settings.CHART_QUEUE_TIMEOUT_SECONDS
+    async with connection_slot(key), project_slot(project_id, max(0.0, deadline - time.monotonic())):
+        yield
+
+
+def execution_saturated() -> bool:
+    return _scheduler.saturated
+
+
+def project_queue_stats(project_id) -> dict:
+    return _scheduler.stats(str(project_id))
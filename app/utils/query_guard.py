@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.settings import settings
+from app.utils.cancellation import CancellationToken
+from app.utils.external_db import get_external_engine
+from app.utils.query_engine import bounded_transaction
+from app.utils.sql_normalizer import is_single_statement, normalize_sql
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_plan_cache = TTLCache(ttl=settings.QUERY_GUARD_PLAN_CACHE_TTL_SECONDS, maxsize=10000)
+
+
+class QueryTooExpensive(Exception):
+    def __init__(self, estimate: "PlanEstimate"):
+        self.estimate = estimate
+        super().__init__(
+            f"Query is estimated to produce {estimate.rows:,.0f} rows at cost {estimate.cost:,.0f}, "
+            f"over the limits of {settings.QUERY_GUARD_MAX_ROWS:,} rows and cost {estimate.max_cost:,.0f}"
+        )
+
+
+@dataclass
+class PlanEstimate:
+    rows: float
+    cost: float
+    # Cost limit in the units of the planner that made the estimate
+    max_cost: float
+
+    @property
+    def over_limit(self) -> bool:
+        return self.rows > settings.QUERY_GUARD_MAX_ROWS or self.cost > self.max_cost
+
+    def to_dict(self) -> dict:
+        return {"estimated_rows": self.rows, "estimated_cost": self.cost}
+
+
+def _postgres_estimate(plan) -> PlanEstimate:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    return PlanEstimate(rows=float(root["Plan Rows"]), cost=float(root["Total Cost"]), max_cost=settings.QUERY_GUARD_MAX_COST)
+
+
+def _mysql_estimate(plan) -> PlanEstimate:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    block = plan["query_block"]
+    cost = float(block.get("cost_info", {}).get("query_cost", 0))
+    rows = 0.0
+
+    def walk(node):
+        nonlocal rows
+        if isinstance(node, dict):
+            produced = node.get("rows_produced_per_join")
+            if produced is not None:
+                rows = max(rows, float(produced))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(block)
+    return PlanEstimate(rows=rows, cost=cost, max_cost=settings.QUERY_GUARD_MAX_COST_MYSQL)
+
+
+def explain_estimate(
+    connection_string: str,
+    sql: str,
+    params: Optional[dict] = None,
+    token: Optional[CancellationToken] = None
+) -> Optional[PlanEstimate]:
+    """
+    Ask the planner for the estimated output rows and total cost of a query.
+    Returns None for databases without a cost-based EXPLAIN (SQLite).
+
+    EXPLAIN runs in the same read-only, time-bounded transaction as chart
+    queries, and text holding more than one statement raises ValueError before
+    anything runs, as MySQL would execute the statements after the explained one.
+    """
+    engine = get_external_engine(connection_string)
+    backend = engine.dialect.name
+    if not is_single_statement(sql, backend):
+        raise ValueError("Chart queries must be a single SQL statement")
+    if backend == "postgresql":
+        statement, parse = f"EXPLAIN (FORMAT JSON) {sql}", _postgres_estimate
+    elif backend in ("mysql", "mariadb"):
+        statement, parse = f"EXPLAIN FORMAT=JSON {sql}", _mysql_estimate
+    else:
+        return None
+
+    token = token or CancellationToken(settings.CHART_QUERY_TIMEOUT_SECONDS)
+    with engine.connect() as connection, token.track(connection), \
+            bounded_transaction(connection, token.remaining() or settings.CHART_QUERY_TIMEOUT_SECONDS):
+        plan = connection.execute(text(statement), params or {}).scalar()
+    return parse(plan)
+
+
+_MISSING = object()
+
+
+def _cached_estimate(connection_key: str, connection_string: str, sql: str, params, token):
+    # Literal values are part of the key: a cheap plan for one date range says nothing about another
+    normalized = normalize_sql(sql)
+    values = json.dumps([normalized.params, params or {}], sort_keys=True, default=str)
+    cache_key = (connection_key, normalized.fingerprint, hashlib.sha256(values.encode()).hexdigest())
+    estimate = _plan_cache.get(cache_key, _MISSING)
+    if estimate is _MISSING:
+        try:
+            estimate = explain_estimate(connection_string, sql, params, token)
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.warning("EXPLAIN failed, running the query unguarded: %s", e)
+            return None
+        _plan_cache.set(cache_key, estimate)
+    return estimate
+
+
+def guard_query(
+    connection_key: str,
+    connection_string: str,
+    sql: str,
+    row_limit: int,
+    params: Optional[dict] = None,
+    token: Optional[CancellationToken] = None
+) -> tuple:
+    """
+    Check a query's plan estimate against QUERY_GUARD_MAX_ROWS and QUERY_GUARD_MAX_COST.
+
+    Returns (sql, info). Over the limits, QUERY_GUARD_ACTION="reject" raises
+    QueryTooExpensive and "limit" wraps the query in a LIMIT so the planner can
+    choose a fast-start plan, rejecting it only if that is still too expensive.
+    The LIMIT lets one row more than ``row_limit`` through, so the result can
+    tell that it was truncated.
+    Estimates are cached per connection, query shape and literal values, so
+    queries that differ only in formatting share one EXPLAIN. A failing EXPLAIN
+    lets the query through; running it will surface the error.
+    """
+    estimate = _cached_estimate(connection_key, connection_string, sql, params, token)
+    if estimate is None:
+        return sql, None
+    if not estimate.over_limit:
+        return sql, {**estimate.to_dict(), "action": "none"}
+    if settings.QUERY_GUARD_ACTION != "limit":
+        raise QueryTooExpensive(estimate)
+
+    limited_sql = f"SELECT * FROM ({sql.strip().rstrip(';')}) AS src LIMIT {int(row_limit) + 1}"
+    limited = _cached_estimate(connection_key, connection_string, limited_sql, params, token)
+    if limited is not None and limited.over_limit:
+        raise QueryTooExpensive(limited)
+    return limited_sql, {**estimate.to_dict(), "action": "limited", "limit": int(row_limit)}
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _ShapeStats:
+    __slots__ = ("shape", "count", "errors", "total", "durations", "last_seen")
+
+    def __init__(self, shape: str):
+        self.shape = shape
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        # Recent durations in milliseconds, for the percentiles
+        self.durations = deque(maxlen=500)
+        self.last_seen = None
+
+
+class QueryShapeStats:
+    """
+    Latency of chart queries per project and query shape, keyed by the shape's
+    fingerprint, so the same query with other literal values counts as one.
+    The least recently seen shapes of a project are dropped past ``max_shapes``.
+    """
+
+    def __init__(self, max_shapes: int = 500):
+        self.max_shapes = max_shapes
+        self._projects = {}
+        self._lock = threading.Lock()
+
+    def record(self, project_id, fingerprint: str, shape: str, elapsed_ms: float, failed: bool = False):
+        with self._lock:
+            shapes = self._projects.setdefault(str(project_id), {})
+            entry = shapes.get(fingerprint)
+            if entry is None:
+                if len(shapes) >= self.max_shapes:
+                    del shapes[min(shapes, key=lambda key: shapes[key].last_seen)]
+                entry = shapes[fingerprint] = _ShapeStats(shape)
+            entry.count += 1
+            entry.errors += failed
+            entry.total += elapsed_ms
+            entry.durations.append(elapsed_ms)
+            entry.last_seen = time.time()
+
+    def top(self, project_id, limit: int) -> list:
+        """
+        The project's shapes with the most total query time first.
+        """
+        with self._lock:
+            entries = sorted(
+                self._projects.get(str(project_id), {}).items(),
+                key=lambda item: item[1].total,
+                reverse=True
+            )[:limit]
+            snapshot = [(fingerprint, entry, np.array(entry.durations)) for fingerprint, entry in entries]
+        return [
+            {
+                "fingerprint": fingerprint,
+                "shape": entry.shape[:500],
+                "count": entry.count,
+                "errors": entry.errors,
+                "total_ms": round(entry.total, 2),
+                "avg_ms": round(entry.total / entry.count, 2),
+                "p50_ms": round(float(np.percentile(durations, 50)), 2),
+                "p95_ms": round(float(np.percentile(durations, 95)), 2),
+                "last_seen": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry.last_seen))
+            }
+            for fingerprint, entry, durations in snapshot
+        ]
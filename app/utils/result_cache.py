@@ -0,0 +1,444 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import stat
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.schema_models import ChartModel, DatabaseConnectionModel
+from app.utils.sql_normalizer import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+def result_cache_key(connection_id, sql: str, params: Optional[dict] = None, row_limit: Optional[int] = None) -> str:
+    """
+    Key a chart result by the query's shape fingerprint and literal values, so
+    queries that differ only in formatting, comments or keyword case share an entry.
+    """
+    normalized = normalize_sql(sql)
+    payload = json.dumps(
+        [str(connection_id), normalized.fingerprint, normalized.params, params or {}, row_limit],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def connection_tag(connection_id) -> str:
+    return f"connection:{connection_id}"
+
+
+def chart_tag(chart_id) -> str:
+    return f"chart:{chart_id}"
+
+
+class CacheMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_ratio"] = round(counts["hits"] / lookups, 4) if lookups else None
+        return counts
+
+
+class ResultCacheBackend(ABC):
+    """
+    Storage for cached chart results. Entries carry a TTL and a set of tags used
+    for invalidation; backends evict least recently used entries beyond ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, metrics: CacheMetrics):
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        ...
+
+    @abstractmethod
+    def invalidate(self, tag: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryResultCache(ResultCacheBackend):
+    """
+    In-process LRU; values are kept as objects so hits cost no deserialization.
+    Sizes are measured once, when an entry is stored: estimated by values that
+    provide ``approx_bytes()``, such as chart results, and pickled otherwise.
+    """
+
+    def __init__(self, max_bytes: int, metrics: CacheMetrics):
+        super().__init__(max_bytes, metrics)
+        self._data = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key: str):
+        _, _, size, tags = self._data.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        if hasattr(value, "approx_bytes"):
+            size = value.approx_bytes()
+        else:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        tags = tuple(tags)
+        evicted = 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, value, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                evicted += 1
+        if evicted:
+            self.metrics.incr("evictions", evicted)
+
+    def invalidate(self, tag: str) -> int:
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._data), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+def _private_directory(path: str):
+    """
+    Create ``path`` readable and writable by this user only, or make sure an
+    existing one is a directory owned by this user and restrict it. Raises
+    PermissionError for a symlink or a directory owned by someone else.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by the API user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+
+
+class FileResultCache(ResultCacheBackend):
+    """
+    Pickled entries in a local directory, shared by every worker process on the host.
+
+    Reads touch the entry's mtime, which is the recency used for LRU eviction. Tags
+    are marker files under ``tags/<tag>/<key>`` so any process can invalidate them.
+    Loading an entry can run code, so the directory must be private to the API user.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, metrics: CacheMetrics):
+        super().__init__(max_bytes, metrics)
+        self.directory = directory
+        self._entries = os.path.join(directory, "entries")
+        self._tag_root = os.path.join(directory, "tags")
+        for path in (directory, self._entries, self._tag_root):
+            _private_directory(path)
+        self._lock = threading.Lock()
+        self._approx_bytes = self._scan_bytes()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._entries, key)
+
+    def _tag_dir(self, tag: str) -> str:
+        return os.path.join(self._tag_root, re.sub(r"[^A-Za-z0-9_.-]", "_", tag))
+
+    def _scan_bytes(self) -> int:
+        total = 0
+        for entry in os.scandir(self._entries):
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def get(self, key: str) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Dropping unreadable result cache entry %s: %s", key, e)
+            self._unlink(path)
+            return None
+        if expires_at <= time.time():
+            self._unlink(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        data = pickle.dumps((time.time() + ttl, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        for tag in tags:
+            tag_dir = self._tag_dir(tag)
+            os.makedirs(tag_dir, exist_ok=True)
+            open(os.path.join(tag_dir, key), "wb").close()
+
+        with self._lock:
+            self._approx_bytes += len(data)
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self._entries):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% so a full cache does not rescan on every store
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            self._unlink(path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._approx_bytes = total
+        if evicted:
+            self.metrics.incr("evictions", evicted)
+            self._sweep_tags()
+
+    def _sweep_tags(self):
+        # Drop markers that point at evicted entries
+        for tag_dir in os.scandir(self._tag_root):
+            for marker in os.scandir(tag_dir.path):
+                if not os.path.exists(self._path(marker.name)):
+                    self._unlink(marker.path)
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, tag: str) -> int:
+        tag_dir = self._tag_dir(tag)
+        if not os.path.isdir(tag_dir):
+            return 0
+        count = 0
+        removed_bytes = 0
+        for marker in os.scandir(tag_dir):
+            path = self._path(marker.name)
+            try:
+                removed_bytes += os.stat(path).st_size
+                self._unlink(path)
+                count += 1
+            except FileNotFoundError:
+                pass
+            self._unlink(marker.path)
+        with self._lock:
+            self._approx_bytes = max(0, self._approx_bytes - removed_bytes)
+        return count
+
+    def clear(self):
+        for root in (self._entries, self._tag_root):
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    self._unlink(os.path.join(dirpath, filename))
+        with self._lock:
+            self._approx_bytes = 0
+
+    def stats(self) -> dict:
+        return {"backend": "file", "directory": self.directory, "bytes": self._approx_bytes, "max_bytes": self.max_bytes}
+
+
+metrics = CacheMetrics()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCacheBackend]:
+    """
+    Return the configured backend (RESULT_CACHE_BACKEND: "memory", "file" or "none").
+    """
+    global _backend
+    if settings.RESULT_CACHE_BACKEND == "none":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.RESULT_CACHE_BACKEND == "file":
+                    _backend = FileResultCache(settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_MAX_BYTES, metrics)
+                elif settings.RESULT_CACHE_BACKEND == "memory":
+                    _backend = MemoryResultCache(settings.RESULT_CACHE_MAX_BYTES, metrics)
+                else:
+                    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {settings.RESULT_CACHE_BACKEND}")
+    return _backend
+
+
+def cache_get(key: str) -> Any:
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    value = cache.get(key)
+    metrics.incr("hits" if value is not None else "misses")
+    return value
+
+
+def cache_peek(key: str) -> Any:
+    """
+    Look up an entry without counting a hit or miss, for background work such as warming.
+    """
+    cache = get_result_cache()
+    return cache.get(key) if cache is not None else None
+
+
+def cache_set(key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+    cache = get_result_cache()
+    if cache is None or ttl <= 0:
+        return
+    try:
+        cache.set(key, value, ttl, tags)
+        metrics.incr("stores")
+    except Exception as e:
+        logger.warning("Could not store chart result in cache: %s", e)
+
+
+def invalidate(*tags: str) -> int:
+    cache = get_result_cache()
+    if cache is None:
+        return 0
+    count = sum(cache.invalidate(tag) for tag in tags)
+    metrics.incr("invalidations", count)
+    return count
+
+
+def cache_metrics() -> dict:
+    cache = get_result_cache()
+    snapshot = metrics.snapshot()
+    snapshot.update(cache.stats() if cache is not None else {"backend": "none"})
+    return snapshot
+
+
+# Invalidation: collect tags while the session flushes and drop the entries only
+# once the transaction commits, so a concurrent reader cannot re-cache old data
+# between the flush and the commit.
+
+_PENDING_KEY = "result_cache_invalidations"
+
+
+def _queue(target, tag: str):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(tag)
+    else:
+        invalidate(tag)
+
+
+@event.listens_for(ChartModel, "after_update")
+def _chart_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("query", "connection_id", "cache_ttl_seconds", "time_column")):
+        _queue(target, chart_tag(target.id))
+
+
+@event.listens_for(ChartModel, "after_delete")
+def _chart_deleted(mapper, connection, target):
+    _queue(target, chart_tag(target.id))
+
+
+@event.listens_for(DatabaseConnectionModel, "after_update")
+def _connection_updated(mapper, connection, target):
+    if inspect(target).attrs.db_connection_string.history.has_changes():
+        _queue(target, connection_tag(target.id))
+
+
+@event.listens_for(DatabaseConnectionModel, "after_delete")
+def _connection_deleted(mapper, connection, target):
+    _queue(target, connection_tag(target.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    tags = session.info.pop(_PENDING_KEY, None)
+    if tags:
+        invalidate(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,128 @@
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+
+from app.utils.query_engine import ChartResult
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+JSON_RECORDS = "application/json"
+JSON_COLUMNS = "application/vnd.vizai.columns+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+SUPPORTED_FORMATS = (JSON_RECORDS, JSON_COLUMNS, ARROW_STREAM)
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Pick the chart result format from an Accept header, honouring q-values.
+    A missing header or a wildcard falls back to JSON records; raises 406 when
+    nothing acceptable can be produced.
+    """
+    if not accept:
+        return JSON_RECORDS
+
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, _, params = part.strip().partition(";")
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in (JSON_RECORDS, "*/*", "application/*"):
+            return JSON_RECORDS
+        if media_type == JSON_COLUMNS:
+            return JSON_COLUMNS
+        if media_type == ARROW_STREAM and pa is not None:
+            return ARROW_STREAM
+
+    detail = f"Supported formats: {', '.join(SUPPORTED_FORMATS)}"
+    if pa is None and any(media_type == ARROW_STREAM for _, _, media_type in candidates):
+        detail += " (Arrow requires pyarrow, which is not installed)"
+    raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=detail)
+
+
+def _arrow_array(values: list, column_type: str):
+    if column_type in ("datetime", "date"):
+        strings = pa.array(values, type=pa.string())
+        try:
+            return strings.cast(pa.timestamp("us") if column_type == "datetime" else pa.date32())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return strings
+    if column_type == "null":
+        return pa.nulls(len(values))
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def render_columns(result: ChartResult, meta: dict) -> Response:
+    """
+    Column-oriented JSON: column names are sent once and each column's values
+    form one array, serialized in a single pass without per-row dicts.
+    """
+    body = {
+        **meta,
+        "columns": result.columns,
+        "data": result.values,
+        "row_count": result.row_count,
+        "truncated": result.truncated,
+        "elapsed_ms": result.elapsed_ms
+    }
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type=JSON_COLUMNS)
+
+
+def render_arrow(result: ChartResult, meta: dict) -> Response:
+    """
+    Arrow IPC stream of a single record batch. Response metadata travels as
+    schema metadata so the body stays pure Arrow.
+    """
+    names = [col["name"] for col in result.columns]
+    arrays = [_arrow_array(values, col["type"]) for values, col in zip(result.values, result.columns)]
+    metadata = {
+        "row_count": str(result.row_count),
+        "truncated": json.dumps(result.truncated),
+        "elapsed_ms": str(result.elapsed_ms),
+        **{key: json.dumps(value, default=str) for key, value in meta.items()}
+    }
+    table = pa.Table.from_arrays(arrays, names=names).replace_schema_metadata(metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM)
+
+
+def render_chart_result(result: ChartResult, fmt: str, meta: dict):
+    """
+    Render a chart result in a negotiated format. JSON records are returned as a
+    plain dict so the default response path is unchanged.
+    """
+    if fmt == JSON_COLUMNS:
+        return render_columns(result, meta)
+    if fmt == ARROW_STREAM:
+        return render_arrow(result, meta)
+    return {
+        **meta,
+        "columns": result.columns,
+        "rows": result.to_records(),
+        "row_count": result.row_count,
+        "truncated": result.truncated,
+        "elapsed_ms": result.elapsed_ms
+    }
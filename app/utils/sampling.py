@@ -0,0 +1,152 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from app.utils.sql_normalizer import tokenize
+
+# Only Postgres reads a sample without scanning the table: filtering on a random
+# number in MySQL or SQLite reads every row and would make sampling cost more
+SAMPLE_DIALECTS = ("postgresql",)
+# A fixed seed samples the same rows on every run while the table is unchanged,
+# so edits to a chart show the effect of the edit and not of a new sample
+SEED = 7
+
+# Words that can follow a table reference and are therefore not its alias
+_NOT_ALIAS = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "OUTER", "ON", "USING",
+    "GROUP", "ORDER", "HAVING", "LIMIT", "OFFSET", "FETCH", "UNION", "INTERSECT", "EXCEPT",
+    "WINDOW", "FOR", "TABLESAMPLE", "LATERAL", "ONLY", "WITH", "SELECT", "RETURNING"
+}
+# Clauses after which a query's rows are no longer the rows its aggregates read
+_AFTER_GROUPS = {"WINDOW", "ORDER", "LIMIT", "OFFSET", "FETCH", "FOR"}
+_SET_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT"}
+
+
+@dataclass
+class SampledQuery:
+    sql: str
+    # Counts the sampled rows that feed the result, in total and in its smallest group
+    count_sql: Optional[str]
+    table: str
+    method: str
+
+
+def _table_reference(tokens: list) -> Optional[tuple]:
+    """
+    Locate the first base table a query reads from: (first token, last name token,
+    last token of the reference including its alias, alias). Subqueries, CTE names
+    and table functions are skipped, and FROM inside function calls such as
+    EXTRACT(YEAR FROM ts) is not a table reference.
+    """
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind not in ("space", "comment")]
+
+    def text(n):
+        return tokens[significant[n]][1] if n < len(significant) else ""
+
+    def upper(n):
+        return text(n).upper() if n < len(significant) and tokens[significant[n]][0] == "ident" else None
+
+    def is_name(n):
+        return n < len(significant) and (
+            tokens[significant[n]][0] == "quoted" or (tokens[significant[n]][0] == "ident" and upper(n) not in _NOT_ALIAS)
+        )
+
+    ctes = {text(n).lower() for n in range(len(significant)) if is_name(n) and upper(n + 1) == "AS" and text(n + 2) == "("}
+    # Whether each open parenthesis holds a query, where FROM starts a table list
+    queries = [True]
+    for n in range(len(significant)):
+        if text(n) == "(":
+            queries.append(upper(n + 1) in ("SELECT", "WITH"))
+        elif text(n) == ")" and len(queries) > 1:
+            queries.pop()
+        elif upper(n) in ("FROM", "JOIN") and queries[-1] and upper(n - 1) != "DISTINCT" and is_name(n + 1):
+            end = n + 1
+            while text(end + 1) == "." and is_name(end + 2):
+                end += 2
+            if text(end + 1) == "(" or (end == n + 1 and text(end).lower() in ctes):
+                continue
+            last, alias = end, None
+            if upper(end + 1) == "AS" and is_name(end + 2):
+                last, alias = end + 2, text(end + 2)
+            elif is_name(end + 1):
+                last, alias = end + 1, text(end + 1)
+            return significant[n + 1], significant[end], significant[last], alias
+    return None
+
+
+def _count_query(tokens: list) -> Optional[str]:
+    """
+    Turn a query into one counting the rows its top-level SELECT reads after
+    joins and WHERE, per group when it has a GROUP BY: the select list is replaced
+    by COUNT(*) and ORDER BY, LIMIT and the like are dropped. Returns None for
+    set operations and queries without a top-level FROM.
+    """
+    depth = 0
+    select, start, end = None, None, len(tokens)
+    for i, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif kind == "ident" and depth == 0:
+            upper = text.upper()
+            if upper in _SET_OPERATIONS:
+                return None
+            if upper == "SELECT" and select is None:
+                select = i
+            elif upper == "FROM" and select is not None and start is None:
+                start = i
+            elif upper in _AFTER_GROUPS and start is not None:
+                end = i
+                break
+    if start is None:
+        return None
+    groups = "".join(text for _, text in tokens[:select + 1]) + " COUNT(*) AS n " + "".join(text for _, text in tokens[start:end])
+    return f"SELECT SUM(n) AS sampled_rows, MIN(n) AS smallest_group FROM ({groups.strip()}) AS sample_groups"
+
+
+def sample_query(dialect, sql: str, fraction: float, method: str = "SYSTEM") -> Optional[SampledQuery]:
+    """
+    Rewrite a chart query to read a random ``fraction`` of the rows of the first
+    table it reads from with Postgres TABLESAMPLE ``method`` (SYSTEM samples pages,
+    BERNOULLI rows), and build a query counting the sampled rows behind the
+    result. Returns None for other dialects and for queries without a base table.
+
+    Only one table is sampled, so joined dimension tables stay complete and counts
+    and sums scale by 1 / ``fraction``.
+    """
+    if dialect.name not in SAMPLE_DIALECTS:
+        return None
+    tokens = tokenize(sql.strip().rstrip(";"), dialect.name)
+    reference = _table_reference(tokens)
+    if reference is None:
+        return None
+    first, name_end, last, _ = reference
+    name = "".join(text for _, text in tokens[first:name_end + 1])
+
+    # TABLESAMPLE follows the alias
+    clause = f" TABLESAMPLE {method} ({fraction * 100:g}) REPEATABLE ({SEED})"
+    replacement = "".join(text for _, text in tokens[first:last + 1]) + clause
+    rewritten = tokens[:first] + [("sampled", replacement)] + tokens[last + 1:]
+    return SampledQuery(
+        sql="".join(text for _, text in rewritten),
+        # Line comments would swallow the text the count query adds after them
+        count_sql=_count_query([
+            ("space", "\n") if kind == "comment" and text.startswith("--") else (kind, text)
+            for kind, text in rewritten
+        ]),
+        table=name,
+        method=f"tablesample {method.lower()}"
+    )
+
+
+def sample_error(sampled_rows: int, fraction: float) -> Optional[float]:
+    """
+    Relative half-width of the 95% confidence interval of a count or sum over
+    ``sampled_rows``, for rows sampled independently with probability ``fraction``.
+    Pass the rows behind one value of the result, such as its smallest group.
+    Page sampling reads rows in clusters and has a larger error on clustered data.
+    """
+    if sampled_rows <= 0:
+        return None
+    return round(1.96 * math.sqrt((1 - fraction) / sampled_rows), 4)
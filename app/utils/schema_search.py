@@ -0,0 +1,168 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Optional
+from uuid import UUID
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SchemaSearchIndex:
+    """
+    In-memory search index over the tables and columns of one connection schema.
+
+    Every table name, column name, column type and the ``_``-separated tokens of
+    those names are stored as distinct lower-cased terms. Prefix lookups run a
+    binary search over the sorted terms and fuzzy lookups use a trigram inverted
+    index, so a query only ever touches the handful of terms it can match.
+    """
+
+    def __init__(self, schema_info: dict, digest: Optional[str] = None):
+        self.digest = digest
+        self.entries = []
+        postings = defaultdict(set)
+
+        for table in schema_info.get("tables", []):
+            table_entry = len(self.entries)
+            self.entries.append({
+                "kind": "table",
+                "schema": table.get("schema"),
+                "table": table["name"],
+                "column": None,
+                "type": None,
+            })
+            self._add_name(postings, table["name"], table_entry)
+
+            for column in table.get("columns", []):
+                column_entry = len(self.entries)
+                self.entries.append({
+                    "kind": "column",
+                    "schema": table.get("schema"),
+                    "table": table["name"],
+                    "column": column["name"],
+                    "type": column.get("type"),
+                })
+                self._add_name(postings, column["name"], column_entry)
+                if column.get("type"):
+                    postings[column["type"].lower()].add(column_entry)
+
+        self.postings = {term: sorted(entries) for term, entries in postings.items()}
+        self.terms = sorted(self.postings)
+        self.trigrams = defaultdict(list)
+        for term in self.terms:
+            for gram in _trigrams(term):
+                self.trigrams[gram].append(term)
+
+    @staticmethod
+    def _add_name(postings: dict, name: str, entry: int):
+        lowered = name.lower()
+        postings[lowered].add(entry)
+        for token in _TOKEN_SPLIT.split(lowered):
+            if token and token != lowered:
+                postings[token].add(entry)
+
+    def _prefix_terms(self, query: str):
+        start = bisect_left(self.terms, query)
+        for term in self.terms[start:]:
+            if not term.startswith(query):
+                break
+            yield term
+
+    def _fuzzy_terms(self, query: str, limit: int):
+        # Count overlap from the rarest trigrams first and stop once enough
+        # candidates were seen, so common grams like "_id" never get scanned
+        postings = sorted(
+            (self.trigrams[gram] for gram in _trigrams(query) if gram in self.trigrams),
+            key=len
+        )
+        overlap = Counter()
+        budget = max(limit * 200, 2000)
+        for terms in postings:
+            if budget <= 0:
+                break
+            overlap.update(terms[:budget])
+            budget -= len(terms)
+
+        candidates = [term for term, _ in overlap.most_common(limit * 10)]
+        scored = []
+        for term in candidates:
+            ratio = SequenceMatcher(None, query, term).ratio()
+            if ratio >= 0.6:
+                scored.append((term, ratio))
+        return scored
+
+    def search(self, query: str, limit: int = 20, fuzzy: bool = True) -> list:
+        """
+        Search tables and columns by name or type.
+        Exact and prefix matches are ranked ahead of fuzzy matches.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        scores = {}
+        wanted = limit * 10
+
+        def collect(term: str, score: float, match: str):
+            for entry in self.postings[term][:wanted]:
+                if scores.get(entry, (0,))[0] < score:
+                    scores[entry] = (score, match)
+
+        for term in self._prefix_terms(query):
+            collect(term, 2.0 if term == query else 1.0 + len(query) / len(term) / 2, "prefix")
+            if len(scores) >= wanted:
+                break
+
+        if fuzzy and len(scores) < limit:
+            for term, ratio in self._fuzzy_terms(query, limit):
+                collect(term, ratio, "fuzzy")
+
+        ranked = heapq.nsmallest(
+            limit,
+            scores.items(),
+            key=lambda item: (-item[1][0], self.entries[item[0]]["kind"] != "table", item[0])
+        )
+
+        return [
+            {**self.entries[entry], "score": round(score, 3), "match": match}
+            for entry, (score, match) in ranked
+        ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def update_schema_index(connection_id: UUID, schema_info: dict, digest: Optional[str] = None) -> SchemaSearchIndex:
+    """
+    Build (or rebuild) the search index for a connection after its schema was introspected.
+    """
+    index = SchemaSearchIndex(schema_info, digest)
+    with _indexes_lock:
+        _indexes[connection_id] = index
+    return index
+
+
+def get_schema_index(connection_id: UUID, digest: Optional[str] = None) -> Optional[SchemaSearchIndex]:
+    """
+    Return the cached index for a connection, or None if it is missing or was built
+    from a different version of the schema.
+    """
+    with _indexes_lock:
+        index = _indexes.get(connection_id)
+    if index is None or (digest is not None and index.digest != digest):
+        return None
+    return index
+
+
+def drop_schema_index(connection_id: UUID):
+    with _indexes_lock:
+        _indexes.pop(connection_id, None)
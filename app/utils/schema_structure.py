@@ -1,46 +1,190 @@
-from sqlalchemy import create_engine, inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
 # from sqlalchemy.orm import sessionmaker
 # from app.models.pre_processing import ExternalDBModel
-from datetime import datetime, timedelta
-from app.utils.crypt import decrypt_string
+from app.core.settings import settings
+from app.utils.cancellation import CancellationToken, OperationCancelled
+from app.utils.column_profiler import DateColumn, is_date_type, profile_date_columns
+from app.utils.external_db import get_external_engine, connection_key
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SCHEMAS = {
+    "information_schema", "pg_catalog", "pg_toast",
+    "mysql", "performance_schema", "sys",
+}
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def resolve_schemas(
+    bind: Connection,
+    include_schemas: Optional[List[str]] = None,
+    exclude_schemas: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Work out which schemas to reflect.
+
+    Explicit lists win over SCHEMA_INCLUDE/SCHEMA_EXCLUDE. With no include list only
+    the default schema is reflected; "*" selects every non-system schema.
+    """
+    inspector = inspect(bind)
+    default_schema = inspector.default_schema_name
+    include = include_schemas if include_schemas is not None else _split(settings.SCHEMA_INCLUDE)
+    exclude = set(exclude_schemas if exclude_schemas is not None else _split(settings.SCHEMA_EXCLUDE))
+
+    if not include:
+        schemas = [default_schema]
+    elif "*" in include:
+        schemas = [
+            schema for schema in inspector.get_schema_names()
+            if schema not in SYSTEM_SCHEMAS and not schema.startswith(("pg_temp_", "pg_toast_temp_"))
+        ]
+    else:
+        available = set(inspector.get_schema_names())
+        schemas = [schema for schema in include if schema in available]
+
+    return [schema for schema in schemas if schema not in exclude]
+
+
+def _reflect_schema(engine: Engine, schema: str, default_schema: str, token: CancellationToken):
+    started = time.perf_counter()
+    schema_arg = None if schema == default_schema else schema
 
-def get_schema_structure(connection_string: str, db_type: str):
-    engine = create_engine(connection_string)
-    inspector = inspect(engine)
+    with engine.connect() as connection, token.track(connection):
+        # Inspectors cache per instance and are not shared between threads
+        inspector = inspect(connection)
+        columns_by_table = inspector.get_multi_columns(schema=schema_arg)
+        token.raise_if_cancelled()
+        pks_by_table = inspector.get_multi_pk_constraint(schema=schema_arg)
+        token.raise_if_cancelled()
+        fks_by_table = inspector.get_multi_foreign_keys(schema=schema_arg)
+        token.raise_if_cancelled()
+        indexes_by_table = inspector.get_multi_indexes(schema=schema_arg)
 
-    schema_info = {"tables": []}
-    # max_date = datetime.now().date()
-    # min_date = max_date - timedelta(days=183) 
-    min_date= datetime.fromisoformat("2003-01-06")
-    max_date= datetime.fromisoformat("2005-06-11")
+    tables = []
+    date_columns = []
+    for key in sorted(columns_by_table, key=lambda k: k[1]):
+        table_name = key[1]
+        columns = columns_by_table[key]
+        primary_keys = pks_by_table.get(key) or {"constrained_columns": [], "name": None}
+        foreign_keys = [
+            {"column": fk["constrained_columns"][0], "references": fk["referred_table"]}
+            for fk in fks_by_table.get(key, [])
+        ]
+        leading_index_columns = {
+            index["column_names"][0]
+            for index in indexes_by_table.get(key, [])
+            if index.get("column_names") and index["column_names"][0]
+        }
+        pk_columns = primary_keys.get("constrained_columns") or []
+        if pk_columns:
+            leading_index_columns.add(pk_columns[0])
+
+        tables.append({
+            "name": table_name,
+            "schema": schema,
+            "columns": [
+                {"name": col["name"], "type": str(col["type"])}
+                for col in columns
+            ],
+            "primary_keys": primary_keys,
+            "foreign_keys": foreign_keys
+        })
+
+        for col in columns:
+            if is_date_type(col["type"]):
+                date_columns.append(DateColumn(
+                    table=table_name,
+                    column=col["name"],
+                    schema=schema_arg,
+                    indexed=col["name"] in leading_index_columns,
+                    primary_keys=pk_columns
+                ))
+
+    return tables, date_columns, time.perf_counter() - started
+
+
+def get_schema_structure(
+    connection_string: str,
+    db_type: str,
+    include_schemas: Optional[List[str]] = None,
+    exclude_schemas: Optional[List[str]] = None,
+    token: Optional[CancellationToken] = None
+):
+    """
+    Reflect tables, columns and keys and profile date ranges of an external database.
+
+    Every statement runs under the engine's connect/statement timeouts and the whole
+    call stops cooperatively once the token is cancelled or its deadline passes.
+    Whatever could not be reflected or profiled is listed under "incomplete" and
+    "complete" is False; missing values are never replaced with defaults.
+    """
+    token = token or CancellationToken(settings.INTROSPECTION_DEADLINE_SECONDS)
+    engine = get_external_engine(connection_string)
+
+    schema_info = {"tables": [], "schema_timings": {}, "complete": True, "incomplete": []}
+
+    def reflect(schema: str):
+        try:
+            token.raise_if_cancelled()
+            return _reflect_schema(engine, schema, default_schema, token), None
+        except OperationCancelled as e:
+            return None, f"cancelled: {e}"
+        except Exception as e:
+            if token.cancelled:
+                return None, f"cancelled: {token.reason}"
+            return None, str(e)
 
     try:
-        with engine.connect() as connection:
-            for table_name in inspector.get_table_names():
-                columns = inspector.get_columns(table_name)
-                primary_keys = inspector.get_pk_constraint(table_name)
-                foreign_keys = [
-                    {"column": fk["constrained_columns"][0], "references": fk["referred_table"]}
-                    for fk in inspector.get_foreign_keys(table_name)
-                ]
-
-                schema_info["tables"].append({
-                    "name": table_name,
-                    "columns": [
-                        {"name": col["name"], "type": str(col["type"])}
-                        for col in columns
-                    ],
-                    "primary_keys": primary_keys,
-                    "foreign_keys": foreign_keys
-                })
-
-        schema_info["min_date"] = min_date.isoformat()
-        schema_info["max_date"] = max_date.isoformat()
-        print(f"Database Date Range: Min Date: {min_date}, Max Date: {max_date}")
+        with engine.connect() as connection, token.track(connection):
+            inspector = inspect(connection)
+            default_schema = inspector.default_schema_name
+            schemas = resolve_schemas(connection, include_schemas, exclude_schemas)
+
+        date_columns = []
+        workers = max(1, min(settings.SCHEMA_REFLECTION_WORKERS, len(schemas)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for schema, (reflected, error) in zip(schemas, pool.map(reflect, schemas)):
+                if error is not None:
+                    schema_info["incomplete"].append({"schema": schema, "error": error})
+                    logger.warning("Could not reflect schema %s: %s", schema, error)
+                    continue
+                tables, schema_date_columns, elapsed = reflected
+                schema_info["tables"].extend(tables)
+                schema_info["schema_timings"][schema] = round(elapsed, 3)
+                date_columns.extend(schema_date_columns)
+                logger.info("Reflected schema %s: %d tables in %.3fs", schema, len(tables), elapsed)
+
+        profiles, profile_errors = profile_date_columns(engine, connection_key(connection_string), date_columns, token)
+        schema_info["incomplete"].extend(profile_errors)
+
+        for table_info in schema_info["tables"]:
+            schema_arg = None if table_info["schema"] == default_schema else table_info["schema"]
+            for col in table_info["columns"]:
+                profile = profiles.get((schema_arg, table_info["name"], col["name"]))
+                if profile:
+                    col.update(profile)
+
+        min_dates = [p["min_date"] for p in profiles.values() if p["min_date"] is not None]
+        max_dates = [p["max_date"] for p in profiles.values() if p["max_date"] is not None]
+        schema_info["min_date"] = min(min_dates) if min_dates else None
+        schema_info["max_date"] = max(max_dates) if max_dates else None
+        print(f"Database Date Range: Min Date: {schema_info['min_date']}, Max Date: {schema_info['max_date']}")
 
     except Exception as e:
-        print(f"Error fetching schema information: {e}. Returning schema info with default date range.")
-        schema_info["min_date"] = None
-        schema_info["max_date"] = None
+        error = f"cancelled: {token.reason}" if token.cancelled else str(e)
+        print(f"Error fetching schema information: {error}. Returning partial schema info.")
+        schema_info["incomplete"].append({"error": error})
+        schema_info.setdefault("min_date", None)
+        schema_info.setdefault("max_date", None)
 
-    return schema_info
\ No newline at end of file
+    schema_info["complete"] = not schema_info["incomplete"]
+    return schema_info
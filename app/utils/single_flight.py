@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request
+
+from app.utils.cancellation import OperationCancelled
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller starts the work as a task; callers arriving while it runs
+    wait for the same task and receive its result or exception. The task is
+    cancelled only once every waiter has gone (cancelled or disconnected).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable],
+        request: Optional[Request] = None,
+        poll_interval: float = 0.5
+    ):
+        """
+        Return (result, shared); ``shared`` is True when this caller joined an
+        execution started by another one.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({call.task}, timeout=poll_interval if request is not None else None)
+                if done:
+                    return call.task.result(), shared
+                if await request.is_disconnected():
+                    raise OperationCancelled("client disconnected")
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "executions_saved": self.coalesced,
+            "in_flight": len(self._calls)
+        }
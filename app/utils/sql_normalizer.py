@@ -0,0 +1,177 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
+
+from sqlalchemy.dialects.mysql.reserved_words import RESERVED_WORDS_MYSQL
+from sqlalchemy.dialects.postgresql.base import RESERVED_WORDS as RESERVED_WORDS_POSTGRES
+from sqlalchemy.sql.compiler import RESERVED_WORDS
+
+# One alternative per token class; order matters (casts before binds, strings
+# with a prefix before identifiers). Plain strings are matched with and without
+# backslash escapes, which MySQL applies to every string and Postgres to E'' only.
+_TOKEN_PATTERN = r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>[Ee]'(?:[^'\\]|\\.|'')*'|(?:[NnBbXx]|[Uu]&)?'{body}')
+  | (?P<dollar>\$(?P<tag>[A-Za-z_]\w*)?\$.*?\$(?P=tag)?\$)
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<cast>::)
+  | (?P<operator><=|>=|<>|!=|\|\||->>|->)
+  | (?P<bind>(?<!:):[A-Za-z_]\w*|%\(\w+\)s|\$\d+|\?)
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?(?![\w$]))
+  | (?P<ident>[A-Za-z_][\w$]*)
+  | (?P<other>.)
+"""
+_TOKENS = {
+    False: re.compile(_TOKEN_PATTERN.format(body=r"(?:[^']|'')*"), re.VERBOSE | re.DOTALL),
+    True: re.compile(_TOKEN_PATTERN.format(body=r"(?:[^'\\]|\\.|'')*"), re.VERBOSE | re.DOTALL),
+}
+
+# Literals after these keywords are part of a typed literal and must stay inline
+_TYPE_PREFIXES = {"INTERVAL", "DATE", "TIME", "TIMESTAMP", "TIMESTAMPTZ"}
+# Only literals in filter predicates are lifted. Elsewhere a bind could change
+# the query: numbers after ORDER BY, GROUP BY, LIMIT and OFFSET are positions or
+# row counts, and an expression in the select list must match the same one in
+# GROUP BY, which two separate binds would not on drivers that bind server-side.
+_VALUE_CLAUSES = {"WHERE", "HAVING", "ON"}
+_CLAUSES = _VALUE_CLAUSES | {
+    "SELECT", "FROM", "JOIN", "GROUP", "ORDER", "LIMIT", "OFFSET", "FETCH", "TOP",
+    "UNION", "INTERSECT", "EXCEPT", "WINDOW", "VALUES", "SET", "RETURNING", "USING"
+}
+_LIST_OF_VALUES = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+# Keywords the reserved word lists leave out because they may also name columns:
+# date and time parts, type names and the words of common clauses
+_NON_RESERVED_KEYWORDS = {
+    "century", "decade", "year", "years", "quarter", "month", "months", "week", "weeks", "day", "days",
+    "hour", "hours", "minute", "minutes", "second", "seconds", "millisecond", "milliseconds",
+    "microsecond", "microseconds", "epoch", "dow", "doy", "isodow", "isoyear", "timezone",
+    "year_month", "day_hour", "day_minute", "day_second", "hour_minute", "hour_second", "minute_second",
+    "at", "time", "zone", "date", "timestamp", "timestamptz", "interval", "with", "without",
+    "escape", "filter", "within", "over", "partition", "rows", "range", "groups", "preceding", "following",
+    "unbounded", "current", "row", "nulls", "first", "last", "next", "ties", "only", "no", "materialized",
+    "recursive", "tablesample", "repeatable", "bernoulli", "system", "lateral", "ordinality",
+    "boolean", "bool", "integer", "int", "bigint", "smallint", "numeric", "decimal", "real", "double",
+    "precision", "float", "text", "varchar", "char", "character", "varying", "json", "jsonb", "uuid",
+}
+# Lowercased in the shape. Other unquoted names keep their case: MySQL compares
+# table names case-sensitively on most platforms, so Users and users may differ.
+_KEYWORDS = frozenset(RESERVED_WORDS | RESERVED_WORDS_POSTGRES | RESERVED_WORDS_MYSQL | _NON_RESERVED_KEYWORDS)
+
+
+@dataclass(frozen=True)
+class NormalizedQuery:
+    """
+    ``sql`` is the original text with its value literals replaced by binds named
+    in ``params``; ``shape`` is the canonical form with every value as ``?``, and
+    ``fingerprint`` identifies the shape. Treat ``params`` as read-only; results
+    are memoized.
+    """
+    sql: str
+    params: dict
+    shape: str
+    fingerprint: str
+
+
+def tokenize(sql: str, dialect: str = "") -> list:
+    """
+    Split ``sql`` into (kind, text) tokens, whitespace and comments included, so
+    joining the texts gives back ``sql``. Kinds are the groups of the token pattern.
+    """
+    return [(match.lastgroup, match.group()) for match in _TOKENS[dialect in ("mysql", "mariadb")].finditer(sql)]
+
+
+def is_single_statement(sql: str, dialect: str = "") -> bool:
+    """
+    Whether ``sql`` holds one statement: a semicolon outside strings, quoted
+    names and comments may only end it. A second statement could end a read-only
+    transaction with COMMIT and then run outside of it.
+    """
+    significant = [text for kind, text in tokenize(sql, dialect) if kind not in ("space", "comment")]
+    return ";" not in significant[:-1]
+
+
+def _literal_value(kind: str, text: str):
+    if kind == "string":
+        return text[1:-1].replace("''", "'")
+    if re.fullmatch(r"\d+", text):
+        return int(text)
+    # Decimal keeps numeric comparisons exact where a float would not
+    return Decimal(text)
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql: str, dialect: str = "") -> NormalizedQuery:
+    """
+    Canonicalize a chart query and lift its value literals into bind parameters.
+
+    Whitespace, comments, the case of keywords and function names and a trailing
+    semicolon do not change the shape, and neither do the values of lifted literals
+    or the length of a literal IN list. Literals are lifted from WHERE, HAVING and ON only, and stay inline
+    where a bind would change the meaning: typed literals (``INTERVAL '1 day'``,
+    ``DATE '2024-01-01'``), literals cast with ``::``, prefixed strings (``E'...'``)
+    and strings with backslash escapes on MySQL.
+    """
+    backslashes = dialect in ("mysql", "mariadb")
+    tokens = tokenize(sql, dialect)
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind not in ("space", "comment")]
+    taken = {text[1:] for kind, text in tokens if kind == "bind"}
+
+    pieces, shape, params = [], [], {}
+    clauses = [None]
+    previous = None
+    position = {index: n for n, index in enumerate(significant)}
+    for i, (kind, text) in enumerate(tokens):
+        if kind in ("space", "comment"):
+            pieces.append(text)
+            continue
+
+        following = significant[position[i] + 1] if position[i] + 1 < len(significant) else None
+        next_kind = tokens[following][0] if following is not None else None
+        upper = text.upper() if kind == "ident" else None
+
+        lift = kind in ("string", "number") and clauses[-1] in _VALUE_CLAUSES and not (
+            previous in _TYPE_PREFIXES
+            or next_kind == "cast"
+            or (kind == "string" and (not text.startswith("'") or (backslashes and "\\" in text)))
+        )
+
+        if lift:
+            name = f"lit_{len(params) + 1}"
+            while name in taken:
+                name = "_" + name
+            params[name] = _literal_value(kind, text)
+            pieces.append(f":{name}")
+            shape.append("?")
+        else:
+            pieces.append(text)
+            if kind in ("string", "number", "dollar"):
+                shape.append(text)
+            elif kind == "ident":
+                # Function names are case-insensitive everywhere
+                calls = following is not None and tokens[following][1] == "("
+                shape.append(text.lower() if calls or text.lower() in _KEYWORDS else text)
+            elif text != ";" or following is not None:
+                shape.append(text)
+
+        if text == "(":
+            # A parenthesized expression belongs to the clause around it until a keyword says otherwise
+            clauses.append(clauses[-1])
+        elif text == ")" and len(clauses) > 1:
+            clauses.pop()
+        elif upper in _CLAUSES:
+            clauses[-1] = upper
+        previous = upper if kind == "ident" else text
+
+    canonical = _LIST_OF_VALUES.sub("(?+)", " ".join(shape))
+    return NormalizedQuery(
+        sql="".join(pieces).strip().rstrip(";").rstrip(),
+        params=params,
+        shape=canonical,
+        fingerprint=hashlib.sha256(canonical.encode()).hexdigest()[:16]
+    )
+
+
+def query_fingerprint(sql: str) -> str:
+    return normalize_sql(sql).fingerprint
@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import Optional
+
+from app.utils.sql_normalizer import tokenize
+
+# Clauses that end a top-level WHERE condition
+_AFTER_WHERE = {"GROUP", "HAVING", "WINDOW", "QUALIFY", "ORDER", "LIMIT", "OFFSET", "FETCH", "FOR"}
+_SET_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT"}
+# Select-list modifiers that leave the columns after them as they are
+_SELECT_MODIFIERS = {"DISTINCT", "ALL"}
+
+
+def time_params(time_from: Optional[datetime], time_to: Optional[datetime]) -> dict:
+    params = {}
+    if time_from is not None:
+        params["time_from"] = time_from
+    if time_to is not None:
+        params["time_to"] = time_to
+    return params
+
+
+def _predicate(column: str, params: dict) -> str:
+    # The range is half-open, so adjacent ranges never count a row twice
+    bounds = []
+    if "time_from" in params:
+        bounds.append(f"{column} >= :time_from")
+    if "time_to" in params:
+        bounds.append(f"{column} < :time_to")
+    return " AND ".join(bounds)
+
+
+def valid_column(column: str) -> bool:
+    """
+    Whether a chart's time column is a plain, optionally qualified and quoted,
+    column name and so safe to put into its query.
+    """
+    tokens = [(kind, text) for kind, text in tokenize(column) if kind != "space"]
+    if not tokens or len(tokens) % 2 == 0:
+        return False
+    return all(
+        kind in ("ident", "quoted") if i % 2 == 0 else text == "."
+        for i, (kind, text) in enumerate(tokens)
+    )
+
+
+def _name(kind: str, text: str) -> str:
+    # Unquoted names are compared case-insensitively, as the databases fold them
+    return text[1:-1] if kind == "quoted" else text.lower()
+
+
+def _column_reference(item: list) -> Optional[tuple]:
+    """
+    (column, output name) for a select-list item that is a plain column reference,
+    optionally aliased, or None for any expression.
+    """
+    alias = None
+    if len(item) >= 2 and item[-1][0] in ("ident", "quoted") and item[-2][1].upper() == "AS":
+        alias, item = item[-1], item[:-2]
+    elif len(item) >= 2 and item[-1][0] in ("ident", "quoted") and item[-2][0] in ("ident", "quoted"):
+        alias, item = item[-1], item[:-1]
+    column = "".join(text for _, text in item)
+    if not item or not valid_column(column):
+        return None
+    return column, _name(*(alias or item[-1]))
+
+
+def infer_time_column(sql: str, output_column: str, dialect: str = "") -> Optional[str]:
+    """
+    The column a query's ``output_column`` is selected from when its top-level
+    select list takes it unchanged, e.g. ``o.created_at`` for ``SELECT o.created_at
+    AS day ...``. Filtering that column in WHERE keeps the same rows as filtering
+    the output, so it can be pushed down. Returns None when the output column is
+    computed, and for queries with window functions, whose results depend on the
+    rows a WHERE would remove.
+    """
+    tokens = [(kind, text) for kind, text in tokenize(sql, dialect) if kind not in ("space", "comment")]
+    if any(kind == "ident" and text.upper() == "OVER" for kind, text in tokens):
+        return None
+    depth, start, end = 0, None, None
+    for i, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif kind == "ident" and depth == 0:
+            upper = text.upper()
+            if upper == "SELECT" and start is None:
+                start = i + 1
+            elif upper == "FROM" and start is not None:
+                end = i
+                break
+    if start is None or end is None:
+        return None
+    while start < end and tokens[start][1].upper() in _SELECT_MODIFIERS:
+        start += 1
+    items, item, depth = [], [], 0
+    for kind, text in tokens[start:end]:
+        depth += (text == "(") - (text == ")")
+        if text == "," and depth == 0:
+            items.append(item)
+            item = []
+        else:
+            item.append((kind, text))
+    items.append(item)
+    wanted = output_column.lower()
+    for item in items:
+        reference = _column_reference(item)
+        if reference is not None and reference[1].lower() == wanted:
+            return reference[0]
+    return None
+
+
+def inject_time_filter(sql: str, column: str, params: dict, dialect: str = "") -> Optional[str]:
+    """
+    Add a range predicate on ``column`` to the top-level WHERE of a query, or add
+    a WHERE clause when it has none, so the database can use the column's indexes
+    and partitions. The existing condition is parenthesized to keep its meaning.
+    Returns None for queries without a top-level FROM or with a top-level UNION,
+    INTERSECT or EXCEPT.
+    """
+    # Line comments would swallow the text added after them
+    tokens = [
+        ("space", "\n") if kind == "comment" and text.startswith("--") else (kind, text)
+        for kind, text in tokenize(sql.strip().rstrip(";"), dialect)
+    ]
+    depth = 0
+    where, end, has_from = None, None, False
+    for i, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif kind == "ident" and depth == 0:
+            upper = text.upper()
+            if upper in _SET_OPERATIONS:
+                return None
+            if upper == "FROM":
+                has_from = True
+            elif upper == "WHERE":
+                where = i
+            elif upper in _AFTER_WHERE and has_from and end is None:
+                end = i
+    if not has_from:
+        return None
+    texts = [text for _, text in tokens]
+    predicate = _predicate(column, params)
+    end = len(texts) if end is None else end
+    if where is not None and where < end:
+        rest = "".join(texts[where + 1:end]).strip()
+        texts[where + 1:end] = [f" {predicate} AND ({rest}) "]
+    else:
+        texts.insert(end, f" WHERE {predicate} ")
+    return "".join(texts).strip()
+
+
+def wrap_time_filter(sql: str, column: str, params: dict, quote) -> str:
+    """
+    Filter the output of a query on its time column; Postgres pushes the
+    predicate into the query when the column is not computed by an aggregate.
+    """
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS src WHERE {_predicate('src.' + quote(column), params)}"
@@ -0,0 +1,13 @@
+import os
+
+# The utilities read app.core.settings on import; tests only need values, not services
+for name, value in {
+    "DB_URI": "sqlite://",
+    "SECRET_KEY": "test-secret",
+    "REFRESH_SECRET_KEY": "test-refresh-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "ENCRYPTION_KEY": "LPIp4x5hry7BpCm3vDWdHpDnCJh8DjOpnPTPWTy68IQ=",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from app.utils.cancellation import CancellationToken, OperationCancelled
+
+
+def test_cancel_calls_the_cancellers_of_running_blocks():
+    token = CancellationToken()
+    calls = []
+    with token.watch(lambda: calls.append("cancelled")):
+        token.cancel("stop")
+        with pytest.raises(OperationCancelled, match="stop"):
+            token.raise_if_cancelled()
+    assert calls == ["cancelled"]
+
+
+def test_cancellers_of_ended_blocks_are_not_called():
+    token = CancellationToken()
+    calls = []
+    with token.watch(lambda: calls.append("cancelled")):
+        pass
+    token.cancel()
+    assert calls == []
+
+
+def test_a_block_does_not_end_while_its_canceller_runs():
+    token = CancellationToken()
+    entered, started, release = threading.Event(), threading.Event(), threading.Event()
+    events = []
+
+    def canceller():
+        started.set()
+        release.wait(5)
+        events.append("canceller done")
+
+    def block():
+        with token.watch(canceller):
+            entered.set()
+            started.wait(5)
+        events.append("block ended")
+
+    worker = threading.Thread(target=block)
+    worker.start()
+    entered.wait(5)
+    cancelling = threading.Thread(target=token.cancel)
+    cancelling.start()
+    started.wait(5)
+    worker.join(0.2)
+    assert worker.is_alive()
+    release.set()
+    worker.join(5)
+    cancelling.join(5)
+    assert events == ["canceller done", "block ended"]
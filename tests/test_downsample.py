@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.utils.downsample import (
+    SeriesColumns, bucket_query, chunk_reducer, downsample_result, lttb_indices, minmax_indices, series_columns
+)
+from app.utils.query_engine import build_result
+
+START = datetime(2024, 1, 1)
+
+
+def _series(n, keys=None):
+    rows = []
+    for i in range(n):
+        value = 100.0 if i == n // 3 else float(i % 7)
+        row = (START + timedelta(minutes=i), value)
+        rows.append(row if keys is None else row + (keys[i % len(keys)],))
+    names = ["t", "v"] if keys is None else ["t", "v", "region"]
+    return names, rows, build_result(names, rows, len(rows), time.perf_counter())
+
+
+def test_series_columns_split_time_values_and_keys():
+    _, _, result = _series(10, keys=["eu", "us"])
+    assert series_columns(result) == SeriesColumns(time="t", values=["v"], keys=["region"])
+
+
+def test_series_columns_parse_timestamps_returned_as_text():
+    result = build_result(["t", "v"], [("2024-01-01 00:00:00", 1), ("2024-01-01 00:01:00", 2)], 10, time.perf_counter())
+    assert series_columns(result).time == "t"
+
+
+def test_results_without_a_time_axis_are_not_series():
+    result = build_result(["region", "total"], [("eu", 1), ("us", 2)], 10, time.perf_counter())
+    assert series_columns(result) is None
+    assert downsample_result(result, 10) is result
+
+
+def test_lttb_keeps_the_ends_and_the_spike():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[500] = 10
+    picked = lttb_indices(x, y, 50)
+    assert len(picked) <= 50
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 500 in picked
+
+
+def test_lttb_leaves_short_series_alone():
+    x = np.arange(10, dtype=np.float64)
+    assert list(lttb_indices(x, x, 20)) == list(range(10))
+
+
+def test_minmax_keeps_each_bucket_extremes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 10)
+    y[123] = 5
+    y[876] = -5
+    picked = minmax_indices(x, y, 20)
+    assert len(picked) <= 2 * 20 + 2
+    assert {0, 123, 876, 999} <= set(picked)
+
+
+def test_downsampling_returns_only_source_rows():
+    _, _, result = _series(5000)
+    reduced = downsample_result(result, 100, "lttb")
+    assert reduced.row_count <= 100
+    source = set(map(tuple, zip(*result.values)))
+    assert set(map(tuple, zip(*reduced.values))) <= source
+    assert reduced.meta["downsampled"] == {"method": "lttb", "width": 100, "source_rows": 5000, "pushdown": False}
+
+
+def test_each_series_is_downsampled_on_its_own():
+    _, _, result = _series(6000, keys=["eu", "us", "apac"])
+    reduced = downsample_result(result, 50, "minmax")
+    regions = reduced.values[2]
+    for region in ("eu", "us", "apac"):
+        assert 0 < regions.count(region) <= 50 + 2
+    times = reduced.values[0]
+    assert times == sorted(times)
+
+
+def test_chunk_reducer_keeps_a_bounded_number_of_rows():
+    names, rows, _ = _series(20000)
+    reduce = chunk_reducer(100)
+    kept = reduce(names, rows)
+    assert len(kept) <= 100 * 4 * 2 + 2
+    assert set(kept) <= set(rows)
+    assert max(rows, key=lambda row: row[1]) in kept
+
+
+def test_bucket_query_ranks_whole_rows_per_bucket():
+    columns = SeriesColumns(time="t", values=["v"], keys=["region"])
+    sql = bucket_query(postgresql.dialect(), "SELECT t, v, region FROM m;", columns, ["t", "v", "region"], 100)
+    assert sql.startswith("WITH src AS (SELECT t, v, region FROM m)")
+    assert "width_bucket(" in sql
+    assert "PARTITION BY bucket__, region" in sql
+    assert "lo_0__ = 1 OR hi_0__ = 1" in sql
+    assert sql.endswith("ORDER BY 1")
+
+
+def test_bucket_query_is_not_built_for_other_dialects():
+    columns = SeriesColumns(time="t", values=["v"], keys=[])
+    assert bucket_query(sqlite.dialect(), "SELECT t, v FROM m", columns, ["t", "v"], 100) is None
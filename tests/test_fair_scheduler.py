@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.utils.fair_scheduler import FairScheduler, SchedulerRejected
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class _Holders:
+    """Tasks that take a slot and hold it until released, recording the grant order."""
+
+    def __init__(self, scheduler: FairScheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.events = {}
+        self.tasks = []
+
+    async def start(self, project_id, tag):
+        self.events[tag] = asyncio.Event()
+
+        async def hold():
+            async with self.scheduler.slot(project_id):
+                self.order.append(tag)
+                await self.events[tag].wait()
+
+        self.tasks.append(asyncio.ensure_future(hold()))
+        await _settle()
+
+    async def release(self, tag):
+        self.events[tag].set()
+        await _settle()
+
+    async def finish(self):
+        for event in self.events.values():
+            event.set()
+        await asyncio.gather(*self.tasks)
+
+
+@pytest.mark.parametrize("weight", [0, -1, float("nan"), float("inf"), "2"])
+def test_weights_must_be_positive_numbers(weight):
+    with pytest.raises(ValueError):
+        FairScheduler(slots=1, max_queued=1, wait_slo=1, weights={"project": weight})
+
+
+def test_free_slots_are_granted_at_once():
+    async def main():
+        scheduler = FairScheduler(slots=2, max_queued=1, wait_slo=1)
+        async with scheduler.slot("a"):
+            async with scheduler.slot("a"):
+                assert scheduler.saturated
+                assert scheduler.stats("a")["running"] == 2
+        assert scheduler.in_use == 0
+        return scheduler.stats("a")
+
+    stats = asyncio.run(main())
+    assert stats["admitted"] == 2
+    assert stats["slo_attainment"] == 1.0
+
+
+def test_a_freed_slot_goes_to_the_project_with_fewest_running_queries():
+    async def main():
+        holders = _Holders(FairScheduler(slots=2, max_queued=10, wait_slo=5))
+        for tag in ("a1", "a2", "a3", "a4"):
+            await holders.start("a", tag)
+        await holders.start("b", "b1")
+        assert holders.order == ["a1", "a2"]
+        await holders.release("a1")
+        assert holders.order == ["a1", "a2", "b1"]
+        await holders.release("b1")
+        assert holders.order == ["a1", "a2", "b1", "a3"]
+        await holders.finish()
+        return holders.order
+
+    assert asyncio.run(main()) == ["a1", "a2", "b1", "a3", "a4"]
+
+
+def test_a_full_project_queue_is_rejected():
+    async def main():
+        scheduler = FairScheduler(slots=1, max_queued=1, wait_slo=5)
+        holders = _Holders(scheduler)
+        await holders.start("a", "running")
+        await holders.start("a", "queued")
+        with pytest.raises(SchedulerRejected):
+            async with scheduler.slot("a"):
+                pass
+        await holders.finish()
+        return scheduler.stats("a")
+
+    stats = asyncio.run(main())
+    assert stats["rejected_queue_full"] == 1
+    assert stats["admitted"] == 2
+
+
+def test_waits_are_bounded_by_the_timeout():
+    async def main():
+        scheduler = FairScheduler(slots=1, max_queued=5, wait_slo=5)
+        holders = _Holders(scheduler)
+        await holders.start("a", "running")
+        with pytest.raises(SchedulerRejected):
+            async with scheduler.slot("b", timeout=0.01):
+                pass
+        stats = scheduler.stats("b")
+        assert stats["queued"] == 0
+        await holders.finish()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["rejected_wait_slo"] == 1
+    assert stats["slo_attainment"] == 0.0
@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, text
+
+from app.utils.incremental import SeriesState, incremental_query, new_series_state
+from app.utils.query_engine import build_result
+
+START = datetime(2024, 1, 1)
+
+
+def _result(minutes, value=1.0, names=("t", "v")):
+    rows = [(START + timedelta(minutes=m), value) for m in minutes]
+    return build_result(list(names), rows, 1000, time.perf_counter())
+
+
+def test_only_time_series_get_a_state():
+    assert new_series_state(build_result(["region", "n"], [("eu", 1)], 10, time.perf_counter())) is None
+    assert new_series_state(_result(range(3))).time_column == "t"
+
+
+def test_window_starts_an_overlap_before_the_last_time():
+    state = new_series_state(_result([0, 5, 2]))
+    assert state.window_start(60) == START + timedelta(minutes=4)
+
+
+def test_window_start_keeps_a_utc_offset():
+    result = build_result(["t", "v"], [("2024-01-01T10:00:00+02:00", 1)], 10, time.perf_counter())
+    state = new_series_state(result)
+    assert state.window_start(0) == datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=2)))
+
+
+def test_empty_series_have_no_window():
+    assert SeriesState(result=_result([]), time_column="t").window_start(60) is None
+
+
+def test_merge_replaces_the_overlap_with_fresh_rows():
+    state = new_series_state(_result(range(10), value=1.0))
+    since = START + timedelta(minutes=8)
+    merged = state.merge(_result([8, 9, 10, 11], value=2.0), since, 1000)
+    assert merged.result.row_count == 12
+    assert merged.result.values[1] == [1.0] * 8 + [2.0] * 4
+    assert merged.result.values[0] == sorted(merged.result.values[0])
+    assert merged.result.meta["new_rows"] == 4
+    assert merged.built_at == state.built_at
+
+
+def test_merge_keeps_the_newest_rows():
+    state = new_series_state(_result(range(10)))
+    merged = state.merge(_result([10, 11]), START + timedelta(minutes=10), 5)
+    assert merged.result.row_count == 5
+    assert merged.result.values[0][0] == (START + timedelta(minutes=7)).isoformat()
+    assert merged.result.truncated
+
+
+def test_merge_gives_up_when_the_columns_change():
+    state = new_series_state(_result(range(3)))
+    assert state.merge(_result([3], names=("t", "w")), START + timedelta(minutes=3), 1000) is None
+
+
+def test_incremental_query_filters_on_the_time_column():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text('CREATE TABLE m ("Time" TEXT, v REAL)'))
+        connection.execute(text("INSERT INTO m VALUES ('2024-01-01 00:00:00', 1), ('2024-01-02 00:00:00', 2)"))
+        sql = incremental_query(engine.dialect, 'SELECT "Time", v FROM m;', "Time")
+        rows = connection.execute(text(sql), {"since": "2024-01-01 12:00:00"}).all()
+    assert sql == 'SELECT * FROM (SELECT "Time", v FROM m) AS src WHERE src."Time" >= :since'
+    assert rows == [("2024-01-02 00:00:00", 2.0)]
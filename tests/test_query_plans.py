@@ -0,0 +1,22 @@
+import pytest
+
+try:
+    from app.core.settings import settings
+except Exception:  # the settings need the app's environment or .env
+    settings = None
+
+pytestmark = pytest.mark.skipif(
+    settings is None or not settings.DB_URI.startswith("postgresql"),
+    reason="query plans are checked on Postgres; point DB_URI at one"
+)
+
+
+def test_service_queries_use_their_indexes():
+    from app.check_query_plans import run_checks
+
+    failures = [
+        f"{name}: expected {', '.join(indexes) or 'no sequential scan'}, plans use {', '.join(scans) or 'no scan'}"
+        for name, ok, indexes, scans in run_checks()
+        if not ok
+    ]
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,80 @@
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.utils.query_engine import build_result
+from app.utils.result_format import (
+    ARROW_STREAM, JSON_COLUMNS, JSON_RECORDS, negotiate_format, render_chart_result
+)
+
+
+def _result():
+    rows = [(datetime(2024, 1, 1, 12), 1.5, "a"), (datetime(2024, 1, 2, 12), None, "b")]
+    return build_result(["day", "amount", "label"], rows, 10, time.perf_counter())
+
+
+@pytest.mark.parametrize("accept", [None, "", "*/*", "application/*", "application/json", "text/html, */*;q=0.1"])
+def test_json_records_is_the_default(accept):
+    assert negotiate_format(accept) == JSON_RECORDS
+
+
+def test_quality_values_decide_between_formats():
+    assert negotiate_format(f"{JSON_RECORDS};q=0.5, {ARROW_STREAM}") == ARROW_STREAM
+    assert negotiate_format(f"{ARROW_STREAM};q=0.2, {JSON_COLUMNS};q=0.9") == JSON_COLUMNS
+
+
+def test_equal_quality_keeps_header_order():
+    assert negotiate_format(f"{JSON_COLUMNS}, {ARROW_STREAM}") == JSON_COLUMNS
+
+
+def test_zero_quality_excludes_a_format():
+    assert negotiate_format(f"{ARROW_STREAM};q=0, {JSON_COLUMNS}") == JSON_COLUMNS
+
+
+def test_unacceptable_formats_raise_406():
+    with pytest.raises(HTTPException) as error:
+        negotiate_format("text/csv")
+    assert error.value.status_code == 406
+
+
+def test_json_records_are_a_dict_of_rows():
+    body = render_chart_result(_result(), JSON_RECORDS, {"cached": False})
+    assert body["cached"] is False
+    assert body["row_count"] == 2
+    assert body["rows"][1] == {"day": "2024-01-02T12:00:00", "amount": None, "label": "b"}
+
+
+def test_json_columns_send_each_column_once():
+    response = render_chart_result(_result(), JSON_COLUMNS, {"cached": True})
+    assert response.media_type == JSON_COLUMNS
+    body = json.loads(response.body)
+    assert [column["name"] for column in body["columns"]] == ["day", "amount", "label"]
+    assert body["data"] == [["2024-01-01T12:00:00", "2024-01-02T12:00:00"], [1.5, None], ["a", "b"]]
+    assert body["cached"] is True
+
+
+def test_arrow_stream_round_trips_with_typed_columns():
+    pa = pytest.importorskip("pyarrow")
+    response = render_chart_result(_result(), ARROW_STREAM, {"cached": False})
+    assert response.media_type == ARROW_STREAM
+    table = pa.ipc.open_stream(response.body).read_all()
+    assert table.column_names == ["day", "amount", "label"]
+    assert table.schema.field("day").type == pa.timestamp("us")
+    assert table.column("amount").to_pylist() == [1.5, None]
+    assert table.schema.metadata[b"row_count"] == b"2"
+    assert json.loads(table.schema.metadata[b"cached"]) is False
+
+
+def test_non_finite_numbers_are_sent_as_null():
+    rows = [(float("nan"),), (float("inf"),), (Decimal("NaN"),), (Decimal("-Infinity"),), (Decimal("1e400"),), (2.5,)]
+    result = build_result(["v"], rows, 10, time.perf_counter())
+    assert result.values == [[None, None, None, None, None, 2.5]]
+    records = JSONResponse(render_chart_result(result, JSON_RECORDS, {}))
+    assert json.loads(records.body)["rows"][0] == {"v": None}
+    columns = render_chart_result(result, JSON_COLUMNS, {})
+    assert b"NaN" not in columns.body and b"Infinity" not in columns.body
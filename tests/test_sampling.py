@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.utils.sampling import SEED, sample_error, sample_query
+
+PG = postgresql.dialect()
+
+
+def test_only_postgres_is_sampled():
+    assert sample_query(mysql.dialect(), "SELECT * FROM orders", 0.1) is None
+    assert sample_query(sqlite.dialect(), "SELECT * FROM orders", 0.1) is None
+
+
+def test_the_first_table_is_sampled_after_its_alias():
+    sql = "SELECT o.region, COUNT(*) FROM sales.orders AS o JOIN regions r ON r.id = o.region_id GROUP BY o.region;"
+    sampled = sample_query(PG, sql, 0.05)
+    assert sampled.table == "sales.orders"
+    assert sampled.method == "tablesample system"
+    assert sampled.sql == (
+        f"SELECT o.region, COUNT(*) FROM sales.orders AS o TABLESAMPLE SYSTEM (5) REPEATABLE ({SEED}) "
+        "JOIN regions r ON r.id = o.region_id GROUP BY o.region"
+    )
+
+
+def test_bernoulli_samples_rows():
+    sampled = sample_query(PG, "SELECT * FROM orders", 0.5, "BERNOULLI")
+    assert sampled.sql == f"SELECT * FROM orders TABLESAMPLE BERNOULLI (50) REPEATABLE ({SEED})"
+    assert sampled.method == "tablesample bernoulli"
+
+
+@pytest.mark.parametrize("sql, table", [
+    ("SELECT EXTRACT(YEAR FROM ts) AS y FROM events", "events"),
+    ("WITH recent AS (SELECT * FROM events) SELECT * FROM recent JOIN users ON true", "events"),
+    ("SELECT * FROM (SELECT * FROM events) AS e", "events"),
+    ('SELECT * FROM "Events" e WHERE e.x > 1', '"Events"'),
+])
+def test_subqueries_ctes_and_function_calls_are_not_tables(sql, table):
+    assert sample_query(PG, sql, 0.1).table == table
+
+
+def test_queries_without_a_table_are_not_sampled():
+    assert sample_query(PG, "SELECT 1", 0.1) is None
+    assert sample_query(PG, "SELECT * FROM generate_series(1, 10)", 0.1) is None
+
+
+def test_the_count_query_counts_rows_per_group():
+    sql = "SELECT region, SUM(amount) FROM orders WHERE amount > 0 GROUP BY region ORDER BY 2 DESC LIMIT 5"
+    sampled = sample_query(PG, sql, 0.1)
+    assert sampled.count_sql == (
+        "SELECT SUM(n) AS sampled_rows, MIN(n) AS smallest_group FROM ("
+        f"SELECT COUNT(*) AS n FROM orders TABLESAMPLE SYSTEM (10) REPEATABLE ({SEED}) WHERE amount > 0 GROUP BY region"
+        ") AS sample_groups"
+    )
+
+
+def test_line_comments_do_not_swallow_the_count_query():
+    sampled = sample_query(PG, "SELECT * FROM orders -- all of them\nWHERE amount > 0", 0.1)
+    assert "--" not in sampled.count_sql
+    assert sampled.count_sql.endswith(") AS sample_groups")
+
+
+def test_set_operations_have_no_count_query():
+    sampled = sample_query(PG, "SELECT a FROM x UNION SELECT a FROM y", 0.1)
+    assert sampled is not None
+    assert sampled.count_sql is None
+
+
+def test_sample_error_shrinks_with_more_rows():
+    assert sample_error(0, 0.1) is None
+    assert sample_error(100, 0.1) == round(1.96 * (0.9 / 100) ** 0.5, 4)
+    assert sample_error(10000, 0.1) < sample_error(100, 0.1)
+    assert sample_error(100, 1.0) == 0
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils.sql_normalizer import is_single_statement, normalize_sql, tokenize
+
+
+def test_tokens_join_back_into_the_query():
+    sql = "SELECT a, 'it''s' -- note\nFROM \"T\" WHERE b::int >= :x /* c */;"
+    assert "".join(token for _, token in tokenize(sql)) == sql
+
+
+@pytest.mark.parametrize("sql, single", [
+    ("SELECT 1", True),
+    ("SELECT 1;", True),
+    ("SELECT 1 ;  -- done", True),
+    ("SELECT ';' AS s", True),
+    ('SELECT 1 AS ";"', True),
+    ("SELECT 1 /* ; */", True),
+    ("SELECT 1; SELECT 2", False),
+    ("SELECT 1; COMMIT; DELETE FROM t", False),
+    (";SELECT 1", False),
+])
+def test_single_statement(sql, single):
+    assert is_single_statement(sql) is single
+
+
+def test_mysql_backslash_escapes_do_not_end_a_string():
+    sql = "SELECT 'a\\'; DELETE FROM t; --' AS s"
+    assert is_single_statement(sql, "mysql")
+    assert not is_single_statement(sql, "postgresql")
+
+
+def test_formatting_does_not_change_the_shape():
+    a = normalize_sql("SELECT region, SUM(amount) FROM orders WHERE amount > 10 GROUP BY region")
+    b = normalize_sql("select region,  sum(amount)\nfrom orders -- big ones\nwhere amount > 10 group by region;")
+    assert a.shape == b.shape
+    assert a.fingerprint == b.fingerprint
+
+
+def test_filter_values_are_lifted_into_binds():
+    query = normalize_sql("SELECT * FROM orders WHERE region = 'eu' AND amount > 10.5 AND id < 3")
+    assert query.sql == "SELECT * FROM orders WHERE region = :lit_1 AND amount > :lit_2 AND id < :lit_3"
+    assert query.params == {"lit_1": "eu", "lit_2": Decimal("10.5"), "lit_3": 3}
+    assert query.fingerprint == normalize_sql("SELECT * FROM orders WHERE region = 'us' AND amount > 1 AND id < 9").fingerprint
+
+
+def test_in_lists_of_any_length_share_a_shape():
+    short = normalize_sql("SELECT * FROM t WHERE id IN (1, 2)")
+    long = normalize_sql("SELECT * FROM t WHERE id IN (1, 2, 3, 4)")
+    assert short.fingerprint == long.fingerprint
+    assert "(?+)" in short.shape
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 'label' AS kind FROM t",
+    "SELECT a FROM t GROUP BY 1 ORDER BY 1 LIMIT 10 OFFSET 5",
+    "SELECT * FROM t WHERE created_at > DATE '2024-01-01'",
+    "SELECT * FROM t WHERE created_at > now() - INTERVAL '1 day'",
+    "SELECT * FROM t WHERE id = '7'::int",
+    "SELECT * FROM t WHERE name = E'a\\nb'",
+])
+def test_literals_that_would_change_meaning_stay_inline(sql):
+    query = normalize_sql(sql, "postgresql")
+    assert query.params == {}
+    assert query.sql == sql
+
+
+def test_mysql_strings_with_backslashes_stay_inline():
+    query = normalize_sql("SELECT * FROM t WHERE name = 'a\\'b'", "mysql")
+    assert query.params == {}
+
+
+def test_lifted_names_do_not_clash_with_existing_binds():
+    query = normalize_sql("SELECT * FROM t WHERE a = :lit_1 AND b = 5")
+    assert query.params == {"_lit_1": 5}
+    assert query.sql.endswith("b = :_lit_1")
+
+
+def test_keywords_and_functions_fold_case_but_names_do_not():
+    upper = normalize_sql("SELECT COUNT(*) FROM Users")
+    lower = normalize_sql("select count(*) from users")
+    assert upper.shape == "select count ( * ) from Users"
+    assert upper.fingerprint != lower.fingerprint
+
+
+def test_normalized_query_returns_the_same_rows():
+    engine = create_engine("sqlite://")
+    sql = "SELECT id FROM t WHERE name = 'b' OR value > 2.5 ORDER BY id"
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE t (id INTEGER, name TEXT, value REAL)"))
+        connection.execute(text("INSERT INTO t VALUES (1, 'a', 1), (2, 'b', 2), (3, 'c', 3)"))
+        query = normalize_sql(sql)
+        # sqlite3 has no adapter for Decimal
+        params = {name: float(value) if isinstance(value, Decimal) else value for name, value in query.params.items()}
+        lifted = connection.execute(text(query.sql), params).all()
+        assert lifted == connection.execute(text(sql)).all() == [(2,), (3,)]
+
+
+@pytest.mark.parametrize("upper, lower", [
+    ("SELECT * FROM t WHERE ts > NOW() - INTERVAL '7' DAY", "select * from t where ts > now() - interval '7' day"),
+    ("SELECT DATE_TRUNC('hour', ts AT TIME ZONE 'UTC') FROM t", "select date_trunc('hour', ts at time zone 'UTC') from t"),
+    ("SELECT EXTRACT(EPOCH FROM ts) FROM t", "select extract(epoch from ts) from t"),
+    ("SELECT * FROM t WHERE name LIKE 'a!%' ESCAPE '!'", "select * from t where name like 'a!%' escape '!'"),
+    ("SELECT CAST(v AS INTEGER), ts::TIMESTAMP FROM t", "select cast(v as integer), ts::timestamp from t"),
+    ("SELECT SUM(v) OVER (ORDER BY ts ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) FROM t",
+     "select sum(v) over (order by ts rows between unbounded preceding and current row) from t"),
+])
+def test_non_reserved_keywords_fold_case(upper, lower):
+    assert normalize_sql(upper).fingerprint == normalize_sql(lower).fingerprint
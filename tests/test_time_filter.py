@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+
+from app.utils.time_filter import (
+    infer_time_column, inject_time_filter, time_params, valid_column, wrap_time_filter
+)
+
+RANGE = {"time_from": datetime(2024, 1, 1), "time_to": datetime(2024, 2, 1)}
+
+
+def test_time_params_leave_out_open_ends():
+    assert time_params(None, None) == {}
+    assert time_params(datetime(2024, 1, 1), None) == {"time_from": datetime(2024, 1, 1)}
+
+
+@pytest.mark.parametrize("column, valid", [
+    ("created_at", True),
+    ("o.created_at", True),
+    ('"Orders"."Created At"', True),
+    ("created_at; DROP TABLE t", False),
+    ("date_trunc('day', created_at)", False),
+    ("o.", False),
+    ("", False),
+])
+def test_valid_column(column, valid):
+    assert valid_column(column) is valid
+
+
+def test_a_where_clause_is_added_before_group_by():
+    sql = inject_time_filter("SELECT day, SUM(v) FROM m GROUP BY day;", "m.ts", RANGE)
+    assert sql == "SELECT day, SUM(v) FROM m  WHERE m.ts >= :time_from AND m.ts < :time_to GROUP BY day"
+
+
+def test_an_existing_condition_keeps_its_meaning():
+    sql = inject_time_filter("SELECT * FROM m WHERE a = 1 OR b = 2 ORDER BY ts", "ts", {"time_from": 1})
+    assert sql == "SELECT * FROM m WHERE ts >= :time_from AND (a = 1 OR b = 2) ORDER BY ts"
+
+
+def test_subquery_clauses_are_left_alone():
+    sql = inject_time_filter("SELECT * FROM (SELECT * FROM m WHERE a = 1 GROUP BY a) AS s", "s.ts", RANGE)
+    assert sql.endswith("AS s WHERE s.ts >= :time_from AND s.ts < :time_to")
+
+
+def test_line_comments_do_not_swallow_the_predicate():
+    sql = inject_time_filter("SELECT * FROM m -- everything", "ts", RANGE)
+    assert sql.endswith("WHERE ts >= :time_from AND ts < :time_to")
+    assert "--" not in sql
+
+
+@pytest.mark.parametrize("sql", ["SELECT 1", "SELECT a FROM x UNION SELECT a FROM y"])
+def test_queries_that_cannot_take_a_where_are_refused(sql):
+    assert inject_time_filter(sql, "ts", RANGE) is None
+
+
+def test_wrapping_filters_the_output_column():
+    quote = postgresql.dialect().identifier_preparer.quote
+    sql = wrap_time_filter("SELECT ts AS \"Day\" FROM m;", "Day", {"time_to": 1}, quote)
+    assert sql == 'SELECT * FROM (SELECT ts AS "Day" FROM m) AS src WHERE src."Day" < :time_to'
+
+
+@pytest.mark.parametrize("sql, output, column", [
+    ("SELECT o.created_at AS day, SUM(v) FROM o GROUP BY 1", "day", "o.created_at"),
+    ("SELECT created_at, v FROM o", "created_at", "created_at"),
+    ("SELECT created_at day, v FROM o", "day", "created_at"),
+    ('SELECT DISTINCT "Ts" FROM o', "Ts", '"Ts"'),
+    ("WITH x AS (SELECT a AS ts FROM b) SELECT ts FROM x", "ts", "ts"),
+    ("SELECT date_trunc('day', created_at) AS day, SUM(v) FROM o GROUP BY 1", "day", None),
+    ("SELECT created_at, SUM(v) OVER (ORDER BY created_at) FROM o", "created_at", None),
+    ("SELECT created_at FROM o", "updated_at", None),
+    ("SELECT now() AS ts", "ts", None),
+])
+def test_infer_time_column(sql, output, column):
+    assert infer_time_column(sql, output) == column
+
+
+def test_pushed_down_and_wrapped_filters_agree():
+    engine = create_engine("sqlite://")
+    sql = "SELECT created_at AS day, SUM(v) AS total FROM m WHERE v > 0 OR v < -5 GROUP BY created_at ORDER BY day"
+    params = {"time_from": "2024-01-02", "time_to": "2024-01-04"}
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE m (created_at TEXT, v REAL)"))
+        connection.execute(text(
+            "INSERT INTO m VALUES ('2024-01-01', 1), ('2024-01-02', 2), ('2024-01-03', -9), ('2024-01-04', 4)"
+        ))
+        column = infer_time_column(sql, "day", "sqlite")
+        pushed = connection.execute(text(inject_time_filter(sql, column, params, "sqlite")), params).all()
+        wrapped = connection.execute(
+            text(wrap_time_filter(sql, "day", params, engine.dialect.identifier_preparer.quote)), params
+        ).all()
+    assert column == "created_at"
+    assert pushed == wrapped == [("2024-01-02", 2.0), ("2024-01-03", -9.0)]
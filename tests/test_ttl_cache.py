@@ -0,0 +1,58 @@
+from app.utils.ttl_cache import TTLCache
+
+
+def test_get_returns_a_fresh_value():
+    cache = TTLCache(ttl=60)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert len(cache) == 1
+
+
+def test_get_returns_the_default_for_a_missing_key():
+    cache = TTLCache(ttl=60)
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+
+
+def test_expired_entries_are_dropped():
+    cache = TTLCache(ttl=0)
+    cache.set("key", "value")
+    assert cache.get("key", "default") == "default"
+    assert len(cache) == 0
+
+
+def test_ttl_can_be_set_per_entry():
+    cache = TTLCache(ttl=0)
+    cache.set("kept", "value", ttl=60)
+    cache.set("expired", "value")
+    assert cache.get("kept") == "value"
+    assert cache.get("expired") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_falsy_values_are_cached():
+    cache = TTLCache(ttl=60)
+    cache.set("none", None)
+    cache.set("zero", 0)
+    assert cache.get("none", "default") is None
+    assert cache.get("zero", "default") == 0
+
+
+def test_pop_and_clear():
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "default") == "default"
+    cache.clear()
+    assert len(cache) == 0